@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models import F
+
+from .models import Document, DocumentAccess
+
+OWNER = 'owner'
+SHARED = 'shared'
+
+
+def visible_documents(user):
+    # The unique (user, document) index makes this a seek, and the join can't
+    # produce duplicates, so no DISTINCT is needed. KeysetPagination seeks on
+    # the aliases, which access_user_created_idx keeps in list order.
+    return with_seek_aliases(Document.objects.filter(access__user=user))
+
+
+def shared_documents(user):
+    return with_seek_aliases(Document.objects.filter(access__user=user, access__kind=SHARED))
+
+
+def with_seek_aliases(documents):
+    return documents.alias(
+        seek_created_at=F('access__document_created_at'),
+        seek_id=F('access__document'),
+    )
+
+
+def created_dates(document_ids):
+    return dict(Document.objects.filter(pk__in=document_ids).values_list('id', 'created_at'))
+
+
+def grant_owner(document_id, user_id, created_at):
+    DocumentAccess.objects.update_or_create(
+        user_id=user_id, document_id=document_id,
+        defaults={'kind': OWNER, 'document_created_at': created_at},
+    )
+
+
+def grant_owners(rows):
+    # (document_id, user_id, created_at) for documents created with
+    # bulk_create().
+    DocumentAccess.objects.bulk_create(
+        (
+            DocumentAccess(
+                user_id=user_id, document_id=document_id, kind=OWNER,
+                document_created_at=created_at,
+            )
+            for document_id, user_id, created_at in rows
+        ),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+def grant_shared(document_ids, user_ids):
+    dates = created_dates(document_ids)
+    rows = [
+        DocumentAccess(
+            user_id=user_id, document_id=document_id, kind=SHARED,
+            document_created_at=created_at,
+        )
+        for document_id, created_at in dates.items()
+        for user_id in user_ids
+    ]
+    # Existing rows, including the owner's, are left alone.
+    DocumentAccess.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+
+
+def revoke_shared(document_ids=None, user_ids=None):
+    rows = DocumentAccess.objects.filter(kind=SHARED)
+    if document_ids is not None:
+        rows = rows.filter(document_id__in=document_ids)
+    if user_ids is not None:
+        rows = rows.filter(user_id__in=user_ids)
+    rows.delete()
+
+
+def sync(document_ids=None):
+    """Rebuild the rows of the given documents (all documents when None)
+    from uploaded_by and shared_with."""
+    documents = Document.objects.all()
+    shares = Document.shared_with.through.objects.all()
+    existing = DocumentAccess.objects.all()
+    if document_ids is not None:
+        documents = documents.filter(pk__in=document_ids)
+        shares = shares.filter(document_id__in=document_ids)
+        existing = existing.filter(document_id__in=document_ids)
+
+    with transaction.atomic():
+        existing.delete()
+        DocumentAccess.objects.bulk_create(
+            (
+                DocumentAccess(
+                    user_id=user_id, document_id=document_id, kind=OWNER,
+                    document_created_at=created_at,
+                )
+                for document_id, user_id, created_at in documents.values_list(
+                    'id', 'uploaded_by_id', 'created_at'
+                ).iterator()
+            ),
+            batch_size=1000,
+        )
+        DocumentAccess.objects.bulk_create(
+            (
+                DocumentAccess(
+                    user_id=user_id, document_id=document_id, kind=SHARED,
+                    document_created_at=created_at,
+                )
+                for document_id, user_id, created_at in shares.values_list(
+                    'document_id', 'user_id', 'document__created_at'
+                ).iterator()
+            ),
+            batch_size=1000,
+            ignore_conflicts=True,
+        )
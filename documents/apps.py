@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class DocumentsConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "documents"
+
+    def ready(self):
+        from . import db  # noqa: F401
+        from . import signals  # noqa: F401
+        from . import tasks  # noqa: F401
@@ -0,0 +1,74 @@
+from collections import defaultdict
+
+from django.db.models import Count
+
+from .models import Archive
+
+# Archives nest (room > cabinet > shelf > box > folder). Each row stores its
+# materialized path ('/3/17/42/', see Archive), so a subtree is a single
+# range on archive_path_idx: listing it, counting the documents in it and
+# moving it (Archive.move_subtree) each take one query, however deep it is.
+
+NAME_SEPARATOR = '/'
+
+
+def path_ids(path):
+    return [int(part) for part in path.strip('/').split('/') if part]
+
+
+def subtree(archive):
+    # The archive itself first, then its descendants depth-first.
+    return Archive.objects.filter(Archive.subtree_filter(archive.path)).order_by('path')
+
+
+def documents_in(documents, archive):
+    return documents.filter(Archive.subtree_filter(archive.path, 'archive__'))
+
+
+def document_counts(archive, documents):
+    """Return ({archive_id: documents filed directly in it}, {archive_id:
+    documents anywhere below it}) for the subtree of `archive`."""
+    rows = documents_in(documents, archive).order_by().values_list(
+        'archive_id', 'archive__path'
+    ).annotate(count=Count('id'))
+    direct = {}
+    total = defaultdict(int)
+    for archive_id, path, count in rows:
+        direct[archive_id] = count
+        # Roll up to every ancestor inside the subtree.
+        for ancestor_id in path_ids(path)[archive.depth:]:
+            total[ancestor_id] += count
+    return direct, dict(total)
+
+
+def with_ancestors(archive_ids):
+    # Ids of the given archives and everything above them, read from their
+    # paths rather than by walking parents.
+    paths = Archive.objects.filter(pk__in=archive_ids).values_list('path', flat=True)
+    return {ancestor_id for path in paths for ancestor_id in path_ids(path)}
+
+
+def name_paths(archive_ids=None):
+    """Return {archive_id: 'Room A/Cabinet 2/Box 1'}, the names from the
+    top-level archive down, which is how manifests refer to archives (names
+    repeat across the tree). `archive_ids` must include the ancestors."""
+    rows = Archive.objects.all() if archive_ids is None else Archive.objects.filter(pk__in=archive_ids)
+    rows = list(rows.values_list('pk', 'name', 'path'))
+    names = {pk: name for pk, name, _ in rows}
+    return {
+        pk: NAME_SEPARATOR.join(names[ancestor_id] for ancestor_id in path_ids(path))
+        for pk, _, path in rows
+    }
+
+
+def assign_paths(archives):
+    """Set path and depth on archives created with bulk_create(), which
+    bypasses Archive.save(). Parents must come before their children."""
+    paths = dict(Archive.objects.filter(
+        pk__in={archive.parent_id for archive in archives if archive.parent_id}
+    ).values_list('pk', 'path'))
+    for archive in archives:
+        archive.path = f"{paths[archive.parent_id] if archive.parent_id else '/'}{archive.pk}/"
+        archive.depth = archive.path.count('/') - 2
+        paths[archive.pk] = archive.path
+    Archive.objects.bulk_update(archives, ['path', 'depth'])
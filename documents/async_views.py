@@ -0,0 +1,109 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import Http404
+from django.views.decorators.csrf import csrf_exempt
+
+from .db import read_routing
+from .models import Document
+from .views import DocumentViewSet
+
+# Async variants of the hot DocumentViewSet read endpoints. smartdoc/asgi.py
+# resolves them ahead of the router, so under ASGI the same URLs are served
+# without pinning a worker thread while rows are fetched or while a file
+# trickles out to a slow client. The viewset still provides authentication,
+# querysets, serializers, pagination and error responses.
+
+
+def async_action(actions, detail=False):
+    # Runs handler(view, request, *args, **kwargs) on a DocumentViewSet set up
+    # the way DRF's dispatch() would for the GET action in `actions`. Other
+    # methods (POST to the list URL, OPTIONS, ...) go to the sync viewset.
+    def decorator(handler):
+        sync_view = DocumentViewSet.as_view(actions, basename='document', detail=detail)
+
+        @wraps(handler)
+        async def view(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+
+            viewset = DocumentViewSet(
+                basename='document', detail=detail,
+                action_map={**actions, 'head': actions['get']},
+            )
+            viewset.args = args
+            viewset.kwargs = kwargs
+            with read_routing(True):
+                request = viewset.initialize_request(request, *args, **kwargs)
+                viewset.request = request
+                viewset.headers = viewset.default_response_headers
+                try:
+                    # Authentication may hit the database.
+                    await sync_to_async(viewset.initial)(request, *args, **kwargs)
+                    response = await handler(viewset, request, *args, **kwargs)
+                except Exception as exc:
+                    response = viewset.handle_exception(exc)
+                return viewset.finalize_response(request, response, *args, **kwargs)
+
+        # As with APIView.as_view(); CSRF is enforced by SessionAuthentication.
+        return csrf_exempt(view)
+    return decorator
+
+
+async def paginated_response(view, queryset):
+    page = await view.paginator.apaginate_queryset(queryset, view.request, view)
+    serializer = view.get_serializer(page, many=True)
+    return view.get_paginated_response(serializer.data)
+
+
+async def get_document(view, pk):
+    queryset = view.filter_queryset(view.get_queryset())
+    try:
+        document = await queryset.aget(pk=pk)
+    except (Document.DoesNotExist, TypeError, ValueError, ValidationError):
+        raise Http404
+    view.check_object_permissions(view.request, document)
+    return document
+
+
+@async_action({'get': 'list', 'post': 'create'})
+async def document_list(view, request):
+    return await paginated_response(view, view.filter_queryset(view.get_queryset()))
+
+
+def scoped_list(name):
+    @async_action({'get': name})
+    async def handler(view, request):
+        queryset = getattr(view, f'{name}_documents')()
+        return await paginated_response(view, view.optimize_queryset(queryset))
+    handler.__name__ = f'document_{name}'
+    return handler
+
+
+document_personal = scoped_list('personal')
+document_office = scoped_list('office')
+document_shared = scoped_list('shared')
+document_archived = scoped_list('archived')
+
+
+@async_action({'get': 'download'}, detail=True)
+async def document_download(view, request, pk):
+    document = await get_document(view, pk)
+    # Checksum, stat() and conditional/Range handling run on a thread; the
+    # body is then streamed by aiter_file_range.
+    return await sync_to_async(view.download_response)(request, document, True)
+
+
+@async_action({'get': 'preview'}, detail=True)
+async def document_preview(view, request, pk):
+    document = await get_document(view, pk)
+    # A cache miss renders the preview, which is CPU and disk bound.
+    return await sync_to_async(view.preview_response)(request, document, True)
+
+
+@async_action({'get': 'export'})
+async def document_export(view, request):
+    # Every block of the ZIP is produced on the request's sync thread and
+    # sent without holding a worker.
+    return await sync_to_async(view.export_response)(request, True)
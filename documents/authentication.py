@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.authentication import TokenAuthentication
+
+
+def get_cache():
+    return caches[getattr(settings, 'DOCUMENTS_AUTH_CACHE', 'default')]
+
+
+def cache_key(key):
+    return f'documents:auth:token:{key}'
+
+
+def invalidate(key):
+    # Again after commit: another worker may cache the old row while the
+    # change is still in flight.
+    get_cache().delete(cache_key(key))
+    transaction.on_commit(lambda: get_cache().delete(cache_key(key)))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    # Keeps the token (with its user) in the cache so steady-state requests
+    # skip the authtoken_token/auth_user join. Entries are dropped on logout,
+    # token deletion and any change to the user (see signals.py), which only
+    # reaches every worker if DOCUMENTS_AUTH_CACHE is shared between them.
+
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        token = cache.get(cache_key(key))
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set(
+                cache_key(key), token,
+                getattr(settings, 'DOCUMENTS_AUTH_CACHE_TIMEOUT', 300)
+            )
+        return (token.user, token)
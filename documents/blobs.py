@@ -0,0 +1,98 @@
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import StoredBlob
+
+
+def acquire_blob(storage, name):
+    with transaction.atomic():
+        blob, created = StoredBlob.objects.get_or_create(
+            name=name,
+            defaults={'size': storage.size(name), 'refcount': 1}
+        )
+        if not created:
+            StoredBlob.objects.filter(pk=blob.pk).update(refcount=F('refcount') + 1)
+
+
+def acquire_blobs(storage, names):
+    # One reference per name, repeats included, for documents created with
+    # bulk_create(), which sends no post_save.
+    counts = Counter(names)
+    if not counts:
+        return
+    with transaction.atomic():
+        existing = set(StoredBlob.objects.filter(name__in=counts).values_list('name', flat=True))
+        StoredBlob.objects.bulk_create(
+            [
+                StoredBlob(name=name, size=storage.size(name), refcount=0)
+                for name in counts if name not in existing
+            ],
+            ignore_conflicts=True,
+        )
+        by_count = defaultdict(list)
+        for name, count in counts.items():
+            by_count[count].append(name)
+        for count, group in by_count.items():
+            StoredBlob.objects.filter(name__in=group).update(refcount=F('refcount') + count)
+
+
+@contextmanager
+def locked_blob(name, **changes):
+    # Deciding whether a blob file is kept, reused or unlinked happens
+    # under a write on its row: a row lock elsewhere, and on SQLite the
+    # database write lock, which the UPDATE takes even when no row matches.
+    with transaction.atomic():
+        StoredBlob.objects.filter(name=name).update(**(changes or {'refcount': F('refcount')}))
+        yield
+
+
+def pinned_blob(name):
+    # Used by ContentAddressedStorage before reusing an existing file. The
+    # pin covers the gap until the new Document row acquires the blob.
+    return locked_blob(name, pinned_at=timezone.now())
+
+
+def release_blob(storage, name):
+    StoredBlob.objects.filter(name=name, refcount__gt=0).update(refcount=F('refcount') - 1)
+    transaction.on_commit(lambda: delete_if_unreferenced(storage, name))
+
+
+def releasable_blobs():
+    pin_cutoff = timezone.now() - timedelta(
+        seconds=getattr(settings, 'DOCUMENTS_BLOB_PIN_SECONDS', 3600)
+    )
+    return StoredBlob.objects.filter(refcount=0).filter(
+        Q(pinned_at__isnull=True) | Q(pinned_at__lt=pin_cutoff)
+    )
+
+
+def delete_if_unreferenced(storage, name):
+    with locked_blob(name):
+        # Re-checked under the lock: the same content may have been uploaded
+        # again since the reference was dropped.
+        deleted, _ = releasable_blobs().filter(name=name).delete()
+        if deleted:
+            storage.delete(name)
+    return bool(deleted)
+
+
+def purge_released(storage):
+    # Blobs whose last reference went while an upload had them pinned, or
+    # whose pinning upload never created its document.
+    names = list(releasable_blobs().values_list('name', flat=True))
+    return sum(delete_if_unreferenced(storage, name) for name in names)
+
+
+def discard_unreferenced(storage, names):
+    # Files saved for documents that were never created (a failed or
+    # rolled-back import batch). Blobs that other documents reference stay.
+    for name in set(names):
+        with locked_blob(name):
+            if not StoredBlob.objects.filter(name=name).exists():
+                storage.delete(name)
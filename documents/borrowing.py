@@ -0,0 +1,131 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from . import changes, stats
+from .models import BorrowRequest, Document
+
+# Borrow request state machine. Every transition is a conditional UPDATE
+# (... WHERE status = <expected>) inside one transaction, so two staff acting
+# on the same request, or on requests for the same document, can't both
+# succeed. UPDATEs send no signals, so the statistics counters and the
+# change feed are maintained here.
+
+
+class TransitionError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def overlapping_loans(document_id, borrow_date, return_date):
+    # Approved requests for the document whose period overlaps the given one
+    # (both ends inclusive); served by borrow_approved_period_idx.
+    return BorrowRequest.objects.filter(
+        document_id=document_id,
+        status='approved',
+        borrow_date__lte=return_date,
+        return_date__gte=borrow_date,
+    )
+
+
+def lock_document(document_id, now):
+    # Writing the document row first takes its row lock (the database write
+    # lock on SQLite), so transitions touching one document run one at a time
+    # and each sees the others' committed result.
+    if not Document.objects.filter(pk=document_id).update(updated_at=now):
+        raise TransitionError('Document no longer exists', status=404)
+
+
+def set_document_status(document_id, old_status, new_status):
+    if old_status == new_status:
+        return
+    Document.objects.filter(pk=document_id, status=old_status).update(status=new_status)
+    stats.documents_updated([({'status': old_status}, {'status': new_status})])
+
+
+def record_transition(borrow_request, old_status, new_values):
+    old = borrow_request._stats_snapshot
+    if old['status'] != old_status:
+        # Loaded before another transition committed. The columns a
+        # transition sets are still empty in the state it starts from.
+        old = {
+            **BorrowRequest.objects.filter(pk=borrow_request.pk).values(*stats.BORROW_FIELDS).get(),
+            **dict.fromkeys(new_values),
+            'status': old_status,
+        }
+    new = {**old, **new_values}
+    stats.borrow_request_saved(old, new, False)
+    borrow_request._stats_snapshot = new
+    changes.borrow_requests_changed(
+        [(borrow_request.pk, borrow_request.requested_by_id)], 'updated'
+    )
+
+
+def current_status(borrow_request):
+    return BorrowRequest.objects.filter(pk=borrow_request.pk).values_list(
+        'status', flat=True
+    ).first()
+
+
+def approve(borrow_request, user):
+    now = timezone.now()
+    with transaction.atomic():
+        lock_document(borrow_request.document_id, now)
+        conflicts = overlapping_loans(
+            OuterRef('document_id'), OuterRef('borrow_date'), OuterRef('return_date')
+        )
+        approved = BorrowRequest.objects.filter(
+            pk=borrow_request.pk, status='pending'
+        ).exclude(Exists(conflicts)).update(
+            status='approved', approved_by=user, decided_at=now
+        )
+        if not approved:
+            if current_status(borrow_request) != 'pending':
+                raise TransitionError('Cannot approve a request that is not pending')
+            raise TransitionError(
+                'The document is already lent out for an overlapping period', status=409
+            )
+
+        document_status = Document.objects.filter(
+            pk=borrow_request.document_id
+        ).values_list('status', flat=True).get()
+        set_document_status(borrow_request.document_id, document_status, 'borrowed')
+        record_transition(borrow_request, 'pending', {'status': 'approved', 'decided_at': now})
+        changes.documents_changed([borrow_request.document_id], 'updated')
+
+
+def reject(borrow_request, user):
+    now = timezone.now()
+    with transaction.atomic():
+        rejected = BorrowRequest.objects.filter(
+            pk=borrow_request.pk, status='pending'
+        ).update(status='rejected', approved_by=user, decided_at=now)
+        if not rejected:
+            raise TransitionError('Cannot reject a request that is not pending')
+        record_transition(borrow_request, 'pending', {'status': 'rejected', 'decided_at': now})
+
+
+def return_document(borrow_request):
+    now = timezone.now()
+    today = now.date()
+    with transaction.atomic():
+        lock_document(borrow_request.document_id, now)
+        returned = BorrowRequest.objects.filter(
+            pk=borrow_request.pk, status='approved'
+        ).update(status='returned', actual_return_date=today)
+        if not returned:
+            raise TransitionError('Cannot return a document that is not borrowed')
+
+        # The document stays 'borrowed' while another approved loan remains.
+        other_loans = BorrowRequest.objects.filter(
+            document_id=OuterRef('pk'), status='approved'
+        )
+        if Document.objects.filter(
+            pk=borrow_request.document_id, status='borrowed'
+        ).exclude(Exists(other_loans)).update(status='active'):
+            stats.documents_updated([({'status': 'borrowed'}, {'status': 'active'})])
+        record_transition(
+            borrow_request, 'approved', {'status': 'returned', 'actual_return_date': today}
+        )
+        changes.documents_changed([borrow_request.document_id], 'updated')
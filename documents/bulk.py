@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import access, changes, search, stats
+from .models import BorrowRequest, Document
+
+
+class BulkError(Exception):
+    pass
+
+
+def parse_ids(value, name):
+    if not isinstance(value, list) or not value:
+        raise BulkError(f"{name} must be a non-empty list")
+    limit = getattr(settings, 'DOCUMENTS_BULK_MAX_ITEMS', 5000)
+    if len(value) > limit:
+        raise BulkError(f"At most {limit} {name} can be processed per request")
+    try:
+        return list(dict.fromkeys(int(item) for item in value))
+    except (TypeError, ValueError):
+        raise BulkError(f"{name} must contain integers")
+
+
+def load_documents(queryset, ids):
+    # One query decides which of the requested documents the user may touch.
+    return {document.pk: document for document in queryset.filter(id__in=ids)}
+
+
+def item_results(ids, found, applied_status):
+    return [
+        {'id': pk, 'status': applied_status if pk in found else 'not_found'}
+        for pk in ids
+    ]
+
+
+def set_fields(documents, **values):
+    # bulk_update() bypasses save() and its signals, so auto_now and the
+    # statistics counters are handled here.
+    now = timezone.now()
+    changed = []
+    for document in documents:
+        for field, value in values.items():
+            setattr(document, field, value)
+        document.updated_at = now
+        new = stats.snapshot(document, stats.DOCUMENT_FIELDS)
+        changed.append((document._stats_snapshot, new))
+        document._stats_snapshot = new
+    with transaction.atomic():
+        Document.objects.bulk_update(
+            documents, [*values, 'updated_at'], batch_size=500
+        )
+        stats.documents_updated(changed)
+        action = 'archived' if values.get('status') == 'archived' else 'updated'
+        changes.documents_changed([document.pk for document in documents], action)
+
+
+def share(documents, user_ids):
+    users = list(User.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    if not users:
+        raise BulkError("No valid users specified for sharing")
+    through = Document.shared_with.through
+    rows = [
+        through(document_id=document.pk, user_id=user_id)
+        for document in documents
+        for user_id in users
+    ]
+    with transaction.atomic():
+        through.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+        access.grant_shared([document.pk for document in documents], users)
+        changes.documents_changed([document.pk for document in documents], 'shared')
+        Document.objects.filter(pk__in=[document.pk for document in documents]).update(
+            updated_at=timezone.now()
+        )
+        # m2m_changed is not sent for bulk inserts either.
+        search.refresh_people_bulk(
+            Document.objects.filter(
+                pk__in=[document.pk for document in documents]
+            ).select_related('uploaded_by', 'document_type').prefetch_related('shared_with')
+        )
+    return users
+
+
+def delete(documents):
+    # Deleting through the queryset still sends post_delete per row, which
+    # releases blobs and updates the search index and counters. Change
+    # events are recorded up front with one audience query.
+    ids = [document.pk for document in documents]
+    with transaction.atomic():
+        audience = changes.document_audience(ids)
+        borrow_requests = list(
+            BorrowRequest.objects.filter(document_id__in=ids).values_list('id', 'requested_by_id')
+        )
+        with changes.suppressed():
+            Document.objects.filter(pk__in=ids).delete()
+        changes.record(changes.DOCUMENT, (
+            (user_id, document_id, 'deleted')
+            for document_id, users in audience.items()
+            for user_id in users
+        ))
+        # Cascaded with the documents.
+        changes.borrow_requests_changed(borrow_requests, 'deleted')
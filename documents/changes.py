@@ -0,0 +1,160 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import notifications
+from .models import BorrowRequest, ChangeEvent, DocumentAccess
+
+DOCUMENT = 'document'
+BORROW_REQUEST = 'borrow_request'
+
+_suppressed = ContextVar('documents_changes_suppressed', default=False)
+
+
+@contextmanager
+def suppressed():
+    # For bulk operations that record their own events in one go instead of
+    # letting the per-row signals do it.
+    token = _suppressed.set(True)
+    try:
+        yield
+    finally:
+        _suppressed.reset(token)
+
+
+def is_suppressed():
+    return _suppressed.get()
+
+
+def as_dict(event):
+    return {
+        'id': event.pk,
+        'model': event.model,
+        'object_id': event.object_id,
+        'action': event.action,
+        'created_at': event.created_at,
+    }
+
+
+def record(model, events):
+    """Insert (user_id, object_id, action) events for `model`."""
+    created = ChangeEvent.objects.bulk_create(
+        [
+            ChangeEvent(user_id=user_id, model=model, object_id=object_id, action=action)
+            for user_id, object_id, action in events
+        ],
+        batch_size=1000,
+    )
+    pushed = [
+        (event.user_id, as_dict(event))
+        for event in created if notifications.is_pushed(event.model, event.action)
+    ]
+    if pushed:
+        transaction.on_commit(lambda: notifications.publish_events(pushed))
+
+
+# Documents
+
+def document_audience(document_ids):
+    audience = defaultdict(set)
+    for document_id, user_id in DocumentAccess.objects.filter(
+        document_id__in=document_ids
+    ).values_list('document_id', 'user_id'):
+        audience[document_id].add(user_id)
+    return audience
+
+
+def documents_changed(document_ids, action):
+    audience = document_audience(document_ids)
+    record(DOCUMENT, (
+        (user_id, document_id, action)
+        for document_id, users in audience.items()
+        for user_id in users
+    ))
+
+
+def document_deleted(document_id, audience):
+    record(DOCUMENT, ((user_id, document_id, 'deleted') for user_id in audience))
+
+
+def shares_removed(document_ids, user_ids):
+    # Users that lost access hear 'unshared'; the rest of the audience sees
+    # the document's share list change.
+    record(DOCUMENT, (
+        (user_id, document_id, 'unshared')
+        for document_id in document_ids
+        for user_id in user_ids
+    ))
+    documents_changed(document_ids, 'updated')
+
+
+# Borrow requests
+
+def staff_ids():
+    return list(User.objects.filter(is_staff=True, is_active=True).values_list('id', flat=True))
+
+
+def borrow_requests_changed(rows, action):
+    """`rows` yields (borrow request id, requester id) pairs."""
+    staff = staff_ids()
+    record(BORROW_REQUEST, (
+        (user_id, borrow_request_id, action)
+        for borrow_request_id, requester_id in rows
+        for user_id in {requester_id, *staff}
+    ))
+
+
+def borrow_request_ids_changed(ids, action):
+    borrow_requests_changed(
+        BorrowRequest.objects.filter(pk__in=ids).values_list('id', 'requested_by_id'), action
+    )
+
+
+# Feed
+
+def latest_id():
+    return ChangeEvent.objects.aggregate(latest=Max('id'))['latest'] or 0
+
+
+def oldest_id():
+    return ChangeEvent.objects.order_by('id').values_list('id', flat=True).first()
+
+
+def is_expired(since):
+    # Purging always keeps the newest event, so a gap below the oldest
+    # remaining id means this cursor's events may be gone.
+    oldest = oldest_id()
+    return oldest is not None and since < oldest - 1
+
+
+def changes_since(user, since, limit):
+    """Return (events, cursor, has_more) for events after `since`."""
+    # SQLite has one writer at a time, so events commit in id order and
+    # nothing at or below `latest` can still appear.
+    latest = latest_id()
+    events = list(
+        ChangeEvent.objects.filter(user=user, id__gt=since, id__lte=latest)
+        .order_by('id')
+        .values('id', 'model', 'object_id', 'action', 'created_at')[:limit + 1]
+    )
+    has_more = len(events) > limit
+    events = events[:limit]
+    cursor = events[-1]['id'] if has_more else max(latest, since)
+    return events, cursor, has_more
+
+
+def purge(older_than=None):
+    if older_than is None:
+        older_than = timedelta(days=getattr(settings, 'DOCUMENTS_CHANGES_RETENTION_DAYS', 30))
+    cutoff = timezone.now() - older_than
+    deleted, _ = ChangeEvent.objects.filter(
+        created_at__lt=cutoff
+    ).exclude(id=latest_id()).delete()
+    return deleted
@@ -0,0 +1,70 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+DEFAULT_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+}
+
+_use_read_database = ContextVar('documents_use_read_database', default=False)
+
+
+def read_database_alias():
+    alias = getattr(settings, 'DOCUMENTS_READ_DATABASE', 'read')
+    return alias if alias in settings.DATABASES else None
+
+
+@receiver(connection_created)
+def configure_sqlite_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'DOCUMENTS_SQLITE_PRAGMAS', DEFAULT_SQLITE_PRAGMAS))
+    if connection.alias == read_database_alias():
+        # Guards against a write slipping through the router.
+        pragmas['query_only'] = 'on'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+@contextmanager
+def read_routing(enabled=True):
+    token = _use_read_database.set(enabled)
+    try:
+        yield
+    finally:
+        _use_read_database.reset(token)
+
+
+class ReadWriteRouter:
+    # Reads made while read_routing() is active (safe-method viewset actions,
+    # see mixins.ReadRoutingMixin) go to the read alias, a second connection
+    # to the same WAL-mode database, so they never queue behind a writer's
+    # lock. Everything else, and any read inside a transaction on the
+    # default database, stays on default.
+
+    def db_for_read(self, model, **hints):
+        alias = read_database_alias()
+        if alias is None or not _use_read_database.get():
+            return None
+        if connections['default'].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == read_database_alias():
+            return False
+        return None
@@ -0,0 +1,215 @@
+import hashlib
+import mimetypes
+import os
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import (
+    FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+)
+from django.utils.http import (
+    content_disposition_header, http_date, parse_http_date_safe, quote_etag
+)
+
+CHUNK_SIZE = 64 * 1024
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def compute_checksum(file):
+    # Works for both UploadedFile and FieldFile; reads in chunks so large
+    # scans are hashed without being loaded into memory.
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks(CHUNK_SIZE):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def ensure_checksum(document):
+    # Rows uploaded before checksums existed are hashed on first download.
+    if not document.checksum:
+        with document.file.open('rb'):
+            document.checksum = compute_checksum(document.file)
+        type(document).objects.filter(pk=document.pk).update(checksum=document.checksum)
+    return document.checksum
+
+
+def document_etag(document):
+    modified = int(document.updated_at.timestamp())
+    return quote_etag(f'{ensure_checksum(document)[:32]}-{modified}')
+
+
+def etag_matches(header, etag):
+    if header.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in header.split(',')]
+    # Weak comparison, as required for If-None-Match.
+    return any(tag.removeprefix('W/') == etag for tag in candidates)
+
+
+def is_not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and last_modified <= if_modified_since
+
+
+def parse_range(header, size):
+    # Only single byte ranges are served partially; anything else falls back
+    # to the full body, which RFC 9110 allows.
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0:
+            raise ValueError('Unsatisfiable range')
+        start = max(size - length, 0)
+        end = size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            raise ValueError('Unsatisfiable range')
+    return start, end
+
+
+def iter_file_range(file, start, length, chunk_size=CHUNK_SIZE):
+    try:
+        file.seek(start)
+        remaining = length
+        while remaining > 0:
+            data = file.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+async def aiter_file_range(file, start=None, length=None, chunk_size=CHUNK_SIZE):
+    # Async counterpart of iter_file_range for ASGI responses: reads run on a
+    # worker thread, so between chunks the request only waits on the client
+    # and holds no thread however slowly it reads.
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        if start is not None:
+            file.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            data = await read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not data:
+                break
+            if remaining is not None:
+                remaining -= len(data)
+            yield data
+    finally:
+        file.close()
+
+
+def file_response(file, asynchronous=False, **kwargs):
+    response = FileResponse(file, **kwargs)
+    if asynchronous:
+        # The headers were already taken from the file; only the body is
+        # swapped for the non-blocking reader.
+        response.streaming_content = aiter_file_range(file)
+    return response
+
+
+def download_filename(document):
+    # Stored names are content hashes, so name the download after the title.
+    ext = os.path.splitext(document.file.name)[1]
+    title = document.title.strip().replace('/', '_').replace('\\', '_')
+    if not title:
+        return os.path.basename(document.file.name)
+    if ext and not title.lower().endswith(ext.lower()):
+        title += ext
+    return title
+
+
+def download_response(request, document, asynchronous=False):
+    field_file = document.file
+    filename = download_filename(document)
+    content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    last_modified = int(document.updated_at.timestamp())
+    etag = document_etag(document)
+
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+    }
+
+    if is_not_modified(request, etag, last_modified):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    mode = getattr(settings, 'DOCUMENTS_DOWNLOAD_OFFLOAD', None)
+    if mode:
+        response = offload_response(field_file, mode)
+        response['Content-Type'] = content_type
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    size = field_file.size
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    file = field_file.storage.open(field_file.name, 'rb')
+    if byte_range is None:
+        response = file_response(
+            file, asynchronous,
+            as_attachment=True, filename=filename, content_type=content_type
+        )
+    else:
+        start, end = byte_range
+        length = end - start + 1
+        body = aiter_file_range if asynchronous else iter_file_range
+        response = StreamingHttpResponse(
+            body(file, start, length),
+            status=206,
+            content_type=content_type,
+        )
+        # Closed with the response (as FileResponse does) when the body is
+        # never read: HEAD requests, clients gone before streaming starts.
+        response._resource_closers.append(file.close)
+        response['Content-Length'] = str(length)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Disposition'] = content_disposition_header(True, filename)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+def offload_response(field_file, mode):
+    # Hand the transfer to the front web server; it then takes care of
+    # Range requests and keeps the Python worker free.
+    response = HttpResponse()
+    if mode == 'x-accel-redirect':
+        prefix = getattr(settings, 'DOCUMENTS_DOWNLOAD_ACCEL_PREFIX', '/protected-media/')
+        response['X-Accel-Redirect'] = prefix.rstrip('/') + '/' + field_file.name
+    elif mode == 'x-sendfile':
+        response['X-Sendfile'] = field_file.path
+    else:
+        raise ValueError(f'Unknown DOCUMENTS_DOWNLOAD_OFFLOAD mode: {mode}')
+    return response
@@ -0,0 +1,127 @@
+import asyncio
+import json
+import secrets
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.encoders import JSONEncoder
+
+from . import changes, notifications
+from .authentication import CachedTokenAuthentication
+
+# Server-Sent Events endpoint. Needs an ASGI server (see smartdoc/asgi.py):
+# under WSGI every open stream would pin a worker thread.
+
+
+def ticket_cache():
+    return caches[getattr(settings, 'DOCUMENTS_EVENTS_TICKET_CACHE', 'shared')]
+
+
+def ticket_key(ticket):
+    return f'documents:events:ticket:{ticket}'
+
+
+def issue_ticket(user):
+    # EventSource can't send headers, so the stream is opened with a
+    # short-lived, single-use ticket instead of the API token, which would
+    # end up in access logs and browser history.
+    ticket = secrets.token_urlsafe(32)
+    ticket_cache().set(
+        ticket_key(ticket), user.pk, getattr(settings, 'DOCUMENTS_EVENTS_TICKET_TTL', 30)
+    )
+    return ticket
+
+
+def redeem_ticket(ticket):
+    cache = ticket_cache()
+    user_id = cache.get(ticket_key(ticket))
+    # Only the request whose delete removes the entry may use it.
+    if user_id is None or not cache.delete(ticket_key(ticket)):
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).first()
+
+
+async def authenticate_stream(request):
+    ticket = request.GET.get('ticket')
+    if ticket:
+        return await sync_to_async(redeem_ticket)(ticket)
+    header = request.headers.get('Authorization', '').split()
+    if len(header) == 2 and header[0].lower() == 'token':
+        try:
+            user, _ = await sync_to_async(CachedTokenAuthentication().authenticate_credentials)(header[1])
+        except AuthenticationFailed:
+            return None
+        return user
+    user = await request.auser()
+    return user if user.is_authenticated else None
+
+
+def format_event(event):
+    data = json.dumps(event, cls=JSONEncoder)
+    return f"id: {event['id']}\nevent: {event['model']}.{event['action']}\ndata: {data}\n\n"
+
+
+async def replay(user, since):
+    # Catch a reconnecting client up from the change feed.
+    limit = getattr(settings, 'DOCUMENTS_CHANGES_MAX_PAGE_SIZE', 1000)
+    events, cursor, has_more = await sync_to_async(changes.changes_since)(user, since, limit)
+    pushed = [
+        event for event in events
+        if notifications.is_pushed(event['model'], event['action'])
+    ]
+    return pushed, cursor, has_more
+
+
+async def event_stream(request):
+    user = await authenticate_stream(request)
+    if user is None:
+        return JsonResponse(
+            {'detail': 'Authentication credentials were not provided.'}, status=401
+        )
+
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID') or request.GET.get('since') or 0)
+    except ValueError:
+        last_event_id = 0
+    heartbeat = getattr(settings, 'DOCUMENTS_EVENTS_HEARTBEAT', 15)
+    broker = notifications.get_broker()
+    # Subscribe before replaying so nothing published in between is lost;
+    # duplicates are skipped by id.
+    subscription = broker.subscribe(user.pk)
+
+    async def stream():
+        try:
+            yield 'retry: 5000\n\n'
+            seen = 0
+            if last_event_id:
+                events, cursor, has_more = await replay(user, last_event_id)
+                for event in events:
+                    yield format_event(event)
+                seen = cursor
+                if has_more:
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+            while True:
+                try:
+                    event = await subscription.get(heartbeat)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                if event['id'] > seen:
+                    yield format_event(event)
+                if subscription.overflowed:
+                    # Too far behind: the client reloads through /api/changes/.
+                    yield 'event: reset\ndata: {}\n\n'
+                    return
+        finally:
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream.
+    response['X-Accel-Buffering'] = 'no'
+    return response
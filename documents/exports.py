@@ -0,0 +1,241 @@
+import csv
+import io
+import json
+import zipfile
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header
+
+from . import archives
+from .downloads import CHUNK_SIZE
+from .models import Archive, Document, DocumentType
+
+# Streaming ZIP export: the selected documents' files under files/ plus a
+# manifest in the layout imports.py reads (archives.csv, document_types.csv,
+# employees.csv for the uploaders and documents.csv, or manifest.json), so an
+# export can be imported into another installation. The archive is produced
+# while it is sent: ZipFile writes into a sink without seek(), using data
+# descriptors instead of patching local headers, and the sink is emptied
+# after every block, so memory use is bounded by CHUNK_SIZE whatever the
+# export's size.
+
+MANIFEST_FORMATS = ('csv', 'json')
+BATCH_SIZE = 1000
+
+ARCHIVE_VALUES = {
+    'name': 'name',
+    'location': 'location',
+    'description': 'description',
+    'kind': 'kind',
+    'parent': 'parent_id',
+}
+EMPLOYEE_VALUES = {
+    'username': 'username',
+    'first_name': 'first_name',
+    'last_name': 'last_name',
+    'email': 'email',
+    'department': 'employee__department__name',
+    'job_title': 'employee__job_title__title',
+    'phone_number': 'employee__phone_number',
+}
+DOCUMENT_VALUES = {
+    'id': 'id',
+    'title': 'title',
+    'file': 'file',
+    'document_type': 'document_type__name',
+    'category': 'document_type__category',
+    'archive': 'archive_id',
+    'uploaded_by': 'uploaded_by__username',
+    'is_personal': 'is_personal',
+    'status': 'status',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'checksum': 'checksum',
+}
+COLUMNS = {
+    'archives': tuple(ARCHIVE_VALUES),
+    'document_types': ('name', 'category', 'description'),
+    'employees': tuple(EMPLOYEE_VALUES),
+    'documents': tuple(DOCUMENT_VALUES),
+}
+
+
+class ZipSink(io.RawIOBase):
+    # Write-only target for ZipFile. seek() and tell() raise, which makes
+    # ZipFile track offsets itself and stream its output.
+
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        self.size = 0
+        return data
+
+    def drain_full(self):
+        # Lets the compressed manifests build up whole blocks.
+        return self.drain() if self.size >= CHUNK_SIZE else b''
+
+
+def iter_keyset(values, field, batch_size=BATCH_SIZE):
+    # Short queries instead of one cursor held open for the whole export.
+    batch = list(values.order_by(field)[:batch_size])
+    while batch:
+        yield from batch
+        batch = list(values.filter(**{f'{field}__gt': batch[-1][field]}).order_by(field)[:batch_size])
+
+
+def member_name(file_name):
+    return f'files/{file_name}'
+
+
+def write_files(archive, sink, documents, missing):
+    storage = Document._meta.get_field('file').storage
+    # Documents sharing a content-addressed blob share one member.
+    names = documents.exclude(file='').values('file').distinct()
+    for name in (row['file'] for row in iter_keyset(names, 'file')):
+        try:
+            source = storage.open(name, 'rb')
+        except FileNotFoundError:
+            missing.add(name)
+            continue
+        with source:
+            info = zipfile.ZipInfo(
+                member_name(name),
+                timezone.localtime(storage.get_modified_time(name)).timetuple()[:6],
+            )
+            # Sized up front, so members over 4 GiB get ZIP64 headers.
+            info.file_size = source.size
+            with archive.open(info, 'w') as target:
+                for chunk in source.chunks(CHUNK_SIZE):
+                    target.write(chunk)
+                    yield sink.drain()
+
+
+def document_rows(documents, missing, include_files, archive_names):
+    values = documents.values(*DOCUMENT_VALUES.values())
+    for document in iter_keyset(values, 'id'):
+        row = {column: document[field] for column, field in DOCUMENT_VALUES.items()}
+        row['archive'] = archive_names.get(row['archive'], '')
+        name = row['file']
+        row['file'] = member_name(name) if include_files and name and name not in missing else ''
+        yield row
+
+
+def archive_rows(archive_names):
+    # With the archives they are nested in, parents first (path order), so
+    # the import can rebuild the tree. Parents are given by their path of
+    # names, as names repeat across the tree.
+    rows = Archive.objects.filter(pk__in=archive_names).order_by('path')
+    for archive in rows.values(*ARCHIVE_VALUES.values()).iterator():
+        row = {column: archive[field] for column, field in ARCHIVE_VALUES.items()}
+        row['parent'] = archive_names.get(row['parent'], '')
+        yield row
+
+
+def document_type_rows(documents):
+    return DocumentType.objects.filter(
+        pk__in=documents.exclude(document_type=None).values('document_type_id')
+    ).order_by('pk').values(*COLUMNS['document_types']).iterator()
+
+
+def employee_rows(documents):
+    users = User.objects.filter(pk__in=documents.values('uploaded_by_id')).order_by('pk')
+    for user in users.values(*EMPLOYEE_VALUES.values()).iterator():
+        yield {column: user[field] for column, field in EMPLOYEE_VALUES.items()}
+
+
+def open_manifest(archive, name):
+    info = zipfile.ZipInfo(name, timezone.localtime().timetuple()[:6])
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return archive.open(info, 'w')
+
+
+def write_csv(archive, sink, name, columns, rows):
+    with open_manifest(archive, name) as member:
+        text = io.TextIOWrapper(member, encoding='utf-8', newline='', write_through=True)
+        writer = csv.DictWriter(text, columns)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({
+                column: value.isoformat() if hasattr(value, 'isoformat') else value
+                for column, value in row.items()
+            })
+            yield sink.drain_full()
+        text.detach()
+    yield sink.drain()
+
+
+def write_json(archive, sink, sections):
+    # {"archives": [...], ..., "documents": [...]}, encoded one row at a time.
+    encoder = DjangoJSONEncoder()
+    with open_manifest(archive, 'manifest.json') as member:
+        member.write(b'{')
+        for index, (kind, rows) in enumerate(sections):
+            member.write((b',\n' if index else b'\n') + json.dumps(kind).encode() + b': [')
+            for position, row in enumerate(rows):
+                member.write((b',\n' if position else b'\n') + encoder.encode(row).encode())
+                yield sink.drain_full()
+            member.write(b'\n]')
+        member.write(b'\n}\n')
+    yield sink.drain()
+
+
+def export_stream(documents, manifest='csv', include_files=True):
+    """Yield the ZIP export of the `documents` queryset in blocks."""
+    documents = documents.select_related(None).prefetch_related(None).order_by()
+    sink = ZipSink()
+    missing = set()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        if include_files:
+            yield from write_files(archive, sink, documents, missing)
+        # id -> path of names for the exported archives and their ancestors
+        archive_names = archives.name_paths(
+            archives.with_ancestors(documents.exclude(archive=None).values('archive_id'))
+        )
+        sections = [
+            ('archives', archive_rows(archive_names)),
+            ('document_types', document_type_rows(documents)),
+            ('employees', employee_rows(documents)),
+            ('documents', document_rows(documents, missing, include_files, archive_names)),
+        ]
+        if manifest == 'json':
+            yield from write_json(archive, sink, sections)
+        else:
+            for kind, rows in sections:
+                yield from write_csv(archive, sink, f'{kind}.csv', COLUMNS[kind], rows)
+    yield sink.drain()
+
+
+async def aiter_export(blocks):
+    # Under ASGI each block is produced on the sync thread, where the
+    # queries run; Django would otherwise collect a sync iterator into a list.
+    step = sync_to_async(next, thread_sensitive=True)
+    done = object()
+    while (block := await step(blocks, done)) is not done:
+        if block:
+            yield block
+
+
+def export_response(documents, filename, manifest='csv', include_files=True, asynchronous=False):
+    blocks = export_stream(documents, manifest, include_files)
+    response = StreamingHttpResponse(
+        aiter_export(blocks) if asynchronous else (block for block in blocks if block),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    return response
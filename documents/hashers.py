@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.exceptions import ImproperlyConfigured
+
+# OWASP's recommended work factor for PBKDF2-HMAC-SHA256.
+MIN_ITERATIONS = 600000
+
+
+class TunablePBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    # Django's PBKDF2 hasher with the work factor taken from settings, which
+    # may be set below Django's default but not below MIN_ITERATIONS.
+    #
+    # Rehashing on login only ever strengthens a hash: stored hashes with
+    # fewer iterations than configured are upgraded, while those with more
+    # (e.g. made by Django's default hasher, which shares the algorithm name)
+    # are kept as they are. Hashes from the other hashers in PASSWORD_HASHERS
+    # are converted by Django because their algorithm differs.
+
+    @property
+    def iterations(self):
+        iterations = getattr(
+            settings, 'DOCUMENTS_PASSWORD_HASH_ITERATIONS',
+            hashers.PBKDF2PasswordHasher.iterations
+        )
+        if iterations < MIN_ITERATIONS:
+            raise ImproperlyConfigured(
+                f'DOCUMENTS_PASSWORD_HASH_ITERATIONS must be at least {MIN_ITERATIONS}'
+            )
+        return iterations
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        return (
+            decoded['iterations'] < self.iterations
+            or hashers.must_update_salt(decoded['salt'], self.salt_entropy)
+        )
@@ -0,0 +1,610 @@
+import csv
+import hashlib
+import io
+import json
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, time
+from itertools import islice
+from pathlib import Path, PurePosixPath
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from . import access, archives, changes, response_cache, stats
+from .blobs import acquire_blobs, discard_unreferenced
+from .downloads import CHUNK_SIZE
+from .jobs import enqueue_many
+from .models import Archive, Checkpoint, Department, Document, DocumentType, Employee, JobTitle
+from .storage import is_content_addressed
+
+# Bulk import of legacy archives. A bundle is a ZIP file or a directory with a
+# manifest - manifest.json ({"departments": [...], "documents": [...], ...})
+# or one <kind>.csv per kind - and the files its documents refer to. Kinds are
+# imported in KINDS order, so rows can name the departments, types, archives
+# and users of earlier kinds (or already in the database). Each batch is
+# inserted with bulk_create() and committed together with the checkpoint, so
+# an interrupted import resumes after its last committed batch. bulk_create()
+# sends no signals: blob references, access rows, statistics, the change
+# feed and processing jobs are maintained here.
+
+KINDS = ('departments', 'job_titles', 'document_types', 'archives', 'employees', 'documents')
+MAX_ERRORS = 100
+
+# kind -> (lookup, model, name field, other fields)
+REFERENCE_KINDS = {
+    'departments': ('department', Department, 'name', ('description',)),
+    'job_titles': ('job_title', JobTitle, 'title', ('description',)),
+    'document_types': ('document_type', DocumentType, 'name', ('category', 'description')),
+    'archives': ('archive', Archive, 'name', ('location', 'description', 'kind')),
+}
+LOOKUPS = {
+    'department': (Department, 'name'),
+    'job_title': (JobTitle, 'title'),
+    'document_type': (DocumentType, 'name'),
+    'archive': (Archive, 'name'),
+    'user': (User, 'username'),
+}
+CATEGORIES = {value for value, _ in DocumentType._meta.get_field('category').choices}
+ARCHIVE_KINDS = {value for value, _ in Archive.KIND_CHOICES}
+STATUSES = {value for value, _ in Document.STATUS_CHOICES}
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'on'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', 'off'}
+
+
+class ManifestError(Exception):
+    pass
+
+
+class ImportConflict(Exception):
+    pass
+
+
+class RowError(Exception):
+    pass
+
+
+class Bundle:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.local = threading.local()
+        self.handles = []
+        self.lock = threading.Lock()
+        if self.path.is_dir():
+            self.is_zip = False
+        elif self.path.is_file() and zipfile.is_zipfile(self.path):
+            self.is_zip = True
+        else:
+            raise ManifestError(f'{path} is neither a directory nor a ZIP file')
+
+        self.manifest = None
+        if self.exists('manifest.json'):
+            try:
+                with self.open('manifest.json') as raw:
+                    self.manifest = json.load(io.TextIOWrapper(raw, encoding='utf-8-sig'))
+            except ValueError as e:
+                raise ManifestError(f'manifest.json is not valid JSON: {e}')
+            if not isinstance(self.manifest, dict) or not all(
+                isinstance(self.manifest.get(kind, []), list) for kind in KINDS
+            ):
+                raise ManifestError('manifest.json must map kinds to lists of rows')
+        elif not any(self.exists(f'{kind}.csv') for kind in KINDS):
+            raise ManifestError(
+                f"No manifest.json or {', '.join(f'{kind}.csv' for kind in KINDS)} found"
+            )
+
+    def zip_file(self):
+        # Reads through one ZipFile share a file position, so each copying
+        # thread opens its own.
+        handle = getattr(self.local, 'zip_file', None)
+        if handle is None:
+            handle = self.local.zip_file = zipfile.ZipFile(self.path)
+            with self.lock:
+                self.handles.append(handle)
+        return handle
+
+    def close(self):
+        for handle in self.handles:
+            handle.close()
+
+    @staticmethod
+    def member(name):
+        # Paths are relative to the bundle root and may not leave it.
+        path = PurePosixPath(str(name).replace('\\', '/'))
+        if not path.parts or path.is_absolute() or '..' in path.parts:
+            raise RowError(f'Invalid file path {name!r}')
+        return str(path)
+
+    def exists(self, name):
+        if not self.is_zip:
+            return (self.path / name).is_file()
+        try:
+            self.zip_file().getinfo(name)
+        except KeyError:
+            return False
+        return True
+
+    def open(self, name):
+        name = self.member(name)
+        if not self.is_zip:
+            return open(self.path / name, 'rb')
+        try:
+            return self.zip_file().open(name)
+        except KeyError:
+            raise FileNotFoundError(name)
+
+    def rows(self, kind):
+        """(line, row) pairs of one kind; CSV manifests are streamed."""
+        if self.manifest is not None:
+            yield from enumerate(self.manifest.get(kind, []), 1)
+            return
+        if not self.exists(f'{kind}.csv'):
+            return
+        with self.open(f'{kind}.csv') as raw:
+            reader = csv.DictReader(io.TextIOWrapper(raw, encoding='utf-8-sig', newline=''))
+            for row in reader:
+                yield reader.line_num, row
+
+    def fingerprint(self):
+        digest = hashlib.sha256()
+        for name in ('manifest.json', *(f'{kind}.csv' for kind in KINDS)):
+            if self.exists(name):
+                digest.update(name.encode())
+                with self.open(name) as raw:
+                    for chunk in iter(lambda: raw.read(CHUNK_SIZE), b''):
+                        digest.update(chunk)
+        return digest.hexdigest()
+
+
+def text(row, field):
+    value = row.get(field)
+    return '' if value is None else str(value).strip()
+
+
+def flag(value, default):
+    if isinstance(value, bool):
+        return value
+    value = '' if value is None else str(value).strip().lower()
+    if not value:
+        return default
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise RowError(f'Invalid boolean {value!r}')
+
+
+def timestamp(value):
+    if not value:
+        return None
+    try:
+        parsed = parse_datetime(value)
+        if parsed is None:
+            day = parse_date(value)
+            parsed = datetime.combine(day, time()) if day else None
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise RowError(f'Invalid date {value!r}')
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def check_lengths(model, values):
+    # SQLite doesn't enforce max_length; other backends would fail the batch.
+    for field, value in values.items():
+        max_length = getattr(model._meta.get_field(field), 'max_length', None)
+        if max_length and value and len(value) > max_length:
+            raise RowError(f'{field} is longer than {max_length} characters')
+
+
+def archive_key(*names):
+    # 'Room A/Cabinet 2/Box 1': the path of names manifests use for archives.
+    # Accepts whole or partial paths and drops empty parts and stray spaces.
+    parts = (part.strip() for name in names for part in name.split(archives.NAME_SEPARATOR))
+    return archives.NAME_SEPARATOR.join(part for part in parts if part)
+
+
+def checkpoint_name(fingerprint):
+    return f'import:{fingerprint}'
+
+
+def job_checkpoint(job_id):
+    return f'import-job:{job_id}'
+
+
+class Importer:
+    def __init__(self, bundle, checkpoint=None, owner=None, batch_size=None, workers=None, progress=None):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise ManifestError('Bulk imports need a database that returns ids from bulk inserts')
+        self.bundle = bundle
+        self.fingerprint = bundle.fingerprint()
+        self.checkpoint_name = checkpoint or checkpoint_name(self.fingerprint)
+        self.owner_id = getattr(owner, 'pk', owner)
+        self.batch_size = batch_size or getattr(settings, 'DOCUMENTS_IMPORT_BATCH_SIZE', 500)
+        self.workers = workers or getattr(settings, 'DOCUMENTS_IMPORT_WORKERS', 4)
+        self.progress = progress
+        self.file_field = Document._meta.get_field('file')
+        self.storage = self.file_field.storage
+
+    def load_lookups(self):
+        # name -> id for everything rows can refer to. Where names repeat the
+        # oldest row wins, as it is loaded last. Archives are looked up by
+        # their path of names (archive_key()).
+        self.lookups = {
+            lookup: dict(model.objects.order_by('-pk').values_list(field, 'pk'))
+            for lookup, (model, field) in LOOKUPS.items() if model is not Archive
+        }
+        self.archive_keys = archives.name_paths()
+        self.lookups['archive'] = {
+            key: pk for pk, key in sorted(self.archive_keys.items(), reverse=True)
+        }
+
+    def load_checkpoint(self):
+        self.checkpoint, _ = Checkpoint.objects.get_or_create(name=self.checkpoint_name)
+        state = self.checkpoint.state
+        if state.get('fingerprint', self.fingerprint) != self.fingerprint:
+            raise ManifestError(
+                f'Checkpoint {self.checkpoint_name!r} belongs to a different manifest'
+            )
+        self.state = {
+            'fingerprint': self.fingerprint,
+            'finished': False,
+            'rows': {},
+            'created': {},
+            'skipped': {},
+            'failed': {},
+            'errors': [],
+            **state,
+        }
+
+    def save_checkpoint(self):
+        # Claimed like the overdue scan's checkpoint: if another import of
+        # the same checkpoint committed a batch meanwhile, this one stops.
+        now = timezone.now()
+        if not Checkpoint.objects.filter(
+            pk=self.checkpoint.pk, updated_at=self.checkpoint.updated_at
+        ).update(state=self.state, updated_at=now):
+            raise ImportConflict(f'Another import is using checkpoint {self.checkpoint_name!r}')
+        self.checkpoint.updated_at = now
+
+    def count(self, key, kind, n=1):
+        if n:
+            self.state[key][kind] = self.state[key].get(kind, 0) + n
+
+    def fail(self, kind, line, error):
+        self.count('failed', kind)
+        if len(self.state['errors']) < MAX_ERRORS:
+            self.state['errors'].append({'kind': kind, 'line': line, 'error': str(error)})
+
+    def run(self):
+        self.load_checkpoint()
+        if self.state['finished']:
+            return self.state
+        self.load_lookups()
+        with ThreadPoolExecutor(max_workers=self.workers) as self.pool:
+            for kind in KINDS:
+                rows = islice(self.bundle.rows(kind), self.state['rows'].get(kind, 0), None)
+                while batch := list(islice(rows, self.batch_size)):
+                    self.import_batch(kind, batch)
+        with transaction.atomic():
+            self.state['finished'] = True
+            self.save_checkpoint()
+        return self.state
+
+    def import_batch(self, kind, batch):
+        # Files are copied before the transaction, so the database is only
+        # locked for the inserts, and removed again if the batch fails.
+        rows = []
+        for line, row in batch:
+            if isinstance(row, dict):
+                rows.append((line, row))
+            else:
+                self.fail(kind, line, 'Row is not an object')
+        prepared = self.prepare_documents(rows) if kind == 'documents' else rows
+        try:
+            with transaction.atomic():
+                if kind in REFERENCE_KINDS:
+                    self.insert_references(kind, prepared)
+                else:
+                    getattr(self, f'insert_{kind}')(prepared)
+                self.count('rows', kind, len(batch))
+                self.save_checkpoint()
+        except BaseException:
+            if kind == 'documents':
+                discard_unreferenced(self.storage, [item['file'] for item in prepared])
+            raise
+        if self.progress is not None:
+            self.progress(kind, len(batch), self.state)
+
+    def create(self, lookup, objects):
+        model, field = LOOKUPS[lookup]
+        objects = model.objects.bulk_create(objects)
+        if model is Archive:
+            archives.assign_paths(objects)
+        for obj in objects:
+            key = getattr(obj, field)
+            if model is Archive:
+                key = archive_key(self.archive_keys.get(obj.parent_id, ''), key)
+                self.archive_keys[obj.pk] = key
+            self.lookups[lookup][key] = obj.pk
+        if objects and model is not User:
+            response_cache.bump_version(model)
+        return objects
+
+    def ensure(self, lookup, names, kind, defaults=None):
+        # Creates the referenced rows that don't exist yet (by name).
+        model, field = LOOKUPS[lookup]
+        missing = {
+            name: model(**{field: name}, **(defaults or {}).get(name, {}))
+            for name in names if name and name not in self.lookups[lookup]
+        }
+        self.count('created', kind, len(self.create(lookup, list(missing.values()))))
+
+    def insert_references(self, kind, batch):
+        lookup, model, field, fields = REFERENCE_KINDS[kind]
+        objects = {}
+        parents = {}
+        for line, row in batch:
+            try:
+                name = text(row, field)
+                if not name:
+                    raise RowError(f'Missing {field}')
+                key = name
+                if model is Archive:
+                    if archives.NAME_SEPARATOR in name:
+                        raise RowError(f'Archive names cannot contain {archives.NAME_SEPARATOR!r}')
+                    key = archive_key(text(row, 'parent'), name)
+                if key in self.lookups[lookup] or key in objects:
+                    self.count('skipped', kind)
+                    continue
+                values = {key: text(row, key) for key in fields}
+                values['description'] = values['description'] or None
+                if 'category' in values and values['category'] not in CATEGORIES:
+                    raise RowError(f"Invalid category {values['category']!r}")
+                if values.get('kind') and values['kind'] not in ARCHIVE_KINDS:
+                    raise RowError(f"Invalid kind {values['kind']!r}")
+                check_lengths(model, {field: name, **values})
+            except RowError as e:
+                self.fail(kind, line, e)
+                continue
+            objects[key] = model(**{field: name}, **values)
+            parents[key] = (line, archive_key(text(row, 'parent')))
+        if model is Archive:
+            self.create_archives(objects, parents)
+        else:
+            self.count('created', kind, len(self.create(lookup, list(objects.values()))))
+
+    def create_archives(self, objects, parents):
+        # An archive row may name its parent, which must exist already or come
+        # earlier in the manifest. Rows are created a level at a time so that
+        # parents from the same batch have ids and paths first.
+        known = self.lookups['archive']
+        while objects:
+            ready = {
+                key: archive for key, archive in objects.items()
+                if not parents[key][1] or parents[key][1] in known
+            }
+            if not ready:
+                break
+            for key, archive in ready.items():
+                archive.parent_id = known.get(parents[key][1])
+                del objects[key]
+            self.count('created', 'archives', len(self.create('archive', list(ready.values()))))
+        for key in objects:
+            line, parent = parents[key]
+            self.fail('archives', line, f'Unknown parent archive {parent!r}')
+
+    def ensure_archives(self, keys):
+        # Archives that documents are filed in but the manifest doesn't list
+        # are created along with their missing ancestors.
+        objects = {}
+        parents = {}
+        for key in keys:
+            names = key.split(archives.NAME_SEPARATOR) if key else []
+            for depth, name in enumerate(names, 1):
+                path = archive_key(*names[:depth])
+                if path not in self.lookups['archive'] and path not in objects:
+                    objects[path] = Archive(name=name, location='')
+                    parents[path] = (None, archive_key(*names[:depth - 1]))
+        self.create_archives(objects, parents)
+
+    def insert_employees(self, batch):
+        kind = 'employees'
+        rows = {}
+        for line, row in batch:
+            try:
+                username = text(row, 'username')
+                if not username:
+                    raise RowError('Missing username')
+                user = {key: text(row, key) for key in ('first_name', 'last_name', 'email')}
+                check_lengths(User, {'username': username, **user})
+                phone_number = text(row, 'phone_number') or None
+                check_lengths(Employee, {'phone_number': phone_number})
+            except RowError as e:
+                self.fail(kind, line, e)
+                continue
+            if username in rows:
+                self.count('skipped', kind)
+                continue
+            rows[username] = {
+                'user': user,
+                'department': text(row, 'department'),
+                'job_title': text(row, 'job_title'),
+                'phone_number': phone_number,
+            }
+
+        users = self.lookups['user']
+        existing_users = {users[username] for username in rows if username in users}
+        self.create('user', [
+            User(username=username, password=make_password(None), **row['user'])
+            for username, row in rows.items() if username not in users
+        ])
+        self.ensure('department', {row['department'] for row in rows.values()}, 'departments')
+        self.ensure('job_title', {row['job_title'] for row in rows.values()}, 'job_titles')
+
+        has_employee = set(Employee.objects.filter(
+            user_id__in=[users[username] for username in rows]
+        ).values_list('user_id', flat=True))
+        employees = [
+            Employee(
+                user_id=users[username],
+                department_id=self.lookups['department'].get(row['department']),
+                job_title_id=self.lookups['job_title'].get(row['job_title']),
+                phone_number=row['phone_number'],
+            )
+            for username, row in rows.items() if users[username] not in has_employee
+        ]
+        Employee.objects.bulk_create(employees)
+        self.count('created', kind, len(employees))
+        self.count('skipped', kind, len(rows) - len(employees))
+
+        # Documents of users who existed without an employee row move out of
+        # the '' department counter (move_department_stats in signals.py).
+        departments = {
+            employee.user_id: str(employee.department_id or '')
+            for employee in employees if employee.user_id in existing_users
+        }
+        for user_id, count in Document.objects.filter(
+            uploaded_by_id__in=departments
+        ).values('uploaded_by_id').annotate(count=Count('id')).values_list('uploaded_by_id', 'count'):
+            stats.move_documents('department', '', departments[user_id], count)
+
+    def prepare_documents(self, batch):
+        kind = 'documents'
+        items = []
+        for line, row in batch:
+            try:
+                path = self.bundle.member(text(row, 'file'))
+                username = text(row, 'uploaded_by')
+                uploaded_by = self.lookups['user'].get(username) if username else self.owner_id
+                if uploaded_by is None:
+                    raise RowError(f'Unknown user {username!r}' if username else 'Missing uploaded_by')
+                document_status = text(row, 'status') or 'active'
+                if document_status not in STATUSES:
+                    raise RowError(f'Invalid status {document_status!r}')
+                item = {
+                    'line': line,
+                    'path': path,
+                    'title': text(row, 'title') or PurePosixPath(path).stem,
+                    'uploaded_by_id': uploaded_by,
+                    'document_type': text(row, 'document_type'),
+                    'category': text(row, 'category'),
+                    'archive': archive_key(text(row, 'archive')),
+                    'is_personal': flag(row.get('is_personal'), True),
+                    'status': document_status,
+                    'created_at': timestamp(text(row, 'created_at')),
+                }
+                check_lengths(Document, {'title': item['title']})
+                check_lengths(DocumentType, {'name': item['document_type']})
+                for name in item['archive'].split(archives.NAME_SEPARATOR):
+                    check_lengths(Archive, {'name': name})
+            except RowError as e:
+                self.fail(kind, line, e)
+                continue
+            items.append(item)
+
+        prepared = []
+        for item, (name, error) in zip(items, self.pool.map(self.store, items)):
+            if error:
+                self.fail(kind, item['line'], error)
+            else:
+                prepared.append({**item, 'file': name})
+        return prepared
+
+    def store(self, item):
+        # Runs on the worker threads; storage.save() hashes and copies.
+        path = item['path']
+        try:
+            with self.bundle.open(path) as source:
+                filename = self.file_field.generate_filename(None, PurePosixPath(path).name)
+                return self.storage.save(filename, File(source, name=filename)), None
+        except FileNotFoundError:
+            return None, f'File {path!r} is not in the bundle'
+        except (OSError, zipfile.BadZipFile) as e:
+            return None, f'Cannot read {path!r}: {e}'
+
+    def insert_documents(self, items):
+        kind = 'documents'
+        types = self.lookups['document_type']
+        # A new type takes its category from the first row that gives one.
+        new_types = {}
+        for item in items:
+            name = item['document_type']
+            if name and name not in types and item['category'] in CATEGORIES:
+                new_types.setdefault(name, {'category': item['category']})
+        valid = []
+        rejected = []
+        for item in items:
+            name = item['document_type']
+            if name and name not in types and name not in new_types:
+                self.fail(kind, item['line'], f'Unknown document type {name!r}')
+                rejected.append(item['file'])
+            else:
+                valid.append(item)
+        if rejected:
+            transaction.on_commit(lambda: discard_unreferenced(self.storage, rejected))
+        self.ensure('document_type', new_types, 'document_types', defaults=new_types)
+        self.ensure_archives({item['archive'] for item in valid})
+
+        content_addressed = is_content_addressed(self.storage)
+        documents = Document.objects.bulk_create([
+            Document(
+                title=item['title'],
+                file=item['file'],
+                document_type_id=types.get(item['document_type']),
+                uploaded_by_id=item['uploaded_by_id'],
+                archive_id=self.lookups['archive'].get(item['archive']),
+                is_personal=item['is_personal'],
+                status=item['status'],
+                checksum=(content_addressed and self.storage.digest_from_name(item['file'])) or '',
+            )
+            for item in valid
+        ])
+        # auto_now_add overrides created_at on insert; legacy dates go in after.
+        dated = []
+        for document, item in zip(documents, valid):
+            if item['created_at']:
+                document.created_at = item['created_at']
+                dated.append(document)
+        Document.objects.bulk_update(dated, ['created_at'])
+
+        if content_addressed:
+            acquire_blobs(self.storage, [
+                document.file.name for document in documents
+                if self.storage.digest_from_name(document.file.name)
+            ])
+        access.grant_owners(
+            (document.pk, document.uploaded_by_id, document.created_at) for document in documents
+        )
+        stats.documents_created(stats.snapshot(document, stats.DOCUMENT_FIELDS) for document in documents)
+        enqueue_many('process_document', documents)
+        changes.documents_changed([document.pk for document in documents], 'created')
+        self.count('created', kind, len(documents))
+
+
+def import_bundle(path, checkpoint=None, restart=False, **options):
+    """Import the bundle at `path` (ZIP file or directory); returns the
+    checkpoint state with per-kind row, created, skipped and failed counts."""
+    bundle = Bundle(path)
+    try:
+        importer = Importer(bundle, checkpoint=checkpoint, **options)
+        if restart:
+            Checkpoint.objects.filter(name=importer.checkpoint_name).delete()
+        return importer.run()
+    finally:
+        bundle.close()
+
+
+def get_import_dir():
+    path = Path(getattr(settings, 'DOCUMENTS_IMPORT_DIR', Path(settings.MEDIA_ROOT) / 'imports'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
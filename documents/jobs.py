@@ -0,0 +1,141 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+TASKS = {}
+
+
+def task(name, max_attempts=5):
+    def register(func):
+        TASKS[name] = (func, max_attempts)
+        return func
+    return register
+
+
+def enqueue(name, document=None, payload=None, delay=0):
+    func, max_attempts = TASKS[name]
+    job = Job.objects.create(
+        task=name,
+        document=document,
+        payload=payload or {},
+        max_attempts=max_attempts,
+        run_after=timezone.now() + timedelta(seconds=delay),
+    )
+    if getattr(settings, 'DOCUMENTS_JOBS_EAGER', False):
+        # Development mode: run right after the surrounding transaction
+        # commits, in-process, instead of waiting for a worker.
+        transaction.on_commit(lambda: run_job(job))
+    return job
+
+
+def enqueue_many(name, documents):
+    # One INSERT for a batch of documents (bulk imports).
+    func, max_attempts = TASKS[name]
+    run_after = timezone.now()
+    jobs = Job.objects.bulk_create([
+        Job(task=name, document=document, max_attempts=max_attempts, run_after=run_after)
+        for document in documents
+    ])
+    if getattr(settings, 'DOCUMENTS_JOBS_EAGER', False):
+        transaction.on_commit(lambda: [run_job(job) for job in jobs])
+    return jobs
+
+
+def backoff_delay(attempts):
+    base = getattr(settings, 'DOCUMENTS_JOBS_RETRY_BACKOFF', 30)
+    cap = getattr(settings, 'DOCUMENTS_JOBS_RETRY_BACKOFF_MAX', 3600)
+    delay = min(base * 2 ** (attempts - 1), cap)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def requeue_stale(timeout=None):
+    # Jobs left 'running' by a crashed worker go back to the queue.
+    if timeout is None:
+        timeout = getattr(settings, 'DOCUMENTS_JOBS_LOCK_TIMEOUT', 600)
+    cutoff = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(status='running', locked_at__lt=cutoff).update(
+        status='queued', locked_by='', locked_at=None
+    )
+
+
+def heartbeat(job):
+    # Called between the steps of long tasks, so requeue_stale() does not
+    # hand a job that is still running to a second worker.
+    Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by).update(
+        locked_at=timezone.now()
+    )
+
+
+def claim_jobs(worker_id, limit):
+    now = timezone.now()
+    with transaction.atomic():
+        candidates = list(
+            Job.objects.filter(status='queued', run_after__lte=now)
+            .order_by('run_after', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not candidates:
+            return []
+        # The status condition makes the claim safe against other workers
+        # that selected the same candidates.
+        Job.objects.filter(id__in=candidates, status='queued').update(
+            status='running', locked_by=worker_id, locked_at=now
+        )
+    return list(
+        Job.objects.filter(id__in=candidates, status='running', locked_by=worker_id)
+        .select_related('document')
+    )
+
+
+def run_job(job):
+    entry = TASKS.get(job.task)
+    job.attempts += 1
+    try:
+        if entry is None:
+            raise LookupError(f'Unknown task {job.task!r}')
+        func, _ = entry
+        func(job)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = 'queued'
+            job.run_after = timezone.now() + timedelta(seconds=backoff_delay(job.attempts))
+            logger.warning('Job %s (%s) failed, retrying', job.pk, job.task)
+        else:
+            job.status = 'failed'
+            logger.exception('Job %s (%s) failed permanently', job.pk, job.task)
+            on_failure = getattr(func, 'on_failure', None) if entry else None
+            if on_failure is not None:
+                on_failure(job)
+    else:
+        job.status = 'succeeded'
+        job.last_error = ''
+    job.locked_by = ''
+    job.locked_at = None
+    # A queryset update, because the job row is gone if its document was
+    # deleted while the job ran.
+    Job.objects.filter(pk=job.pk).update(
+        status=job.status,
+        attempts=job.attempts,
+        run_after=job.run_after,
+        last_error=job.last_error,
+        locked_by='',
+        locked_at=None,
+        updated_at=timezone.now(),
+    )
+    return job
+
+
+def purge_finished(older_than):
+    cutoff = timezone.now() - older_than
+    deleted, _ = Job.objects.filter(status='succeeded', updated_at__lt=cutoff).delete()
+    return deleted
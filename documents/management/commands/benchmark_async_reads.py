@@ -0,0 +1,183 @@
+import asyncio
+import io
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.authtoken.models import Token
+
+from documents.models import Document
+from smartdoc.asgi import application as asgi_application
+
+HOST = 'localhost'
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the document list/download endpoints with many concurrent "
+        "slow clients, comparing the ASGI deployment (async views) with WSGI "
+        "workers limited to --workers threads. Both apps run in-process; "
+        "slow clients are simulated by reading at --bandwidth KiB/s."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', choices=['download', 'list'], default='download')
+        parser.add_argument('--clients', type=int, default=100, help="Concurrent clients")
+        parser.add_argument('--workers', type=int, default=8, help="WSGI worker threads")
+        parser.add_argument('--size', type=int, default=1024, help="Download size in KiB")
+        parser.add_argument('--documents', type=int, default=50, help="Documents to list")
+        parser.add_argument(
+            '--bandwidth', type=float, default=512, help="Per-client download speed in KiB/s"
+        )
+
+    def handle(self, *args, **options):
+        if options['clients'] < 1 or options['workers'] < 1 or options['bandwidth'] <= 0:
+            raise CommandError('--clients, --workers and --bandwidth must be positive')
+        # The apps read from other threads, so the fixtures are committed and
+        # removed afterwards rather than rolled back.
+        user = User.objects.create_user('benchmark-async-reads')
+        try:
+            token = Token.objects.create(user=user).key
+            documents = self.create_documents(user, options)
+            if options['endpoint'] == 'download':
+                path = f'/api/documents/{documents[0].pk}/download/'
+            else:
+                path = '/api/documents/'
+            rate = options['bandwidth'] * 1024
+            clients = options['clients']
+
+            self.stdout.write(
+                f"{clients} clients at {options['bandwidth']:g} KiB/s, GET {path}"
+            )
+            self.stdout.write(
+                f"{'deployment':<18} {'wall s':>8} {'req/s':>8} {'p50 ms':>9} "
+                f"{'p95 ms':>9} {'max ms':>9} {'threads':>8}"
+            )
+            self.report('wsgi', self.run_wsgi(path, token, clients, options['workers'], rate))
+            self.report('asgi', asyncio.run(self.run_asgi(path, token, clients, rate)))
+        finally:
+            for document in Document.objects.filter(uploaded_by=user):
+                document.delete()
+            user.delete()
+
+    def create_documents(self, user, options):
+        count = 1 if options['endpoint'] == 'download' else options['documents']
+        content = os.urandom(options['size'] * 1024)
+        documents = []
+        for i in range(count):
+            document = Document(title=f'Benchmark {i}', uploaded_by=user, processing_status='ready')
+            document.file.save(f'benchmark-{i}.bin', ContentFile(content), save=False)
+            document.save()
+            documents.append(document)
+        return documents
+
+    def run_wsgi(self, path, token, clients, workers, rate):
+        handler = WSGIHandler()
+
+        def client(queued_at):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '',
+                'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'HTTP_HOST': HOST,
+                'HTTP_AUTHORIZATION': f'Token {token}', 'SCRIPT_NAME': '',
+                'wsgi.input': io.BytesIO(), 'wsgi.url_scheme': 'http',
+                'wsgi.errors': io.StringIO(),
+            }
+            statuses = []
+            body = handler(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            try:
+                # A sync worker stays busy until the client has read everything.
+                for chunk in body:
+                    time.sleep(len(chunk) / rate)
+            finally:
+                body.close()
+            self.check_status(int(statuses[0].split()[0]))
+            return time.perf_counter() - queued_at
+
+        monitor = ThreadMonitor()
+        started = time.perf_counter()
+        with monitor, ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(client, time.perf_counter()) for _ in range(clients)]
+            latencies = [future.result() for future in futures]
+        return latencies, time.perf_counter() - started, monitor.peak
+
+    async def run_asgi(self, path, token, clients, rate):
+        async def client():
+            started = time.perf_counter()
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+                'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '',
+                'query_string': b'', 'server': (HOST, 80), 'client': ('127.0.0.1', 0),
+                'headers': [
+                    (b'host', HOST.encode()),
+                    (b'authorization', f'Token {token}'.encode()),
+                ],
+            }
+            messages = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            done = asyncio.Event()
+            statuses = []
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                await done.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif message.get('body'):
+                    await asyncio.sleep(len(message['body']) / rate)
+
+            try:
+                await asgi_application(scope, receive, send)
+            finally:
+                done.set()
+            self.check_status(statuses[0])
+            return time.perf_counter() - started
+
+        monitor = ThreadMonitor()
+        started = time.perf_counter()
+        with monitor:
+            latencies = await asyncio.gather(*[client() for _ in range(clients)])
+        return latencies, time.perf_counter() - started, monitor.peak
+
+    def check_status(self, status):
+        if status != 200:
+            raise CommandError(f'Unexpected response status {status}')
+
+    def report(self, name, result):
+        latencies, wall, threads = result
+        latencies = sorted(latency * 1000 for latency in latencies)
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"{name:<18} {wall:8.2f} {len(latencies) / wall:8.1f} "
+            f"{statistics.median(latencies):9.1f} {p95:9.1f} {latencies[-1]:9.1f} {threads:8}"
+        )
+
+
+class ThreadMonitor:
+    # Samples the number of live threads while a run is in progress.
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = threading.active_count()
+        self.stopped = threading.Event()
+
+    def __enter__(self):
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, threading.active_count())
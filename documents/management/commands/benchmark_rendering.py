@@ -0,0 +1,118 @@
+import gzip
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from documents.middleware import brotli, compress
+from documents.models import Archive, BorrowRequest, Document, DocumentType
+from documents.renderers import FastJSONRenderer, orjson
+from documents.serializers import (
+    BorrowRequestSerializer, DocumentCompactSerializer, DocumentSerializer
+)
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare JSON encode time and payload size (raw, gzip, brotli) for "
+        "document and borrow request lists, using throwaway fixtures"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', type=int, default=500)
+        parser.add_argument('--shares', type=int, default=5, help="Users each document is shared with")
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                payloads = self.build_payloads(options['documents'], options['shares'])
+                raise Rollback
+        except Rollback:
+            pass
+
+        renderers = [('drf', JSONRenderer())]
+        if orjson is not None:
+            renderers.append(('orjson', FastJSONRenderer()))
+        else:
+            self.stdout.write(self.style.WARNING("orjson is not installed; only DRF's renderer is measured"))
+
+        self.stdout.write(
+            f"{'payload':<22} {'renderer':<8} {'encode ms':>10} {'raw KiB':>9} "
+            f"{'gzip KiB':>9} {'br KiB':>8}"
+        )
+        for name, data in payloads:
+            for renderer_name, renderer in renderers:
+                elapsed = self.time_render(renderer, data, options['repeat'])
+                body = renderer.render(data)
+                gzipped = len(gzip.compress(body, 6))
+                brotlied = f"{len(compress(body, 'br')) / 1024:8.1f}" if brotli is not None else f"{'-':>8}"
+                self.stdout.write(
+                    f"{name:<22} {renderer_name:<8} {elapsed * 1000:10.2f} {len(body) / 1024:9.1f} "
+                    f"{gzipped / 1024:9.1f} {brotlied}"
+                )
+
+    def build_payloads(self, document_count, share_count):
+        owner = User.objects.create_user('benchmark-owner', first_name='Bench', last_name='Owner')
+        users = [
+            User(username=f'benchmark-user-{i}', email=f'user{i}@example.com', first_name='Sample', last_name=f'User {i}')
+            for i in range(share_count)
+        ]
+        users = User.objects.bulk_create(users)
+        document_type = DocumentType.objects.create(name='Công văn đến', category='incoming', description='Incoming correspondence')
+        archive = Archive.objects.create(name='Kho lưu trữ A', location='Tầng 2, phòng 204')
+
+        documents = Document.objects.bulk_create([
+            Document(
+                title=f'Quyết định số {i}/QĐ-UBND về việc phê duyệt kế hoạch năm {2020 + i % 5}',
+                file=f'documents/benchmark/{i:06}.pdf', checksum=f'{i:064x}',
+                uploaded_by=owner, document_type=document_type, archive=archive,
+                is_personal=bool(i % 2), status='active', processing_status='ready',
+            )
+            for i in range(document_count)
+        ])
+        through = Document.shared_with.through
+        through.objects.bulk_create([
+            through(document_id=document.pk, user_id=user.pk)
+            for document in documents for user in users
+        ])
+        today = timezone.now().date()
+        BorrowRequest.objects.bulk_create([
+            BorrowRequest(
+                document=document, requested_by=users[0] if users else owner,
+                purpose='Tra cứu hồ sơ phục vụ thanh tra', borrow_date=today, return_date=today
+            )
+            for document in documents[:document_count // 2]
+        ])
+
+        request = APIRequestFactory().get('/api/documents/', HTTP_HOST='localhost')
+        context = {'request': request}
+        queryset = Document.objects.filter(uploaded_by=owner)
+        borrow_requests = BorrowRequestSerializer.setup_eager_loading(BorrowRequest.objects.all())
+        return [
+            ('documents (full)', DocumentSerializer(
+                DocumentSerializer.setup_eager_loading(queryset), many=True, context=context
+            ).data),
+            ('documents (compact)', DocumentCompactSerializer(
+                DocumentCompactSerializer.setup_eager_loading(queryset), many=True
+            ).data),
+            ('borrow requests', BorrowRequestSerializer(
+                borrow_requests, many=True, context=context
+            ).data),
+        ]
+
+    def time_render(self, renderer, data, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            renderer.render(data)
+            best = min(best, time.perf_counter() - started)
+        return best
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from documents import query_plans
+
+
+class Command(BaseCommand):
+    help = (
+        "Run EXPLAIN QUERY PLAN on every query issued by the API's GET endpoints "
+        "and fail when a full table scan or temporary sort appears that is not "
+        "in the baseline"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--update-baseline',
+            action='store_true',
+            help="Accept the current findings as the new baseline",
+        )
+        parser.add_argument(
+            '--baseline',
+            default=str(query_plans.BASELINE_PATH),
+            help="Path of the baseline JSON file",
+        )
+        parser.add_argument(
+            '--show-sql',
+            action='store_true',
+            help="Print the offending SQL under each finding",
+        )
+
+    def handle(self, *args, **options):
+        findings = query_plans.collect_plans()
+
+        if options['update_baseline']:
+            query_plans.save_baseline(findings, options['baseline'])
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {options['baseline']}"))
+            return
+
+        baseline = query_plans.load_baseline(options['baseline'])
+        new = []
+        for finding in sorted(findings):
+            if finding in baseline:
+                self.stdout.write(f"  allowed  {finding}")
+            else:
+                new.append(finding)
+                label = 'SCAN' if query_plans.is_full_scan(finding) else 'SORT'
+                self.stdout.write(self.style.ERROR(f"  {label:<8} {finding}"))
+            if options['show_sql']:
+                for sql in dict.fromkeys(findings[finding]):
+                    self.stdout.write(f"           {sql}")
+
+        for finding in sorted(baseline - set(findings)):
+            self.stdout.write(f"  fixed    {finding} (can be removed from the baseline)")
+
+        if new:
+            raise CommandError(f"{len(new)} query plan regression(s) found")
+        self.stdout.write(self.style.SUCCESS("No query plan regressions"))
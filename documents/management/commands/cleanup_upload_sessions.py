@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from documents.blobs import purge_released, releasable_blobs
+from documents.models import Document, UploadSession
+from documents.storage import is_content_addressed
+from documents.uploads import discard_part_file, expired_sessions
+
+
+class Command(BaseCommand):
+    help = "Delete chunked upload sessions that have been idle longer than the TTL"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--max-age-hours',
+            type=float,
+            help="Override DOCUMENTS_UPLOAD_SESSION_TTL_HOURS",
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only report what would be deleted",
+        )
+
+    def handle(self, *args, **options):
+        max_age = None
+        if options['max_age_hours'] is not None:
+            max_age = timedelta(hours=options['max_age_hours'])
+
+        removed = 0
+        for session in expired_sessions(UploadSession.objects.all(), max_age).iterator():
+            if not options['dry_run']:
+                discard_part_file(session)
+                session.delete()
+            removed += 1
+
+        verb = "Would delete" if options['dry_run'] else "Deleted"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {removed} upload session(s)"))
+
+        storage = Document._meta.get_field('file').storage
+        if is_content_addressed(storage):
+            if options['dry_run']:
+                released = releasable_blobs().count()
+            else:
+                released = purge_released(storage)
+            self.stdout.write(self.style.SUCCESS(f"{verb} {released} unreferenced blob(s)"))
@@ -0,0 +1,81 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from documents import imports
+
+
+class Command(BaseCommand):
+    help = (
+        "Import departments, job titles, document types, archives, employees "
+        "and documents from a ZIP file or directory holding manifest.json or "
+        "<kind>.csv manifests and the document files. Progress is "
+        "checkpointed per batch; running the same import again resumes it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help="ZIP file or directory")
+        parser.add_argument(
+            '--owner',
+            help="Username that owns documents whose row has no uploaded_by",
+        )
+        parser.add_argument('--batch-size', type=int, default=None, help="Rows per transaction")
+        parser.add_argument('--workers', type=int, default=None, help="File copying threads")
+        parser.add_argument(
+            '--checkpoint',
+            help="Checkpoint name (defaults to one derived from the manifest contents)",
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help="Forget the checkpoint and import every row again",
+        )
+
+    def handle(self, *args, **options):
+        owner = None
+        if options['owner']:
+            owner = User.objects.filter(username=options['owner']).first()
+            if owner is None:
+                raise CommandError(f"Unknown user {options['owner']!r}")
+        for option in ('batch_size', 'workers'):
+            if options[option] is not None and options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive")
+
+        self.started = time.monotonic()
+        self.processed = 0
+        try:
+            state = imports.import_bundle(
+                options['source'],
+                checkpoint=options['checkpoint'],
+                restart=options['restart'],
+                owner=owner,
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                progress=self.report_progress,
+            )
+        except (imports.ManifestError, imports.ImportConflict) as e:
+            raise CommandError(str(e))
+
+        if not self.processed:
+            self.stdout.write("No rows left to import; use --restart to import this manifest again")
+        for error in state['errors']:
+            self.stderr.write(f"{error['kind']}.{error['line']}: {error['error']}")
+        failed = sum(state['failed'].values())
+        if failed > len(state['errors']):
+            self.stderr.write(f"... and {failed - len(state['errors'])} more")
+        summary = ', '.join(
+            f"{kind}: {state['created'].get(kind, 0)} created, "
+            f"{state['skipped'].get(kind, 0)} existing, {state['failed'].get(kind, 0)} failed"
+            for kind in imports.KINDS
+            if any(kind in state[key] for key in ('rows', 'created'))
+        )
+        self.stdout.write(self.style.SUCCESS(f"Import finished. {summary or 'No rows.'}"))
+
+    def report_progress(self, kind, batch_rows, state):
+        self.processed += batch_rows
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"{kind}: {state['rows'][kind]} rows, {state['created'].get(kind, 0)} created, "
+            f"{state['failed'].get(kind, 0)} failed ({self.processed / elapsed:.0f} rows/s)"
+        )
@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from documents import changes
+
+
+class Command(BaseCommand):
+    help = "Delete change feed events older than the retention period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=float,
+            help="Override DOCUMENTS_CHANGES_RETENTION_DAYS",
+        )
+
+    def handle(self, *args, **options):
+        older_than = None
+        if options['days'] is not None:
+            older_than = timedelta(days=options['days'])
+        deleted = changes.purge(older_than)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} change event(s)"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from documents import access
+
+
+class Command(BaseCommand):
+    help = "Recompute the document access table from document owners and shares"
+
+    def handle(self, *args, **options):
+        access.sync()
+        self.stdout.write(self.style.SUCCESS("Document access table rebuilt"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from documents import search
+from documents.models import Document
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index for all documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help="Drop existing index rows first, forcing every file to be re-extracted",
+        )
+
+    def handle(self, *args, **options):
+        if not search.is_enabled():
+            self.stdout.write(self.style.WARNING("Full-text search requires SQLite FTS5"))
+            return
+
+        if options['clear']:
+            search.clear_index()
+
+        documents = Document.objects.select_related(
+            'document_type', 'uploaded_by'
+        ).prefetch_related('shared_with')
+
+        indexed = 0
+        for document in documents.iterator(chunk_size=500):
+            search.index_document(document)
+            indexed += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} document(s)"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from documents import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the statistics counters from the document and borrow request tables"
+
+    def handle(self, *args, **options):
+        stats.rebuild()
+        self.stdout.write(self.style.SUCCESS("Statistics counters rebuilt"))
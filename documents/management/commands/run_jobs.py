@@ -0,0 +1,90 @@
+import os
+import socket
+import time
+import uuid
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from documents import jobs
+
+
+def run_in_thread(job):
+    try:
+        return jobs.run_job(job)
+    finally:
+        # Each worker thread has its own database connection.
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs (document processing, etc.)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=getattr(settings, 'DOCUMENTS_JOBS_CONCURRENCY', 2),
+            help="Maximum number of jobs executed at the same time",
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=getattr(settings, 'DOCUMENTS_JOBS_POLL_INTERVAL', 2.0),
+            help="Seconds to sleep when the queue is empty",
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Exit once no job is ready to run",
+        )
+        parser.add_argument(
+            '--purge-after-days',
+            type=float,
+            default=7,
+            help="Delete succeeded jobs older than this many days",
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stdout.write(f"Worker {worker_id} started with concurrency {concurrency}")
+
+        processed = 0
+        last_maintenance = 0
+        running = set()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            try:
+                while True:
+                    close_old_connections()
+                    if time.monotonic() - last_maintenance > 60:
+                        jobs.requeue_stale()
+                        jobs.purge_finished(timedelta(days=options['purge_after_days']))
+                        last_maintenance = time.monotonic()
+
+                    # Claim only as many jobs as there are free threads, so a
+                    # slow job never holds back the rest of the queue.
+                    claimed = []
+                    if len(running) < concurrency:
+                        claimed = jobs.claim_jobs(worker_id, concurrency - len(running))
+                    running.update(executor.submit(run_in_thread, job) for job in claimed)
+                    if not running:
+                        if options['once']:
+                            break
+                        time.sleep(options['poll_interval'])
+                        continue
+
+                    done, running = wait(
+                        running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED
+                    )
+                    for future in done:
+                        job = future.result()
+                        processed += 1
+                        self.stdout.write(f"{job.task} #{job.pk}: {job.status}")
+            except KeyboardInterrupt:
+                self.stdout.write("Interrupted, finishing running jobs")
+
+        self.stdout.write(self.style.SUCCESS(f"Processed {processed} job(s)"))
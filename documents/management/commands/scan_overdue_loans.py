@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from documents import overdue
+from documents.models import Checkpoint
+
+
+class Command(BaseCommand):
+    help = (
+        "Notify requesters and staff about overdue borrow requests. Meant to "
+        "run nightly; each run only looks at loans that fell due (or reached "
+        "a reminder interval) since the previous run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="List the notifications without recording them or advancing the checkpoint",
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help="Forget the previous run, so every overdue loan is notified again",
+        )
+
+    def handle(self, *args, **options):
+        if options['reset'] and not options['dry_run']:
+            Checkpoint.objects.filter(name=overdue.CHECKPOINT).delete()
+        try:
+            digests = overdue.scan(batch_size=options['batch_size'], dry_run=options['dry_run'])
+        except overdue.ScanConflict as e:
+            raise CommandError(str(e))
+
+        loans = {loan['id'] for user_loans in digests.values() for loan in user_loans}
+        if options['verbosity'] > 1:
+            usernames = dict(User.objects.filter(pk__in=digests).values_list('id', 'username'))
+            for user_id, user_loans in sorted(digests.items()):
+                ids = ', '.join(str(loan['id']) for loan in user_loans)
+                self.stdout.write(f"{usernames.get(user_id, user_id)}: {len(user_loans)} loan(s) [{ids}]")
+        prefix = "Would notify" if options['dry_run'] else "Notified"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {len(digests)} user(s) about {len(loans)} overdue loan(s)"
+        ))
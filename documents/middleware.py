@@ -0,0 +1,101 @@
+import gzip
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import brotli
+except ImportError:  # responses are gzip-only without the brotli package
+    brotli = None
+
+COMPRESSIBLE_TYPES = re.compile(r'^(text/|application/(json|javascript|xml)|image/svg\+xml)')
+
+ACCEPT_ENCODING_RE = re.compile(r'^\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*$')
+
+
+def accepted_encodings(header):
+    """Map each coding in an Accept-Encoding header to its q-value."""
+    encodings = {}
+    for part in header.split(','):
+        match = ACCEPT_ENCODING_RE.match(part)
+        if not match:
+            continue
+        coding, quality = match.groups()
+        try:
+            encodings[coding.lower()] = float(quality) if quality is not None else 1.0
+        except ValueError:
+            continue
+    return encodings
+
+
+def choose_encoding(header):
+    encodings = accepted_encodings(header)
+    wildcard = encodings.get('*', 0)
+    candidates = ['br', 'gzip'] if brotli is not None else ['gzip']
+    best, best_quality = None, 0
+    for coding in candidates:
+        quality = encodings.get(coding, wildcard)
+        # Ties go to the earlier, denser coding.
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(content, coding):
+    if coding == 'br':
+        return brotli.compress(content, quality=getattr(settings, 'DOCUMENTS_BROTLI_QUALITY', 5))
+    return gzip.compress(content, compresslevel=getattr(settings, 'DOCUMENTS_GZIP_LEVEL', 6), mtime=0)
+
+
+class CompressionMiddleware:
+    # Compresses API and other text responses with brotli or gzip, whichever
+    # the client prefers, once they reach DOCUMENTS_COMPRESSION_MIN_SIZE.
+    # Streaming responses (downloads, previews) are left alone: they are
+    # mostly compressed formats already and may be served as byte ranges.
+
+    # Async-capable, so under ASGI the async views are not run through a
+    # worker thread on account of this middleware.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')):
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        min_size = getattr(settings, 'DOCUMENTS_COMPRESSION_MIN_SIZE', 1024)
+        if len(response.content) < min_size:
+            return response
+        coding = choose_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        compressed = compress(response.content, coding)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = coding
+        # The bytes differ from the uncompressed representation, so the
+        # validator becomes weak (as Django's GZipMiddleware does).
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        return response
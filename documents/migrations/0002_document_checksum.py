@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="checksum",
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+    ]
@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS documents_search USING fts5("
+        "title, type_name, people, content, checksum UNINDEXED, "
+        "tokenize = 'unicode61 remove_diacritics 2')"
+    )
+
+
+def drop_search_table(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    schema_editor.execute("DROP TABLE IF EXISTS documents_search")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0004_storedblob_alter_document_file"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_table, drop_search_table),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def mark_existing_ready(apps, schema_editor):
+    # Documents uploaded before the job queue existed have no pending work.
+    Document = apps.get_model("documents", "Document")
+    Document.objects.update(processing_status="ready")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0005_document_search_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="processing_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("processing", "Processing"),
+                    ("ready", "Ready"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                editable=False,
+                max_length=20,
+            ),
+        ),
+        migrations.RunPython(mark_existing_ready, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name="Job",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("task", models.CharField(max_length=100)),
+                ("payload", models.JSONField(blank=True, default=dict)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("running", "Running"),
+                            ("succeeded", "Succeeded"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                    ),
+                ),
+                ("attempts", models.PositiveIntegerField(default=0)),
+                ("max_attempts", models.PositiveIntegerField(default=5)),
+                ("run_after", models.DateTimeField()),
+                ("locked_by", models.CharField(blank=True, max_length=100)),
+                ("locked_at", models.DateTimeField(blank=True, null=True)),
+                ("last_error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "document",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="jobs",
+                        to="documents.document",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "run_after"], name="documents_job_queue_idx"
+                    )
+                ],
+            },
+        ),
+    ]
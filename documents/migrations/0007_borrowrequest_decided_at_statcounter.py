@@ -0,0 +1,40 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0006_document_processing_status_job"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="borrowrequest",
+            name="decided_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name="StatCounter",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("scope", models.CharField(max_length=30)),
+                ("dimension", models.CharField(max_length=30)),
+                ("key", models.CharField(blank=True, max_length=50)),
+                ("count", models.BigIntegerField(default=0)),
+                ("total", models.BigIntegerField(default=0)),
+            ],
+            options={
+                "unique_together": {("scope", "dimension", "key")},
+            },
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0007_borrowrequest_decided_at_statcounter"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowrequest",
+            index=models.Index(
+                condition=models.Q(("status", "pending")),
+                fields=["created_at"],
+                name="borrow_pending_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrequest",
+            index=models.Index(
+                fields=["requested_by", "created_at"], name="borrow_requester_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="borrowrequest",
+            index=models.Index(fields=["created_at"], name="borrow_created_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(
+                condition=models.Q(("is_personal", True)),
+                fields=["uploaded_by", "created_at"],
+                name="doc_owner_personal_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(
+                condition=models.Q(("is_personal", False)),
+                fields=["uploaded_by", "created_at"],
+                name="doc_owner_office_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(
+                fields=["uploaded_by", "status", "created_at"],
+                name="doc_owner_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="document",
+            index=models.Index(fields=["created_at"], name="doc_created_idx"),
+        ),
+        # The auto-created shared_with table only has (document_id, user_id);
+        # "shared with me" lookups start from the user.
+        migrations.RunSQL(
+            "CREATE INDEX IF NOT EXISTS doc_shared_user_doc_idx "
+            "ON documents_document_shared_with (user_id, document_id)",
+            "DROP INDEX IF EXISTS doc_shared_user_doc_idx",
+        ),
+    ]
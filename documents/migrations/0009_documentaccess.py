@@ -0,0 +1,81 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_access(apps, schema_editor):
+    Document = apps.get_model("documents", "Document")
+    DocumentAccess = apps.get_model("documents", "DocumentAccess")
+    DocumentAccess.objects.bulk_create(
+        [
+            DocumentAccess(user_id=user_id, document_id=document_id, kind="owner")
+            for document_id, user_id in Document.objects.values_list(
+                "id", "uploaded_by_id"
+            )
+        ],
+        batch_size=1000,
+    )
+    DocumentAccess.objects.bulk_create(
+        [
+            DocumentAccess(user_id=user_id, document_id=document_id, kind="shared")
+            for document_id, user_id in Document.shared_with.through.objects.values_list(
+                "document_id", "user_id"
+            )
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0008_access_path_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentAccess",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("owner", "Owner"), ("shared", "Shared")],
+                        max_length=10,
+                    ),
+                ),
+                (
+                    "document",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="access",
+                        to="documents.document",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="document_access",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("user", "document")},
+            },
+        ),
+        migrations.RunPython(backfill_access, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-18 03:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0010_changeevent"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="borrowrequest",
+            index=models.Index(
+                condition=models.Q(("status", "approved")),
+                fields=["document", "borrow_date", "return_date"],
+                name="borrow_approved_period_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import CharField, Value
+from django.db.models.functions import Cast, Concat
+
+
+def set_root_paths(apps, schema_editor):
+    # Existing archives become roots: '/<id>/'.
+    Archive = apps.get_model("documents", "Archive")
+    Archive.objects.update(
+        path=Concat(Value("/"), Cast("id", CharField()), Value("/")), depth=0
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0012_overdue_scan"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="archive",
+            name="depth",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="archive",
+            name="kind",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("room", "Room"),
+                    ("cabinet", "Cabinet"),
+                    ("shelf", "Shelf"),
+                    ("box", "Box"),
+                    ("folder", "Folder"),
+                ],
+                max_length=20,
+            ),
+        ),
+        migrations.AddField(
+            model_name="archive",
+            name="parent",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="children",
+                to="documents.archive",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archive",
+            name="path",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name="archive",
+            index=models.Index(fields=["path"], name="archive_path_idx"),
+        ),
+        migrations.RunPython(set_root_paths, migrations.RunPython.noop),
+    ]
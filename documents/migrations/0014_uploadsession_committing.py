@@ -0,0 +1,26 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0013_archive_tree"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="uploadsession",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("open", "Open"),
+                    ("committing", "Committing"),
+                    ("committed", "Committed"),
+                ],
+                default="open",
+                max_length=20,
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-18 04:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0014_uploadsession_committing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="storedblob",
+            name="pinned_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
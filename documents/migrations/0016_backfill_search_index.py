@@ -0,0 +1,57 @@
+from django.db import migrations
+from django.utils import timezone
+
+
+def backfill_search_index(apps, schema_editor):
+    # Documents uploaded before the index existed get their metadata indexed
+    # here and a processing job to extract their file contents.
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    Document = apps.get_model("documents", "Document")
+    Job = apps.get_model("documents", "Job")
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT rowid FROM documents_search")
+        indexed = {row[0] for row in cursor.fetchall()}
+
+    rows = []
+    jobs = []
+    now = timezone.now()
+    documents = Document.objects.select_related(
+        "document_type", "uploaded_by"
+    ).prefetch_related("shared_with")
+    for document in documents.iterator(chunk_size=500):
+        if document.pk in indexed:
+            continue
+        people = [document.uploaded_by.username]
+        people += [user.username for user in document.shared_with.all()]
+        type_name = document.document_type.name if document.document_type_id else ""
+        rows.append((document.pk, document.title, type_name, " ".join(people)))
+        jobs.append(
+            Job(
+                task="process_document",
+                document_id=document.pk,
+                max_attempts=5,
+                run_after=now,
+            )
+        )
+
+    # No checksum, so process_document extracts the file in full.
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            "INSERT INTO documents_search "
+            "(rowid, title, type_name, people, content, checksum) "
+            "VALUES (%s, %s, %s, %s, '', NULL)",
+            rows,
+        )
+    Job.objects.bulk_create(jobs, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0015_storedblob_pinned_at"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_search_index, migrations.RunPython.noop),
+    ]
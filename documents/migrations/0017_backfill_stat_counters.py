@@ -0,0 +1,69 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count
+
+DOCUMENT_GROUPINGS = {
+    "status": "status",
+    "category": "document_type__category",
+    "department": "uploaded_by__employee__department",
+    "archive": "archive",
+}
+
+
+def month_key(value):
+    return value.strftime("%Y-%m") if value else ""
+
+
+def rebuild_stat_counters(apps, schema_editor):
+    # Migration 0007 created the counters empty; fill them from the existing
+    # rows the way documents.stats.rebuild() does.
+    Document = apps.get_model("documents", "Document")
+    BorrowRequest = apps.get_model("documents", "BorrowRequest")
+    StatCounter = apps.get_model("documents", "StatCounter")
+    counters = defaultdict(lambda: [0, 0])
+
+    for dimension, field in DOCUMENT_GROUPINGS.items():
+        for row in Document.objects.values(field).annotate(n=Count("id")).order_by():
+            counters[("documents", dimension, str(row[field] or ""))][0] += row["n"]
+    for created_at in Document.objects.values_list("created_at", flat=True).iterator():
+        counters[("documents", "month", month_key(created_at))][0] += 1
+
+    borrow_requests = BorrowRequest.objects.values(
+        "status", "created_at", "decided_at", "borrow_date", "actual_return_date"
+    )
+    for values in borrow_requests.iterator():
+        counters[("borrow_requests", "status", values["status"])][0] += 1
+        counters[("borrow_requests", "month", month_key(values["created_at"]))][0] += 1
+        if values["decided_at"] and values["created_at"]:
+            counter = counters[("borrow_requests", "turnaround", "decision")]
+            counter[0] += 1
+            counter[1] += int(
+                (values["decided_at"] - values["created_at"]).total_seconds()
+            )
+        if values["actual_return_date"] and values["borrow_date"]:
+            counter = counters[("borrow_requests", "turnaround", "loan")]
+            counter[0] += 1
+            counter[1] += (values["actual_return_date"] - values["borrow_date"]).days
+
+    StatCounter.objects.all().delete()
+    StatCounter.objects.bulk_create(
+        [
+            StatCounter(
+                scope=scope, dimension=dimension, key=key, count=count, total=total
+            )
+            for (scope, dimension, key), (count, total) in counters.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0016_backfill_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_stat_counters, migrations.RunPython.noop),
+    ]
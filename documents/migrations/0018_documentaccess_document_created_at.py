@@ -0,0 +1,40 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_document_created_at(apps, schema_editor):
+    Document = apps.get_model("documents", "Document")
+    DocumentAccess = apps.get_model("documents", "DocumentAccess")
+    DocumentAccess.objects.update(
+        document_created_at=Subquery(
+            Document.objects.filter(pk=OuterRef("document_id")).values("created_at")
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0017_backfill_stat_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="documentaccess",
+            name="document_created_at",
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.RunPython(copy_document_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="documentaccess",
+            name="document_created_at",
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name="documentaccess",
+            index=models.Index(
+                fields=["user", "document_created_at", "document"],
+                name="access_user_created_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,93 @@
+from functools import wraps
+
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from . import response_cache
+from .db import read_routing
+
+class EagerLoadingViewSetMixin:
+    # Applies the select_related/prefetch_related declared on the serializer
+    # (see serializers.EagerLoadingMixin) so list endpoints run a fixed number
+    # of queries regardless of how many rows they return.
+    
+    def optimize_queryset(self, queryset):
+        serializer_class = self.get_serializer_class()
+        setup_eager_loading = getattr(serializer_class, 'setup_eager_loading', None)
+        if setup_eager_loading is None:
+            return queryset
+        return setup_eager_loading(queryset, request=self.request)
+    
+    def get_queryset(self):
+        return self.optimize_queryset(super().get_queryset())
+
+class PaginatedListMixin:
+    # Custom list actions go through the view's paginator just like list().
+    
+    def paginated_response(self, queryset):
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            serializer = self.get_serializer(page, many=True)
+            return self.get_paginated_response(serializer.data)
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
+
+class ReadRoutingMixin:
+    # Safe-method actions read through the read database alias (see
+    # db.ReadWriteRouter); writes made during them still go to default.
+    
+    def dispatch(self, request, *args, **kwargs):
+        with read_routing(request.method in SAFE_METHODS):
+            return super().dispatch(request, *args, **kwargs)
+
+def cache_response(func):
+    # Serves a GET action through CachedResponseMixin.cached_response.
+    @wraps(func)
+    def wrapper(self, request, *args, **kwargs):
+        return self.cached_response(request, func, *args, **kwargs)
+    return wrapper
+
+class CachedResponseMixin:
+    # Caches rendered JSON for list/retrieve (and actions decorated with
+    # cache_response) under the version of every model in cache_models, and
+    # answers If-None-Match with 304. Only suitable for data that is the same
+    # for every authenticated user.
+    cache_models = None
+    
+    def get_cache_models(self):
+        return self.cache_models or [self.queryset.model]
+    
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        return super().list(request, *args, **kwargs)
+    
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+    
+    def cached_response(self, request, handler, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            # The browsable API embeds the user and a CSRF token.
+            return handler(self, request, *args, **kwargs)
+        
+        key = response_cache.response_key(self.get_cache_models(), request)
+        entry = response_cache.get_entry(key)
+        if entry is None:
+            response = handler(self, request, *args, **kwargs)
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response
+            response.accepted_renderer = request.accepted_renderer
+            response.accepted_media_type = request.accepted_media_type
+            response.renderer_context = self.get_renderer_context()
+            response.render()
+            entry = response_cache.set_entry(key, response.content, response['Content-Type'])
+        
+        if response_cache.is_fresh(request, entry['etag']):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(entry['content'], content_type=entry['content_type'])
+        response['ETag'] = entry['etag']
+        # Any write can change the data, so clients revalidate every time.
+        response['Cache-Control'] = 'private, no-cache'
+        return response
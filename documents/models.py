@@ -1,6 +1,12 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 from django.contrib.auth.models import User
 
+from .storage import document_storage, is_content_addressed
+
 class Department(models.Model):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True, null=True)
@@ -47,9 +53,72 @@ class DocumentType(models.Model):
         return self.name
 
 class Archive(models.Model):
+    KIND_CHOICES = [
+        ('room', 'Room'),
+        ('cabinet', 'Cabinet'),
+        ('shelf', 'Shelf'),
+        ('box', 'Box'),
+        ('folder', 'Folder'),
+    ]
+    
     name = models.CharField(max_length=100)
     location = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, blank=True)
+    parent = models.ForeignKey(
+        'self', on_delete=models.PROTECT, null=True, blank=True, related_name='children'
+    )
+    # Materialized path: the ids from the root down, '/3/17/42/'. Maintained
+    # by save(); subtree queries are path ranges (see archives.py).
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['path'], name='archive_path_idx'),
+        ]
+    
+    @staticmethod
+    def subtree_filter(path, prefix=''):
+        # Paths below '/3/17/' sort between it and '/3/170' ('0' follows '/'),
+        # so a subtree is one range on archive_path_idx.
+        return models.Q(**{f'{prefix}path__gte': path, f'{prefix}path__lt': path[:-1] + '0'})
+    
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if not adding and kwargs.get('update_fields') is None:
+            # path and depth are only written by move_subtree().
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in ('path', 'depth')
+            ]
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            parent_path = '/'
+            if self.parent_id:
+                parent_path = Archive.objects.filter(pk=self.parent_id).values_list('path', flat=True).get()
+            path = f'{parent_path}{self.pk}/'
+            # Read back: an ancestor may have moved since this row was loaded.
+            old_path = '' if adding else Archive.objects.filter(pk=self.pk).values_list('path', flat=True).get()
+            if path != old_path:
+                self.move_subtree(old_path, path)
+            self.path = path
+            self.depth = path.count('/') - 2
+    
+    def move_subtree(self, old_path, path):
+        if len(path) > self._meta.get_field('path').max_length:
+            raise ValueError('Archives are nested too deeply')
+        if not old_path:
+            # Just created (or created by bulk_create()): no descendants yet.
+            Archive.objects.filter(pk=self.pk).update(path=path, depth=path.count('/') - 2)
+            return
+        if path.startswith(old_path):
+            raise ValueError('An archive cannot be moved into its own subtree')
+        # A move rewrites the prefix of every path in the subtree at once.
+        Archive.objects.filter(Archive.subtree_filter(old_path)).update(
+            path=Concat(Value(path), Substr('path', len(old_path) + 1)),
+            depth=F('depth') + (path.count('/') - old_path.count('/')),
+        )
     
     def __str__(self):
         return self.name
@@ -62,20 +131,89 @@ class Document(models.Model):
         ('shared', 'Shared'),
     ]
     
+    PROCESSING_STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processing', 'Processing'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    
     title = models.CharField(max_length=255)
-    file = models.FileField(upload_to='documents/')
+    file = models.FileField(upload_to='documents/', storage=document_storage, max_length=255)
     document_type = models.ForeignKey(DocumentType, on_delete=models.SET_NULL, null=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='uploaded_documents')
     shared_with = models.ManyToManyField(User, related_name='shared_documents', blank=True)
     archive = models.ForeignKey(Archive, on_delete=models.SET_NULL, null=True, blank=True)
     is_personal = models.BooleanField(default=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='active')
+    checksum = models.CharField(max_length=64, blank=True, editable=False)
+    processing_status = models.CharField(
+        max_length=20, choices=PROCESSING_STATUS_CHOICES, default='pending', editable=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            # personal/office lists, keyset-ordered by (created_at, id). Partial
+            # because boolean filters compile to a bare column test that a
+            # composite index cannot seek on.
+            models.Index(
+                fields=['uploaded_by', 'created_at'],
+                name='doc_owner_personal_idx',
+                condition=models.Q(is_personal=True),
+            ),
+            models.Index(
+                fields=['uploaded_by', 'created_at'],
+                name='doc_owner_office_idx',
+                condition=models.Q(is_personal=False),
+            ),
+            # archived list and status filters per owner
+            models.Index(fields=['uploaded_by', 'status', 'created_at'], name='doc_owner_status_idx'),
+            models.Index(fields=['created_at'], name='doc_created_idx'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        # Commit the file before the row so content-addressed storage can
+        # supply the checksum without another pass over the upload.
+        if self.file and not self.file._committed:
+            self.file.save(self.file.name, self.file.file, save=False)
+        if self.file and is_content_addressed(self.file.storage):
+            self.checksum = self.file.storage.digest_from_name(self.file.name) or self.checksum
+        super().save(*args, **kwargs)
+    
     def __str__(self):
         return self.title
 
+class DocumentAccess(models.Model):
+    # Denormalized "who can see what": one row per (user, document), kept in
+    # sync with uploaded_by and shared_with (see access.py) so visibility is a
+    # single indexed lookup instead of an OR across the share table.
+    KIND_CHOICES = [
+        ('owner', 'Owner'),
+        ('shared', 'Shared'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='document_access')
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, related_name='access')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    # Copy of Document.created_at, so a user's documents can be read in list
+    # order from one index instead of being sorted per request.
+    document_created_at = models.DateTimeField()
+    
+    class Meta:
+        # Owner rows win over shared ones, so a user is never listed twice.
+        unique_together = ('user', 'document')
+        indexes = [
+            models.Index(
+                fields=['user', 'document_created_at', 'document'],
+                name='access_user_created_idx',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} -> {self.document_id} ({self.kind})"
+
 class BorrowRequest(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -92,7 +230,189 @@ class BorrowRequest(models.Model):
     borrow_date = models.DateField()
     return_date = models.DateField()
     actual_return_date = models.DateField(null=True, blank=True)
+    decided_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        indexes = [
+            # pending_approvals only ever reads the small pending subset
+            models.Index(
+                fields=['created_at'],
+                name='borrow_pending_idx',
+                condition=models.Q(status='pending'),
+            ),
+            models.Index(fields=['requested_by', 'created_at'], name='borrow_requester_idx'),
+            models.Index(fields=['created_at'], name='borrow_created_idx'),
+            # Loans past their return date (see overdue.py); returned and
+            # rejected history never enters it.
+            models.Index(
+                fields=['return_date'],
+                name='borrow_overdue_idx',
+                condition=models.Q(status='approved'),
+            ),
+            # Overlapping-loan checks when approving (see borrowing.py)
+            models.Index(
+                fields=['document', 'borrow_date', 'return_date'],
+                name='borrow_approved_period_idx',
+                condition=models.Q(status='approved'),
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.document.title} - {self.requested_by.username}"
+
+class StoredBlob(models.Model):
+    # One row per content-addressed file; refcount is the number of Document
+    # rows pointing at it, and the file is removed when it drops to zero
+    # unless an upload pinned it recently (see blobs.release_blob).
+    name = models.CharField(max_length=255, unique=True)
+    size = models.BigIntegerField(default=0)
+    refcount = models.PositiveIntegerField(default=0)
+    pinned_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+class UploadSession(models.Model):
+    STATUS_CHOICES = [
+        ('open', 'Open'),
+        ('committing', 'Committing'),
+        ('committed', 'Committed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    filename = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64, blank=True)
+    title = models.CharField(max_length=255)
+    document_type = models.ForeignKey(DocumentType, on_delete=models.SET_NULL, null=True, blank=True)
+    is_personal = models.BooleanField(default=True)
+    document = models.ForeignKey(Document, on_delete=models.SET_NULL, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='open')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @property
+    def total_chunks(self):
+        return max(1, -(-self.size // self.chunk_size))
+    
+    def expected_chunk_size(self, index):
+        if index == self.total_chunks - 1:
+            return self.size - index * self.chunk_size
+        return self.chunk_size
+    
+    def __str__(self):
+        return f"{self.filename} ({self.user.username})"
+
+class UploadChunk(models.Model):
+    session = models.ForeignKey(UploadSession, on_delete=models.CASCADE, related_name='chunks')
+    index = models.PositiveIntegerField()
+    size = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64)
+    received_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('session', 'index')
+    
+    def __str__(self):
+        return f"{self.session_id} #{self.index}"
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    
+    task = models.CharField(max_length=100)
+    document = models.ForeignKey(Document, on_delete=models.CASCADE, null=True, blank=True, related_name='jobs')
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_after = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='documents_job_queue_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+class StatCounter(models.Model):
+    # Materialized aggregates for the /api/stats/ endpoints, kept current by
+    # signals (see stats.py) instead of GROUP BY scans per request. `total`
+    # holds a running sum (e.g. seconds) for averages.
+    scope = models.CharField(max_length=30)
+    dimension = models.CharField(max_length=30)
+    key = models.CharField(max_length=50, blank=True)
+    count = models.BigIntegerField(default=0)
+    total = models.BigIntegerField(default=0)
+    
+    class Meta:
+        unique_together = ('scope', 'dimension', 'key')
+    
+    def __str__(self):
+        return f"{self.scope}.{self.dimension}[{self.key}] = {self.count}"
+
+class ChangeEvent(models.Model):
+    # Append-only feed behind /api/changes/. One row per affected user, so a
+    # client's delta query is a single (user, id) range seek; the id doubles
+    # as the sync cursor.
+    MODEL_CHOICES = [
+        ('document', 'Document'),
+        ('borrow_request', 'Borrow request'),
+    ]
+    ACTION_CHOICES = [
+        ('created', 'Created'),
+        ('updated', 'Updated'),
+        ('deleted', 'Deleted'),
+        ('shared', 'Shared'),
+        ('unshared', 'Unshared'),
+        ('archived', 'Archived'),
+        ('overdue', 'Overdue'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='change_events')
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=20, choices=ACTION_CHOICES)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='change_user_cursor_idx'),
+        ]
+    
+    def __str__(self):
+        return f"#{self.pk} {self.model} {self.object_id} {self.action} -> {self.user_id}"
+
+class Checkpoint(models.Model):
+    # Progress of incremental management commands (e.g. scan_overdue_loans),
+    # so each run continues where the previous one stopped.
+    name = models.CharField(max_length=100, unique=True)
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return self.name
+
+class CacheVersion(models.Model):
+    # Version counter per model for the reference-data response cache. Kept
+    # in the database so every worker sees a bump, whatever cache backend
+    # holds the responses (see response_cache.py).
+    model = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField()
+    
     def __str__(self):
-        return f"{self.document.title} - {self.requested_by.username}" 
\ No newline at end of file
+        return f"{self.model} v{self.version}"
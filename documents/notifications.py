@@ -0,0 +1,96 @@
+import asyncio
+import threading
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+# Push channel for /api/events/. Change events (changes.record) are handed to
+# the broker after commit; each open stream holds a subscription for its
+# user. The in-process broker only reaches streams served by the same
+# process, so multi-process deployments swap in a shared implementation
+# through DOCUMENTS_NOTIFICATION_BROKER with the same three methods.
+
+PUSHED_ACTIONS = {
+    'document': {'shared', 'unshared'},
+    'borrow_request': {'created', 'updated', 'deleted', 'overdue'},
+}
+
+
+class Subscription:
+    def __init__(self, user_id, max_pending):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop.
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A consumer this far behind resyncs from the change feed.
+            self.overflowed = True
+
+    async def get(self, timeout):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = {}
+
+    def subscribe(self, user_id):
+        subscription = Subscription(
+            user_id, getattr(settings, 'DOCUMENTS_EVENTS_MAX_PENDING', 1000)
+        )
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def publish(self, user_id, event):
+        # Safe to call from any thread, including sync views running under
+        # ASGI's thread pool.
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Loop already closed; the stream is going away.
+                pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(
+                    settings, 'DOCUMENTS_NOTIFICATION_BROKER', 'documents.notifications.InProcessBroker'
+                )
+                _broker = import_string(path)()
+    return _broker
+
+
+def is_pushed(model, action):
+    return action in PUSHED_ACTIONS.get(model, ())
+
+
+def publish_events(events):
+    """Publish (user_id, event) pairs."""
+    broker = get_broker()
+    for user_id, event in events:
+        broker.publish(user_id, event)
@@ -0,0 +1,122 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import send_mass_mail
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import changes
+from .models import BorrowRequest, Checkpoint
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT = 'scan_overdue_loans'
+
+
+class ScanConflict(Exception):
+    pass
+
+
+def overdue_loans(queryset=None, today=None):
+    # borrow_overdue_idx only holds approved loans, so this stays small no
+    # matter how much returned/rejected history accumulates.
+    if queryset is None:
+        queryset = BorrowRequest.objects.all()
+    if today is None:
+        today = timezone.now().date()
+    return queryset.filter(status='approved', return_date__lt=today)
+
+
+def due_filter(previous, now):
+    """Q for the approved loans to notify about in a run at `now` when the
+    previous run was at `previous` (None on the first run)."""
+    today = now.date()
+    if previous is None:
+        return Q(return_date__lt=today)
+    last_day = previous.date()
+    # Fell due since the previous run...
+    due = Q(return_date__gte=last_day, return_date__lt=today)
+    # ...were approved after their return date had already passed...
+    due |= Q(return_date__lt=last_day, decided_at__gt=previous)
+    # ...or reached another reminder interval. Each condition is a range on
+    # borrow_overdue_idx covering only the days elapsed since the last run.
+    interval = timedelta(days=getattr(settings, 'DOCUMENTS_OVERDUE_REMINDER_DAYS', 7))
+    for n in range(1, getattr(settings, 'DOCUMENTS_OVERDUE_MAX_REMINDERS', 4) + 1):
+        due |= Q(return_date__gte=last_day - n * interval, return_date__lt=today - n * interval)
+    return due
+
+
+def iter_batches(queryset, batch_size):
+    # Keyset batches, so memory use is bounded however many loans are due.
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            return
+        last_id = batch[-1]['id']
+        yield batch
+
+
+def scan(now=None, batch_size=1000, dry_run=False):
+    """Find the loans due a notification since the last run and notify their
+    requesters and the staff. Returns {user_id: [loan, ...]}."""
+    if now is None:
+        now = timezone.now()
+    with transaction.atomic():
+        checkpoint, _ = Checkpoint.objects.get_or_create(name=CHECKPOINT)
+        previous = checkpoint.state.get('scanned_at')
+        previous = datetime.fromisoformat(previous) if previous else None
+
+        loans = BorrowRequest.objects.filter(status='approved').filter(
+            due_filter(previous, now)
+        ).values('id', 'requested_by_id', 'document_id', 'document__title', 'return_date')
+        staff = changes.staff_ids()
+        digests = defaultdict(list)
+        for batch in iter_batches(loans, batch_size):
+            events = []
+            for loan in batch:
+                for user_id in {loan['requested_by_id'], *staff}:
+                    digests[user_id].append(loan)
+                    events.append((user_id, loan['id'], 'overdue'))
+            if not dry_run:
+                changes.record(changes.BORROW_REQUEST, events)
+
+        if dry_run:
+            transaction.set_rollback(True)
+            return digests
+        # Claimed like a job: a concurrent run that got here first wins and
+        # this one rolls back its events.
+        claimed = Checkpoint.objects.filter(
+            pk=checkpoint.pk, updated_at=checkpoint.updated_at
+        ).update(state={**checkpoint.state, 'scanned_at': now.isoformat()}, updated_at=timezone.now())
+        if not claimed:
+            raise ScanConflict('Another overdue scan finished first')
+        if getattr(settings, 'DOCUMENTS_OVERDUE_EMAILS', False):
+            transaction.on_commit(lambda: send_digests(digests, now.date()))
+    return digests
+
+
+def digest_message(user, loans, today):
+    lines = [
+        f"- {loan['document__title']}: due {loan['return_date']:%Y-%m-%d} "
+        f"({(today - loan['return_date']).days} days overdue)"
+        for loan in sorted(loans, key=lambda loan: loan['return_date'])
+    ]
+    subject = f'{len(loans)} overdue document loan(s)'
+    body = f"Hello {user.get_full_name() or user.username},\n\n" + '\n'.join(lines) + '\n'
+    return subject, body, None, [user.email]
+
+
+def send_digests(digests, today):
+    # One message per recipient, all sent over a single connection.
+    users = User.objects.filter(pk__in=digests, is_active=True).exclude(email='')
+    messages = [digest_message(user, digests[user.pk], today) for user in users]
+    try:
+        return send_mass_mail(messages, fail_silently=False)
+    except Exception:
+        logger.exception('Sending %s overdue digest(s) failed', len(messages))
+        return 0
@@ -0,0 +1,172 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.core.exceptions import ValidationError
+from rest_framework import filters
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    # Seeks from the last seen (ordering value, id) pair instead of using
+    # OFFSET, so every page costs the same no matter how deep the client is.
+    page_size = getattr(settings, 'DOCUMENTS_PAGE_SIZE', 50)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'DOCUMENTS_MAX_PAGE_SIZE', 500)
+    cursor_query_param = 'cursor'
+    ordering = '-created_at'
+    tiebreaker = 'id'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.page_queryset(queryset, request, view)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Same as paginate_queryset, fetching the page with the async ORM.
+        queryset = self.page_queryset(queryset, request, view)
+        return self.set_page([obj async for obj in queryset])
+
+    def page_queryset(self, queryset, request, view=None):
+        # The ordered, sliced queryset for the requested page, one row over
+        # the page size to tell whether there is a next page.
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        ordering = self.get_ordering(request, queryset, view)
+        self.field_name = ordering.lstrip('-')
+        self.descending = ordering.startswith('-')
+        self.model_field = queryset.model._meta.get_field(self.field_name)
+
+        position, reverse = self.decode_cursor(request)
+        # Walking backwards means reading the opposite direction and flipping
+        # the page afterwards.
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        field_name = self.seek_field(queryset, self.field_name)
+        tiebreaker = self.seek_field(queryset, self.tiebreaker)
+        queryset = queryset.order_by(prefix + field_name, prefix + tiebreaker)
+
+        if position is not None:
+            value, pk = position
+            lookup = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{field_name}__{lookup}': value}) |
+                Q(**{field_name: value, f'{tiebreaker}__{lookup}': pk})
+            )
+
+        self.position = position
+        self.reverse = reverse
+        return queryset[:self.page_size + 1]
+
+    def seek_field(self, queryset, name):
+        # A queryset can alias a copy of the column as seek_<name> on a joined
+        # table whose index is already in that order (see
+        # access.visible_documents); ordering and seeking on the copy saves
+        # the sort.
+        alias = f'seek_{name}'
+        return alias if alias in queryset.query.annotations else name
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_next = True
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                page_size = int(request.query_params[self.page_size_query_param])
+            except (KeyError, ValueError):
+                pass
+            else:
+                if page_size > 0:
+                    return min(page_size, self.max_page_size)
+        return self.page_size
+
+    def get_ordering(self, request, queryset, view):
+        # Honour ?ordering= from the view's OrderingFilter, using the first
+        # field as the seek key and the primary key to break ties.
+        for backend in getattr(view, 'filter_backends', []):
+            if issubclass(backend, filters.OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+                if ordering:
+                    return ordering[0]
+        return self.ordering
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+            value = self.model_field.to_python(data['v'])
+            pk = int(data['id'])
+            reverse = bool(data.get('r'))
+        except (TypeError, ValueError, KeyError, ValidationError, UnicodeEncodeError):
+            raise NotFound(self.invalid_cursor_message)
+        return (value, pk), reverse
+
+    def encode_cursor(self, obj, reverse=False):
+        if isinstance(obj, dict):
+            # Rows from values()
+            value = obj[self.field_name]
+            data = {
+                'v': value.isoformat() if hasattr(value, 'isoformat') else value,
+                'id': obj[self.tiebreaker],
+            }
+        else:
+            data = {
+                'v': self.model_field.value_to_string(obj),
+                'id': getattr(obj, self.tiebreaker),
+            }
+        if reverse:
+            data['r'] = 1
+        encoded = base64.urlsafe_b64encode(json.dumps(data).encode('utf-8'))
+        return encoded.decode('ascii').rstrip('=')
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        cursor = self.encode_cursor(self.page[-1])
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        cursor = self.encode_cursor(self.page[0], reverse=True)
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,176 @@
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import caches
+from PIL import Image, UnidentifiedImageError
+
+try:
+    import pypdfium2
+except ImportError:  # PDF previews are skipped without pypdfium2
+    pypdfium2 = None
+
+DEFAULT_SIZES = {
+    'small': 128,
+    'medium': 320,
+    'large': 800,
+}
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tif', '.tiff', '.webp'}
+
+PREVIEW_CONTENT_TYPE = 'image/jpeg'
+
+SIZE_KEY = 'documents:previews:size'
+# A trim leaves the cache at this share of its limit, so that the next one
+# (and the directory scan it takes) is some renders away.
+TRIM_TO = 0.9
+
+
+class PreviewUnavailable(Exception):
+    pass
+
+
+def preview_sizes():
+    return getattr(settings, 'DOCUMENTS_PREVIEW_SIZES', DEFAULT_SIZES)
+
+
+def cache_dir():
+    path = Path(getattr(settings, 'DOCUMENTS_PREVIEW_CACHE_DIR', Path(settings.MEDIA_ROOT) / 'previews'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def size_cache():
+    return caches[getattr(settings, 'DOCUMENTS_PREVIEW_SIZE_CACHE', 'default')]
+
+
+def max_cache_bytes():
+    return getattr(settings, 'DOCUMENTS_PREVIEW_CACHE_MAX_BYTES', 512 * 1024 * 1024)
+
+
+def cache_path(checksum, size_name):
+    # Keyed by content hash, so identical files share previews and a new
+    # upload never sees a stale render.
+    return cache_dir() / checksum[:2] / f'{checksum}-{size_name}.jpg'
+
+
+def render_first_page(document, max_side):
+    field_file = document.file
+    ext = os.path.splitext(field_file.name)[1].lower()
+    if ext in IMAGE_EXTENSIONS:
+        with field_file.storage.open(field_file.name, 'rb') as file:
+            try:
+                image = Image.open(file)
+                # Lets the JPEG decoder downscale while decoding.
+                image.draft('RGB', (max_side, max_side))
+                image.load()
+            except (UnidentifiedImageError, OSError) as e:
+                raise PreviewUnavailable(str(e))
+        return image
+    if ext == '.pdf' and pypdfium2 is not None:
+        # pdfium reads pages lazily from the open file, so only the first page
+        # of a large scan is ever loaded.
+        with field_file.storage.open(field_file.name, 'rb') as file:
+            try:
+                pdf = pypdfium2.PdfDocument(file)
+            except pypdfium2.PdfiumError as e:
+                raise PreviewUnavailable(str(e))
+            try:
+                if len(pdf) == 0:
+                    raise PreviewUnavailable('PDF has no pages')
+                page = pdf[0]
+                try:
+                    width, height = page.get_size()
+                    scale = max_side / max(width, height, 1)
+                    return page.render(scale=scale).to_pil()
+                finally:
+                    page.close()
+            finally:
+                pdf.close()
+    raise PreviewUnavailable(f'No preview renderer for {ext or "files without extension"}')
+
+
+def render_preview(document, size_name):
+    max_side = preview_sizes()[size_name]
+    image = render_first_page(document, max_side)
+    image.thumbnail((max_side, max_side))
+    if image.mode not in ('RGB', 'L'):
+        background = Image.new('RGB', image.size, 'white')
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+        else:
+            background.paste(image.convert('RGB'))
+        image = background
+    return image
+
+
+def get_preview(document, size_name):
+    """Return the path of the cached preview, rendering it on a miss."""
+    path = cache_path(document.checksum, size_name)
+    if path.exists():
+        # Access time for the LRU is tracked through mtime.
+        os.utime(path)
+        return path
+
+    image = render_preview(document, size_name)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            image.save(tmp, 'JPEG', quality=80, optimize=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    record_cached(path.stat().st_size)
+    return path
+
+
+def record_cached(size):
+    # The cache directory's size is kept as a running total, so a miss
+    # doesn't walk the directory; only passing the limit (or losing the
+    # total) does. With a per-process cache backend each process adds its
+    # own renders to the total of its last scan, so the limit can be
+    # overshot by a few renders per process until one of them trims.
+    try:
+        total = size_cache().incr(SIZE_KEY, size)
+    except ValueError:
+        total = None
+    if total is None or total > max_cache_bytes():
+        enforce_cache_limit()
+
+
+def render_all(document):
+    for size_name in preview_sizes():
+        get_preview(document, size_name)
+
+
+def enforce_cache_limit(max_bytes=None):
+    if max_bytes is None:
+        max_bytes = max_cache_bytes()
+    entries = []
+    total = 0
+    for path in cache_dir().glob('*/*.jpg'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+    removed = 0
+    if total > max_bytes:
+        # Oldest access first.
+        for _, size, path in sorted(entries):
+            if total <= max_bytes * TRIM_TO:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+    size_cache().set(SIZE_KEY, total, timeout=None)
+    return removed
@@ -0,0 +1,130 @@
+import json
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from .models import Archive, BorrowRequest, Document
+from .urls import router
+
+BASELINE_PATH = Path(__file__).with_name('query_plan_baseline.json')
+
+FULL_SCAN_RE = re.compile(r'^SCAN (\w+)$')
+
+# Query strings needed for endpoints that reject bare requests.
+SAMPLE_PARAMS = {
+    'document-search': {'q': 'sample'},
+}
+
+# Detail actions run against the sample object of their viewset.
+DETAIL_ACTIONS = {'archive-subtree', 'archive-counts'}
+
+
+class Rollback(Exception):
+    pass
+
+
+def endpoints(samples):
+    """Yield (route name, path, params) for every GET endpoint that does not need a file."""
+    for prefix, viewset, basename in router.registry:
+        if hasattr(viewset, 'list'):
+            yield f'{basename}-list', reverse(f'{basename}-list'), {}
+        if hasattr(viewset, 'retrieve') and basename in samples:
+            name = f'{basename}-detail'
+            yield name, reverse(name, args=[samples[basename]]), {}
+        for action in viewset.get_extra_actions():
+            if 'get' not in action.mapping:
+                continue
+            name = f'{basename}-{action.url_name}'
+            if not action.detail:
+                yield name, reverse(name), SAMPLE_PARAMS.get(name, {})
+            elif name in DETAIL_ACTIONS:
+                yield name, reverse(name, args=[samples[basename]]), {}
+
+
+def create_samples():
+    staff = User.objects.create_user('query-plan-staff', is_staff=True)
+    user = User.objects.create_user('query-plan-user')
+    room = Archive.objects.create(name='Query plan room', location='', kind='room')
+    archive = Archive.objects.create(name='Query plan box', location='', kind='box', parent=room)
+    document = Document.objects.create(
+        title='Query plan sample', file='query-plan-sample.txt', uploaded_by=user, archive=archive
+    )
+    document.shared_with.add(staff)
+    today = timezone.now().date()
+    borrow_request = BorrowRequest.objects.create(
+        document=document, requested_by=user, purpose='Query plan sample',
+        borrow_date=today, return_date=today
+    )
+    users = {'staff': staff, 'user': user}
+    samples = {'document': document.pk, 'borrow-request': borrow_request.pk, 'archive': room.pk}
+    return users, samples
+
+
+def explain(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def collect_plans():
+    """Run every endpoint as staff and as a regular user and return
+    {finding: [sql, ...]}, where a finding reads "<role> <route>: <plan step>"."""
+    if connection.vendor != 'sqlite':
+        raise NotImplementedError('Query plan checks use SQLite EXPLAIN QUERY PLAN')
+
+    # Any allowed host works; pagination builds absolute links from it.
+    host = next((host for host in settings.ALLOWED_HOSTS if '*' not in host), 'localhost')
+    factory = APIRequestFactory(HTTP_HOST=host)
+    findings = {}
+    # Cached responses would hide the queries behind them.
+    no_cache = override_settings(
+        CACHES={**settings.CACHES, 'query-plans': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        }},
+        DOCUMENTS_RESPONSE_CACHE='query-plans',
+    )
+    try:
+        with no_cache, transaction.atomic():
+            users, samples = create_samples()
+            for role, user in users.items():
+                for name, path, params in endpoints(samples):
+                    request = factory.get(path, params)
+                    force_authenticate(request, user=user)
+                    match = resolve(path)
+                    with CaptureQueriesContext(connection) as queries:
+                        response = match.func(request, *match.args, **match.kwargs)
+                        if hasattr(response, 'render'):
+                            response.render()
+                    for query in queries.captured_queries:
+                        sql = query['sql']
+                        if not sql.lstrip().upper().startswith('SELECT'):
+                            continue
+                        for step in explain(sql):
+                            if FULL_SCAN_RE.match(step) or 'TEMP B-TREE' in step:
+                                findings.setdefault(f'{role} {name}: {step}', []).append(sql)
+            raise Rollback
+    except Rollback:
+        pass
+    return findings
+
+
+def is_full_scan(finding):
+    return bool(FULL_SCAN_RE.match(finding.split(': ', 1)[1]))
+
+
+def load_baseline(path=BASELINE_PATH):
+    try:
+        return set(json.loads(Path(path).read_text())['allowed'])
+    except FileNotFoundError:
+        return set()
+
+
+def save_baseline(findings, path=BASELINE_PATH):
+    Path(path).write_text(json.dumps({'allowed': sorted(findings)}, indent=2) + '\n')
@@ -0,0 +1,29 @@
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # falls back to DRF's json-based renderer
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson is not None else 0
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    # Same output as DRF's JSONRenderer for compact responses, encoded with
+    # orjson. Types orjson doesn't know (and datetimes, so they keep DRF's
+    # "Z" formatting) go through DRF's encoder. Indented output, as used by
+    # the browsable API, is left to the stock renderer.
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=JSONEncoder().default, option=ORJSON_OPTIONS)
+        # Like DRF, escape the separators that are valid JSON but not
+        # valid JavaScript.
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
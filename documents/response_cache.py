@@ -0,0 +1,76 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils.http import quote_etag
+
+from .downloads import etag_matches
+from .models import CacheVersion
+
+# Rendered GET responses of reference-data viewsets are cached under a key
+# that embeds a version counter per model. Saving or deleting a row bumps the
+# counter, so stale entries are never read again and simply age out. The
+# counters live in the database: with a per-process cache every worker keeps
+# its own entries, but all of them stop using an entry at the same bump.
+
+
+def get_cache():
+    return caches[getattr(settings, 'DOCUMENTS_RESPONSE_CACHE', 'default')]
+
+
+def cache_timeout():
+    return getattr(settings, 'DOCUMENTS_RESPONSE_CACHE_TIMEOUT', 24 * 3600)
+
+
+def model_versions(models):
+    labels = [model._meta.label_lower for model in models]
+    versions = dict(
+        CacheVersion.objects.filter(model__in=labels).values_list('model', 'version')
+    )
+    return [versions.get(label, 0) for label in labels]
+
+
+def bump_version(model):
+    # In the writing transaction: readers see the new version together with
+    # the rows it was bumped for.
+    label = model._meta.label_lower
+    if CacheVersion.objects.filter(model=label).update(version=F('version') + 1):
+        return
+    try:
+        with transaction.atomic():
+            # Seeded from the clock so a counter that is recreated (e.g. a
+            # restored database) never comes back at a value an entry in a
+            # shared cache was stored under.
+            CacheVersion.objects.create(model=label, version=time.time_ns())
+    except IntegrityError:
+        # Created concurrently by another request.
+        CacheVersion.objects.filter(model=label).update(version=F('version') + 1)
+
+
+def response_key(models, request):
+    versions = '.'.join(str(version) for version in model_versions(models))
+    query = sorted(request.query_params.lists())
+    fingerprint = hashlib.sha256(repr((request.path, query)).encode()).hexdigest()
+    return f'documents:response:{versions}:{request.accepted_media_type}:{fingerprint}'
+
+
+def content_etag(content):
+    return quote_etag(hashlib.sha256(content).hexdigest()[:32])
+
+
+def get_entry(key):
+    return get_cache().get(key)
+
+
+def set_entry(key, content, content_type):
+    entry = {'content': content, 'content_type': content_type, 'etag': content_etag(content)}
+    get_cache().set(key, entry, cache_timeout())
+    return entry
+
+
+def is_fresh(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    return header is not None and etag_matches(header, etag)
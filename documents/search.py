@@ -0,0 +1,215 @@
+import os
+import re
+import zipfile
+from xml.etree import ElementTree
+
+from django.conf import settings
+from django.db import connection
+
+try:
+    from pypdf import PdfReader
+except ImportError:  # PDF contents are simply not indexed without pypdf
+    PdfReader = None
+
+SEARCH_TABLE = 'documents_search'
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+DOCX_TEXT_TAG = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}t'
+DOCX_PARAGRAPH_TAG = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}p'
+
+
+def is_enabled():
+    return connection.vendor == 'sqlite'
+
+
+def max_content_chars():
+    return getattr(settings, 'DOCUMENTS_SEARCH_MAX_CONTENT_CHARS', 1_000_000)
+
+
+# Text extraction
+
+def extract_text(field_file):
+    if not field_file:
+        return ''
+    ext = os.path.splitext(field_file.name)[1].lower()
+    extractor = EXTRACTORS.get(ext)
+    if extractor is None:
+        return ''
+    try:
+        with field_file.storage.open(field_file.name, 'rb') as file:
+            return extractor(file, max_content_chars())
+    except (OSError, ValueError, zipfile.BadZipFile, ElementTree.ParseError):
+        return ''
+
+
+def extract_txt(file, limit):
+    return file.read(limit * 4).decode('utf-8', errors='replace')[:limit]
+
+
+def extract_docx(file, limit):
+    parts = []
+    length = 0
+    with zipfile.ZipFile(file) as archive:
+        with archive.open('word/document.xml') as xml:
+            for event, element in ElementTree.iterparse(xml, events=('end',)):
+                if element.tag == DOCX_TEXT_TAG and element.text:
+                    parts.append(element.text)
+                    length += len(element.text)
+                elif element.tag == DOCX_PARAGRAPH_TAG:
+                    parts.append('\n')
+                    element.clear()
+                if length >= limit:
+                    break
+    return ''.join(parts)[:limit]
+
+
+def extract_pdf(file, limit):
+    if PdfReader is None:
+        return ''
+    parts = []
+    length = 0
+    for page in PdfReader(file).pages:
+        text = page.extract_text() or ''
+        parts.append(text)
+        length += len(text)
+        if length >= limit:
+            break
+    return '\n'.join(parts)[:limit]
+
+
+EXTRACTORS = {
+    '.txt': extract_txt,
+    '.docx': extract_docx,
+    '.pdf': extract_pdf,
+}
+
+
+# Index maintenance
+
+def document_metadata(document):
+    type_name = document.document_type.name if document.document_type_id else ''
+    people = [document.uploaded_by.username]
+    people += [user.username for user in document.shared_with.all()]
+    return {
+        'title': document.title,
+        'type_name': type_name,
+        'people': ' '.join(people),
+    }
+
+
+def index_document(document):
+    # Re-extracting the file is the expensive part, so it only happens when
+    # the content checksum differs from what was indexed last time.
+    if not is_enabled():
+        return
+    metadata = document_metadata(document)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT checksum FROM {SEARCH_TABLE} WHERE rowid = %s', [document.pk]
+        )
+        row = cursor.fetchone()
+        if row is not None and row[0] == document.checksum and document.checksum:
+            cursor.execute(
+                f'UPDATE {SEARCH_TABLE} SET title = %s, type_name = %s, people = %s '
+                f'WHERE rowid = %s',
+                [metadata['title'], metadata['type_name'], metadata['people'], document.pk]
+            )
+            return
+        content = extract_text(document.file)
+        if row is not None:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [document.pk])
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} '
+            f'(rowid, title, type_name, people, content, checksum) '
+            f'VALUES (%s, %s, %s, %s, %s, %s)',
+            [document.pk, metadata['title'], metadata['type_name'],
+             metadata['people'], content, document.checksum]
+        )
+
+
+def index_metadata(document):
+    # Cheap path for saves that did not touch the file; documents without an
+    # index row yet are picked up by their processing job instead.
+    if not is_enabled():
+        return
+    metadata = document_metadata(document)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {SEARCH_TABLE} SET title = %s, type_name = %s, people = %s '
+            f'WHERE rowid = %s',
+            [metadata['title'], metadata['type_name'], metadata['people'], document.pk]
+        )
+
+
+def refresh_people(document):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {SEARCH_TABLE} SET people = %s WHERE rowid = %s',
+            [document_metadata(document)['people'], document.pk]
+        )
+
+
+def refresh_people_bulk(documents):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {SEARCH_TABLE} SET people = %s WHERE rowid = %s',
+            [(document_metadata(document)['people'], document.pk) for document in documents]
+        )
+
+
+def refresh_type_name(document_type):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {SEARCH_TABLE} SET type_name = %s WHERE rowid IN '
+            f'(SELECT id FROM documents_document WHERE document_type_id = %s)',
+            [document_type.name, document_type.pk]
+        )
+
+
+def remove_document(document_id):
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [document_id])
+
+
+def clear_index():
+    if not is_enabled():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+
+# Querying
+
+def build_match_query(text):
+    # Quote every word so user input can never be parsed as FTS5 syntax, and
+    # prefix-match the words so partial input still finds results.
+    words = WORD_RE.findall(text)
+    return ' '.join('"%s"*' % word.replace('"', '""') for word in words)
+
+
+def search_documents(text, visible_queryset, limit, offset=0):
+    """Return (document_id, rank, title_highlight, snippet) tuples, best first."""
+    match = build_match_query(text)
+    if not match or not is_enabled():
+        return []
+    visible_sql, visible_params = visible_queryset.values('id').query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid, bm25({SEARCH_TABLE}, 10.0, 4.0, 2.0, 1.0), '
+            f"highlight({SEARCH_TABLE}, 0, '<mark>', '</mark>'), "
+            f"snippet({SEARCH_TABLE}, 3, '<mark>', '</mark>', '…', 16) "
+            f'FROM {SEARCH_TABLE} '
+            f'WHERE {SEARCH_TABLE} MATCH %s AND rowid IN ({visible_sql}) '
+            f'ORDER BY 2 LIMIT %s OFFSET %s',
+            [match, *visible_params, limit, offset]
+        )
+        return cursor.fetchall()
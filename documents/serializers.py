@@ -1,9 +1,97 @@
 from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+from django.conf import settings
+from django.db.models import F, Max
+from django.db.models.functions import Length
+from django.urls import reverse
 from django.contrib.auth.models import User
 from .models import (
     Department, JobTitle, Employee, DocumentType, 
-    Archive, Document, BorrowRequest
+    Archive, Document, BorrowRequest, UploadSession
 )
+from .downloads import compute_checksum
+from .storage import is_content_addressed
+
+class EagerLoadingMixin:
+    # Relations the serializer walks for every row. Listing them here lets the
+    # viewsets load them up front instead of issuing one query per object.
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    
+    @classmethod
+    def get_select_related(cls, prefix=''):
+        return [prefix + field for field in cls.select_related_fields]
+    
+    @classmethod
+    def get_prefetch_related(cls, prefix=''):
+        return [prefix + field for field in cls.prefetch_related_fields]
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset, request=None):
+        select_related = cls.get_select_related()
+        prefetch_related = cls.get_prefetch_related()
+        if request is not None:
+            select_related, prefetch_related = cls.limit_eager_loading(
+                request, select_related, prefetch_related
+            )
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+    
+    @classmethod
+    def limit_eager_loading(cls, request, select_related, prefetch_related):
+        return select_related, prefetch_related
+
+class DynamicFieldsMixin:
+    # On reads, ?fields=a,b keeps only the listed fields and ?expand=x,y nests
+    # only the listed relations, rendering the other expandable_fields as
+    # primary keys. Without ?expand= every relation stays nested. Only the
+    # top-level serializer of a request is affected.
+    expandable_fields = ()
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields, expand = self.requested_fields(self.context.get('request'))
+        if fields is not None:
+            for name in set(self.fields) - fields:
+                self.fields.pop(name)
+        if expand is not None:
+            for name in self.expandable_fields:
+                if name in self.fields and name not in expand:
+                    many = isinstance(self.fields[name], serializers.ListSerializer)
+                    self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many)
+    
+    @staticmethod
+    def query_param_set(request, name):
+        # Plain Django requests (no DRF wrapper) only have GET.
+        value = getattr(request, 'query_params', request.GET).get(name)
+        if value is None:
+            return None
+        return {item.strip() for item in value.split(',') if item.strip()}
+    
+    @classmethod
+    def requested_fields(cls, request):
+        if request is None or request.method not in SAFE_METHODS:
+            return None, None
+        return cls.query_param_set(request, 'fields'), cls.query_param_set(request, 'expand')
+    
+    @classmethod
+    def limit_eager_loading(cls, request, select_related, prefetch_related):
+        # Skip joins for relations that are left out or rendered as keys.
+        fields, expand = cls.requested_fields(request)
+        
+        def rendered(path):
+            return fields is None or path.split('__')[0] in fields
+        
+        def nested(path):
+            return expand is None or path.split('__')[0] in expand
+        
+        return (
+            [path for path in select_related if rendered(path) and nested(path)],
+            [path for path in prefetch_related if rendered(path)],
+        )
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -20,11 +108,13 @@ class JobTitleSerializer(serializers.ModelSerializer):
         model = JobTitle
         fields = '__all__'
 
-class EmployeeSerializer(serializers.ModelSerializer):
+class EmployeeSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     department = DepartmentSerializer(read_only=True)
     job_title = JobTitleSerializer(read_only=True)
     
+    select_related_fields = ('user', 'department', 'job_title')
+    
     class Meta:
         model = Employee
         fields = '__all__'
@@ -38,23 +128,95 @@ class ArchiveSerializer(serializers.ModelSerializer):
     class Meta:
         model = Archive
         fields = '__all__'
+    
+    def validate_parent(self, parent):
+        if parent is None:
+            return parent
+        archive = self.instance
+        if archive is not None and parent.path.startswith(archive.path):
+            raise serializers.ValidationError("An archive cannot be moved into its own subtree")
+        # Every path below the archive gets the new parent's path as prefix.
+        if archive is None:
+            longest = len(parent.path) + len(str(2 ** 31)) + 1
+        else:
+            subtree = Archive.objects.filter(Archive.subtree_filter(archive.path))
+            deepest = subtree.aggregate(length=Max(Length('path')))['length']
+            longest = deepest - len(archive.path) + len(f'{parent.path}{archive.pk}/')
+        if longest > Archive._meta.get_field('path').max_length:
+            raise serializers.ValidationError("Archives are nested too deeply")
+        return parent
 
-class DocumentSerializer(serializers.ModelSerializer):
+class DocumentSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     uploaded_by = UserSerializer(read_only=True)
     document_type = DocumentTypeSerializer(read_only=True)
     archive = ArchiveSerializer(read_only=True)
     shared_with = UserSerializer(many=True, read_only=True)
     
+    preview_url = serializers.SerializerMethodField()
+    
+    select_related_fields = ('uploaded_by', 'document_type', 'archive')
+    prefetch_related_fields = ('shared_with',)
+    expandable_fields = ('uploaded_by', 'document_type', 'archive', 'shared_with')
+    
     class Meta:
         model = Document
         fields = '__all__'
+    
+    def get_preview_url(self, obj):
+        if not obj.pk or not obj.checksum:
+            return None
+        url = reverse('document-preview', args=[obj.pk])
+        request = self.context.get('request')
+        if request is not None:
+            url = request.build_absolute_uri(url)
+        return f"{url}?v={obj.checksum}"
         
     def create(self, validated_data):
         request = self.context.get('request')
         validated_data['uploaded_by'] = request.user
-        return super().create(validated_data)
+        return super().create(self.with_checksum(validated_data))
+    
+    def update(self, instance, validated_data):
+        return super().update(instance, self.with_checksum(validated_data))
+    
+    def with_checksum(self, validated_data):
+        # Content-addressed storage already hashes the upload while saving it,
+        # so only other backends need a separate pass over the file.
+        storage = Document._meta.get_field('file').storage
+        if 'file' in validated_data and not is_content_addressed(storage):
+            validated_data['checksum'] = compute_checksum(validated_data['file'])
+        return validated_data
+
+class DocumentCompactSerializer(DynamicFieldsMixin, serializers.Serializer):
+    # Flat row per document for list grids (?compact=1). The rows come from
+    # values(), so no model instances or related objects are built.
+    id = serializers.IntegerField()
+    title = serializers.CharField()
+    status = serializers.CharField()
+    is_personal = serializers.BooleanField()
+    processing_status = serializers.CharField()
+    document_type_id = serializers.IntegerField(allow_null=True)
+    document_type_name = serializers.CharField(allow_null=True)
+    archive_id = serializers.IntegerField(allow_null=True)
+    archive_name = serializers.CharField(allow_null=True)
+    uploaded_by_id = serializers.IntegerField()
+    uploaded_by_username = serializers.CharField()
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+    
+    related_values = {
+        'document_type_name': 'document_type__name',
+        'archive_name': 'archive__name',
+        'uploaded_by_username': 'uploaded_by__username',
+    }
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset, request=None):
+        columns = [name for name in cls._declared_fields if name not in cls.related_values]
+        related = {name: F(path) for name, path in cls.related_values.items()}
+        return queryset.values(*columns, **related)
 
-class BorrowRequestSerializer(serializers.ModelSerializer):
+class BorrowRequestSerializer(EagerLoadingMixin, serializers.ModelSerializer):
     requested_by = UserSerializer(read_only=True)
     approved_by = UserSerializer(read_only=True)
     document = DocumentSerializer(read_only=True)
@@ -64,12 +226,80 @@ class BorrowRequestSerializer(serializers.ModelSerializer):
         source='document'
     )
     
+    select_related_fields = ('document', 'requested_by', 'approved_by')
+    
+    @classmethod
+    def get_select_related(cls, prefix=''):
+        return (
+            super().get_select_related(prefix)
+            + DocumentSerializer.get_select_related(prefix + 'document__')
+        )
+    
+    @classmethod
+    def get_prefetch_related(cls, prefix=''):
+        return (
+            super().get_prefetch_related(prefix)
+            + DocumentSerializer.get_prefetch_related(prefix + 'document__')
+        )
+    
     class Meta:
         model = BorrowRequest
         fields = '__all__'
-        read_only_fields = ['status', 'actual_return_date']
+        read_only_fields = ['status', 'actual_return_date', 'decided_at']
+    
+    def validate(self, attrs):
+        borrow_date = attrs.get('borrow_date', getattr(self.instance, 'borrow_date', None))
+        return_date = attrs.get('return_date', getattr(self.instance, 'return_date', None))
+        # Loan periods are compared for overlaps when approving.
+        if borrow_date and return_date and return_date < borrow_date:
+            raise serializers.ValidationError({'return_date': 'Must not be before borrow_date.'})
+        return attrs
         
     def create(self, validated_data):
         request = self.context.get('request')
         validated_data['requested_by'] = request.user
-        return super().create(validated_data) 
\ No newline at end of file
+        return super().create(validated_data)
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    document_type_id = serializers.PrimaryKeyRelatedField(
+        queryset=DocumentType.objects.all(),
+        write_only=True,
+        source='document_type',
+        required=False,
+        allow_null=True
+    )
+    chunk_size = serializers.IntegerField(required=False, min_value=1)
+    total_chunks = serializers.IntegerField(read_only=True)
+    received_chunks = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = UploadSession
+        fields = [
+            'id', 'filename', 'size', 'chunk_size', 'checksum', 'title',
+            'document_type_id', 'is_personal', 'status', 'total_chunks',
+            'received_chunks', 'document', 'created_at', 'updated_at'
+        ]
+        read_only_fields = ['status', 'document']
+    
+    def get_received_chunks(self, obj):
+        return sorted(chunk.index for chunk in obj.chunks.all())
+    
+    def validate_size(self, value):
+        if value < 0:
+            raise serializers.ValidationError("Size must not be negative")
+        return value
+    
+    def validate_chunk_size(self, value):
+        max_chunk_size = getattr(settings, 'DOCUMENTS_UPLOAD_MAX_CHUNK_SIZE', 64 * 1024 * 1024)
+        if value > max_chunk_size:
+            raise serializers.ValidationError(f"Chunk size cannot exceed {max_chunk_size} bytes")
+        return value
+    
+    def create(self, validated_data):
+        request = self.context.get('request')
+        validated_data['user'] = request.user
+        validated_data.setdefault(
+            'chunk_size', getattr(settings, 'DOCUMENTS_UPLOAD_CHUNK_SIZE', 8 * 1024 * 1024)
+        )
+        return super().create(validated_data)
+
@@ -0,0 +1,316 @@
+from django.contrib.auth.models import User
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_init, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from . import access, authentication, changes, response_cache, search, stats
+from .blobs import acquire_blob, release_blob
+from .jobs import enqueue
+from .models import Archive, BorrowRequest, Department, Document, DocumentType, Employee, JobTitle
+from .storage import is_content_addressed
+
+
+def _raw_file_name(instance):
+    # Read the stored value without going through the descriptor, which
+    # would trigger a query for deferred fields.
+    value = instance.__dict__.get('file')
+    return getattr(value, 'name', value) or ''
+
+
+@receiver(post_init, sender=Document)
+def remember_file_name(sender, instance, **kwargs):
+    instance._stored_file_name = _raw_file_name(instance)
+
+
+@receiver(pre_save, sender=Document)
+def detect_file_change(sender, instance, **kwargs):
+    instance._file_changed = (instance.file.name or '') != instance._stored_file_name
+    if instance._file_changed:
+        instance.processing_status = 'pending'
+
+
+@receiver(post_save, sender=Document)
+def track_blob_references(sender, instance, created, **kwargs):
+    storage = sender._meta.get_field('file').storage
+    if not is_content_addressed(storage):
+        return
+    if created or instance._file_changed:
+        previous = '' if created else instance._stored_file_name
+        current = instance.file.name or ''
+        if current and storage.digest_from_name(current):
+            acquire_blob(storage, current)
+        if previous and storage.digest_from_name(previous):
+            release_blob(storage, previous)
+
+
+@receiver(post_save, sender=Document)
+def schedule_processing(sender, instance, created, **kwargs):
+    # New files are hashed, indexed and scanned by a worker so the upload
+    # request returns immediately; metadata-only saves just refresh the index.
+    if (created or instance._file_changed) and instance.file:
+        enqueue('process_document', document=instance)
+    else:
+        search.index_metadata(instance)
+    instance._stored_file_name = instance.file.name or ''
+    instance._file_changed = False
+
+
+@receiver(post_delete, sender=Document)
+def release_blob_reference(sender, instance, **kwargs):
+    storage = sender._meta.get_field('file').storage
+    if not is_content_addressed(storage):
+        return
+    name = instance._stored_file_name
+    if name and storage.digest_from_name(name):
+        release_blob(storage, name)
+
+
+@receiver(post_delete, sender=Document)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_document(instance.pk)
+
+
+@receiver(m2m_changed, sender=Document.shared_with.through)
+def update_search_people(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # user.shared_documents.add(...): instance is the user
+        for document in Document.objects.filter(pk__in=pk_set or []):
+            search.refresh_people(document)
+    else:
+        search.refresh_people(instance)
+
+
+# Access table
+
+@receiver(post_init, sender=Document)
+def remember_owner(sender, instance, **kwargs):
+    instance._stored_owner_id = instance.__dict__.get('uploaded_by_id')
+
+
+@receiver(post_save, sender=Document)
+def update_owner_access(sender, instance, created, **kwargs):
+    if created:
+        access.grant_owner(instance.pk, instance.uploaded_by_id, instance.created_at)
+    elif instance.uploaded_by_id != instance._stored_owner_id:
+        access.sync([instance.pk])
+    instance._stored_owner_id = instance.uploaded_by_id
+
+
+@receiver(m2m_changed, sender=Document.shared_with.through)
+def update_shared_access(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'post_add':
+        if reverse:
+            access.grant_shared(pk_set, [instance.pk])
+        else:
+            access.grant_shared([instance.pk], pk_set)
+    elif action == 'post_remove':
+        if reverse:
+            access.revoke_shared(pk_set, [instance.pk])
+        else:
+            access.revoke_shared([instance.pk], pk_set)
+    elif action == 'post_clear':
+        if reverse:
+            access.revoke_shared(user_ids=[instance.pk])
+        else:
+            access.revoke_shared([instance.pk])
+
+
+@receiver(post_save, sender=DocumentType)
+def update_search_type_name(sender, instance, created, **kwargs):
+    if not created:
+        search.refresh_type_name(instance)
+
+
+# Statistics counters
+
+@receiver(post_init, sender=Document)
+def remember_document_stats(sender, instance, **kwargs):
+    instance._stats_snapshot = stats.snapshot(instance, stats.DOCUMENT_FIELDS)
+
+
+@receiver(post_save, sender=Document)
+def update_document_stats(sender, instance, created, **kwargs):
+    new = stats.snapshot(instance, stats.DOCUMENT_FIELDS)
+    stats.document_saved(instance._stats_snapshot, new, created)
+    instance._stats_snapshot = new
+
+
+@receiver(post_delete, sender=Document)
+def remove_document_stats(sender, instance, **kwargs):
+    stats.document_deleted(instance._stats_snapshot)
+
+
+@receiver(post_init, sender=BorrowRequest)
+def remember_borrow_request_stats(sender, instance, **kwargs):
+    instance._stats_snapshot = stats.snapshot(instance, stats.BORROW_FIELDS)
+
+
+@receiver(post_save, sender=BorrowRequest)
+def update_borrow_request_stats(sender, instance, created, **kwargs):
+    new = stats.snapshot(instance, stats.BORROW_FIELDS)
+    stats.borrow_request_saved(instance._stats_snapshot, new, created)
+    instance._stats_snapshot = new
+
+
+@receiver(post_delete, sender=BorrowRequest)
+def remove_borrow_request_stats(sender, instance, **kwargs):
+    stats.borrow_request_deleted(instance._stats_snapshot)
+
+
+@receiver(post_init, sender=DocumentType)
+def remember_category(sender, instance, **kwargs):
+    instance._stats_category = instance.__dict__.get('category') if instance.pk else None
+
+
+@receiver(post_save, sender=DocumentType)
+def move_category_stats(sender, instance, created, **kwargs):
+    if not created and instance._stats_category != instance.category:
+        count = Document.objects.filter(document_type=instance).count()
+        stats.move_documents('category', instance._stats_category or '', instance.category, count)
+    instance._stats_category = instance.category
+
+
+@receiver(post_init, sender=Employee)
+def remember_department(sender, instance, **kwargs):
+    instance._stats_department = str(instance.__dict__.get('department_id') or '') if instance.pk else ''
+
+
+@receiver(post_save, sender=Employee)
+def move_department_stats(sender, instance, **kwargs):
+    department = str(instance.department_id or '')
+    if department != instance._stats_department:
+        count = Document.objects.filter(uploaded_by_id=instance.user_id).count()
+        stats.move_documents('department', instance._stats_department, department, count)
+    instance._stats_department = department
+
+
+@receiver(post_delete, sender=Employee)
+def clear_department_stats(sender, instance, **kwargs):
+    count = Document.objects.filter(uploaded_by_id=instance.user_id).count()
+    stats.move_documents('department', instance._stats_department, '', count)
+
+
+# Deleting an archive, document type or department nulls the references to it
+# (SET_NULL) with a queryset update that sends no Document/Employee signals,
+# so the documents' counts move to the '' key here.
+
+@receiver(pre_delete, sender=Archive)
+def clear_archive_stats(sender, instance, **kwargs):
+    count = Document.objects.filter(archive_id=instance.pk).count()
+    stats.move_documents('archive', str(instance.pk), '', count)
+
+
+@receiver(pre_delete, sender=DocumentType)
+def clear_category_stats(sender, instance, **kwargs):
+    count = Document.objects.filter(document_type_id=instance.pk).count()
+    stats.move_documents('category', instance._stats_category or '', '', count)
+
+
+@receiver(pre_delete, sender=Department)
+def clear_department_of_employees_stats(sender, instance, **kwargs):
+    count = Document.objects.filter(uploaded_by__employee__department_id=instance.pk).count()
+    stats.move_documents('department', str(instance.pk), '', count)
+
+
+# Reference-data response cache
+
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=JobTitle)
+@receiver(post_delete, sender=JobTitle)
+@receiver(post_save, sender=DocumentType)
+@receiver(post_delete, sender=DocumentType)
+@receiver(post_save, sender=Archive)
+@receiver(post_delete, sender=Archive)
+def invalidate_cached_responses(sender, **kwargs):
+    response_cache.bump_version(sender)
+
+
+# Token authentication cache
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    authentication.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(sender, instance, created, **kwargs):
+    # Password changes and deactivation must take effect at once; any other
+    # change would otherwise be served stale until the entry expires.
+    if created:
+        return
+    for key in Token.objects.filter(user=instance).values_list('key', flat=True):
+        authentication.invalidate(key)
+
+
+# Change feed
+
+@receiver(post_init, sender=Document)
+def remember_status(sender, instance, **kwargs):
+    instance._change_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=Document)
+def record_document_change(sender, instance, created, **kwargs):
+    if not changes.is_suppressed():
+        if created:
+            action = 'created'
+        elif instance.status == 'archived' and instance._change_status != 'archived':
+            action = 'archived'
+        else:
+            action = 'updated'
+        changes.documents_changed([instance.pk], action)
+    instance._change_status = instance.status
+
+
+@receiver(pre_delete, sender=Document)
+def remember_document_audience(sender, instance, **kwargs):
+    # The access rows are gone by post_delete.
+    if not changes.is_suppressed():
+        instance._change_audience = changes.document_audience([instance.pk])[instance.pk]
+
+
+@receiver(post_delete, sender=Document)
+def record_document_deletion(sender, instance, **kwargs):
+    if not changes.is_suppressed():
+        changes.document_deleted(instance.pk, instance._change_audience)
+
+
+@receiver(m2m_changed, sender=Document.shared_with.through)
+def record_share_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if changes.is_suppressed():
+        return
+    if action == 'pre_clear':
+        # Remember who (or what) is about to be unshared.
+        if reverse:
+            instance._change_cleared = set(instance.shared_documents.values_list('id', flat=True))
+        else:
+            instance._change_cleared = set(instance.shared_with.values_list('id', flat=True))
+        return
+    if action == 'post_add':
+        document_ids = pk_set if reverse else [instance.pk]
+        changes.documents_changed(document_ids, 'shared')
+    elif action in ('post_remove', 'post_clear'):
+        removed = pk_set if action == 'post_remove' else instance._change_cleared
+        if reverse:
+            changes.shares_removed(removed, [instance.pk])
+        else:
+            changes.shares_removed([instance.pk], removed)
+
+
+@receiver(post_save, sender=BorrowRequest)
+def record_borrow_request_change(sender, instance, created, **kwargs):
+    if not changes.is_suppressed():
+        action = 'created' if created else 'updated'
+        changes.borrow_requests_changed([(instance.pk, instance.requested_by_id)], action)
+
+
+@receiver(post_delete, sender=BorrowRequest)
+def record_borrow_request_deletion(sender, instance, **kwargs):
+    if not changes.is_suppressed():
+        changes.borrow_requests_changed([(instance.pk, instance.requested_by_id)], 'deleted')
+
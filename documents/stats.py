@@ -0,0 +1,278 @@
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+
+from .models import (
+    Archive, BorrowRequest, Department, Document, DocumentType, Employee, StatCounter
+)
+
+DOCUMENT_SCOPE = 'documents'
+BORROW_SCOPE = 'borrow_requests'
+
+DOCUMENT_FIELDS = ('status', 'document_type_id', 'archive_id', 'uploaded_by_id', 'created_at')
+BORROW_FIELDS = ('status', 'created_at', 'decided_at', 'borrow_date', 'actual_return_date')
+
+
+# Counter storage
+
+def apply_deltas(scope, deltas):
+    """Add {(dimension, key): (count, total)} deltas to the counters."""
+    for (dimension, key), (count, total) in deltas.items():
+        if not count and not total:
+            continue
+        counters = StatCounter.objects.filter(scope=scope, dimension=dimension, key=key)
+        if counters.update(count=F('count') + count, total=F('total') + total):
+            continue
+        try:
+            with transaction.atomic():
+                StatCounter.objects.create(
+                    scope=scope, dimension=dimension, key=key, count=count, total=total
+                )
+        except IntegrityError:
+            # Created concurrently by another request.
+            counters.update(count=F('count') + count, total=F('total') + total)
+
+
+def snapshot(instance, fields):
+    # Raw column values as loaded/saved, read without triggering queries.
+    return {field: instance.__dict__.get(field) for field in fields}
+
+
+def month_key(value):
+    return value.strftime('%Y-%m') if value else ''
+
+
+# Documents
+
+def category_key(document_type_id):
+    if document_type_id is None:
+        return ''
+    return DocumentType.objects.filter(pk=document_type_id).values_list(
+        'category', flat=True
+    ).first() or ''
+
+
+def department_key(user_id):
+    department_id = Employee.objects.filter(user_id=user_id).values_list(
+        'department_id', flat=True
+    ).first()
+    return str(department_id or '')
+
+
+def document_keys(values, dimensions):
+    resolvers = {
+        'status': lambda: values['status'],
+        'category': lambda: category_key(values['document_type_id']),
+        'department': lambda: department_key(values['uploaded_by_id']),
+        'archive': lambda: str(values['archive_id'] or ''),
+        'month': lambda: month_key(values['created_at']),
+    }
+    return {dimension: resolvers[dimension]() for dimension in dimensions}
+
+
+DOCUMENT_DIMENSION_SOURCES = {
+    'status': 'status',
+    'category': 'document_type_id',
+    'department': 'uploaded_by_id',
+    'archive': 'archive_id',
+    'month': 'created_at',
+}
+
+
+def document_deltas(old, new, created, deltas=None):
+    if deltas is None:
+        deltas = defaultdict(lambda: [0, 0])
+    if created:
+        for dimension, key in document_keys(new, DOCUMENT_DIMENSION_SOURCES).items():
+            deltas[(dimension, key)][0] += 1
+        return deltas
+    # Only dimensions whose source column changed need a lookup.
+    changed = [
+        dimension for dimension, field in DOCUMENT_DIMENSION_SOURCES.items()
+        if old.get(field) != new.get(field)
+    ]
+    for dimension, key in document_keys(old, changed).items():
+        deltas[(dimension, key)][0] -= 1
+    for dimension, key in document_keys(new, changed).items():
+        deltas[(dimension, key)][0] += 1
+    return deltas
+
+
+def document_saved(old, new, created):
+    apply_deltas(DOCUMENT_SCOPE, document_deltas(old, new, created))
+
+
+def documents_updated(changes):
+    """Apply the counters for bulk_update()s, which send no signals.
+
+    `changes` yields (old snapshot, new snapshot) pairs.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    for old, new in changes:
+        document_deltas(old, new, False, deltas)
+    apply_deltas(DOCUMENT_SCOPE, deltas)
+
+
+def documents_created(snapshots):
+    """Apply the counters for bulk_create()d documents."""
+    deltas = defaultdict(lambda: [0, 0])
+    keys = {}
+    for values in snapshots:
+        # Imported rows mostly share a handful of types and uploaders.
+        lookup = (values['document_type_id'], values['uploaded_by_id'])
+        if lookup not in keys:
+            keys[lookup] = (category_key(lookup[0]), department_key(lookup[1]))
+        category, department = keys[lookup]
+        for dimension, key in (
+            ('status', values['status']),
+            ('category', category),
+            ('department', department),
+            ('archive', str(values['archive_id'] or '')),
+            ('month', month_key(values['created_at'])),
+        ):
+            deltas[(dimension, key)][0] += 1
+    apply_deltas(DOCUMENT_SCOPE, deltas)
+
+
+def document_deleted(old):
+    deltas = {
+        (dimension, key): (-1, 0)
+        for dimension, key in document_keys(old, DOCUMENT_DIMENSION_SOURCES).items()
+    }
+    apply_deltas(DOCUMENT_SCOPE, deltas)
+
+
+def move_documents(dimension, old_key, new_key, count):
+    if old_key == new_key or not count:
+        return
+    apply_deltas(DOCUMENT_SCOPE, {
+        (dimension, old_key): (-count, 0),
+        (dimension, new_key): (count, 0),
+    })
+
+
+# Borrow requests
+
+def borrow_deltas(values, sign):
+    deltas = defaultdict(lambda: [0, 0])
+    deltas[('status', values['status'])][0] += sign
+    deltas[('month', month_key(values['created_at']))][0] += sign
+    if values['decided_at'] and values['created_at']:
+        seconds = int((values['decided_at'] - values['created_at']).total_seconds())
+        deltas[('turnaround', 'decision')][0] += sign
+        deltas[('turnaround', 'decision')][1] += sign * seconds
+    if values['actual_return_date'] and values['borrow_date']:
+        days = (values['actual_return_date'] - values['borrow_date']).days
+        deltas[('turnaround', 'loan')][0] += sign
+        deltas[('turnaround', 'loan')][1] += sign * days
+    return deltas
+
+
+def borrow_request_saved(old, new, created):
+    deltas = borrow_deltas(new, 1)
+    if not created:
+        for key, (count, total) in borrow_deltas(old, -1).items():
+            deltas[key][0] += count
+            deltas[key][1] += total
+    apply_deltas(BORROW_SCOPE, deltas)
+
+
+def borrow_request_deleted(old):
+    apply_deltas(BORROW_SCOPE, borrow_deltas(old, -1))
+
+
+# Full rebuild (backfill or drift repair)
+
+def rebuild():
+    with transaction.atomic():
+        StatCounter.objects.all().delete()
+
+        deltas = defaultdict(lambda: [0, 0])
+        groupings = {
+            'status': 'status',
+            'category': 'document_type__category',
+            'department': 'uploaded_by__employee__department',
+            'archive': 'archive',
+        }
+        for dimension, field in groupings.items():
+            for row in Document.objects.values(field).annotate(n=Count('id')).order_by():
+                deltas[(dimension, str(row[field] or ''))][0] += row['n']
+        for created_at in Document.objects.values_list('created_at', flat=True).iterator():
+            deltas[('month', month_key(created_at))][0] += 1
+        apply_deltas(DOCUMENT_SCOPE, deltas)
+
+        deltas = defaultdict(lambda: [0, 0])
+        for values in BorrowRequest.objects.values(*BORROW_FIELDS).iterator():
+            for key, (count, total) in borrow_deltas(values, 1).items():
+                deltas[key][0] += count
+                deltas[key][1] += total
+        apply_deltas(BORROW_SCOPE, deltas)
+
+
+# Reporting
+
+def read_counters(scope):
+    dimensions = defaultdict(dict)
+    for dimension, key, count, total in StatCounter.objects.filter(
+        scope=scope, count__gt=0
+    ).values_list('dimension', 'key', 'count', 'total'):
+        dimensions[dimension][key] = (count, total)
+    return dimensions
+
+
+def labelled(counts, labels=None):
+    labels = labels or {}
+    return [
+        {'key': key or None, 'label': labels.get(key, key or 'None'), 'count': count}
+        for key, (count, _) in sorted(counts.items(), key=lambda item: -item[1][0])
+    ]
+
+
+def document_stats():
+    counters = read_counters(DOCUMENT_SCOPE)
+    category_labels = dict(DocumentType.RECORD_TYPE_CHOICES + DocumentType.DOCUMENT_TYPE_CHOICES)
+    status_labels = dict(Document.STATUS_CHOICES)
+    department_labels = {
+        str(pk): name for pk, name in Department.objects.filter(
+            pk__in=[key for key in counters['department'] if key]
+        ).values_list('id', 'name')
+    }
+    archive_labels = {
+        str(pk): name for pk, name in Archive.objects.filter(
+            pk__in=[key for key in counters['archive'] if key]
+        ).values_list('id', 'name')
+    }
+    return {
+        'total': sum(count for count, _ in counters['status'].values()),
+        'by_status': labelled(counters['status'], status_labels),
+        'by_category': labelled(counters['category'], category_labels),
+        'by_department': labelled(counters['department'], department_labels),
+        'by_archive': labelled(counters['archive'], archive_labels),
+        'by_month': [
+            {'month': key, 'count': count}
+            for key, (count, _) in sorted(counters['month'].items())
+        ],
+    }
+
+
+def borrow_stats():
+    counters = read_counters(BORROW_SCOPE)
+    decision_count, decision_seconds = counters['turnaround'].get('decision', (0, 0))
+    loan_count, loan_days = counters['turnaround'].get('loan', (0, 0))
+    return {
+        'total': sum(count for count, _ in counters['status'].values()),
+        'by_status': labelled(counters['status'], dict(BorrowRequest.STATUS_CHOICES)),
+        'by_month': [
+            {'month': key, 'count': count}
+            for key, (count, _) in sorted(counters['month'].items())
+        ],
+        'turnaround': {
+            'decided': decision_count,
+            'average_decision_hours': (
+                round(decision_seconds / decision_count / 3600, 2) if decision_count else None
+            ),
+            'returned': loan_count,
+            'average_loan_days': round(loan_days / loan_count, 2) if loan_count else None,
+        },
+    }
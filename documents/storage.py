@@ -0,0 +1,104 @@
+import hashlib
+import os
+import re
+import tempfile
+
+from django.conf import settings
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.module_loading import import_string
+
+from .downloads import CHUNK_SIZE
+
+DIGEST_RE = re.compile(r'^[0-9a-f]{64}$')
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    # Stores every blob once under documents/<aa>/<sha256><ext>. Saving the
+    # same bytes again returns the existing name; Document rows sharing a
+    # blob are reference-counted through StoredBlob (see signals.py).
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save, and an
+        # existing name means the blob is already there.
+        return name
+
+    def _save(self, name, content):
+        directory, basename = os.path.split(name)
+        ext = os.path.splitext(basename)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+
+        if hasattr(content, 'temporary_file_path'):
+            # Already on disk (large uploads, assembled chunked uploads):
+            # hash in place and move rather than copy.
+            source = content.temporary_file_path()
+            digest = self._hash_path(source)
+            final_name = self._blob_name(directory, digest, ext)
+            if not self._place(final_name, lambda path: file_move_safe(source, path)):
+                os.remove(source)
+            return final_name
+
+        # Stream into a temporary file next to the blobs, hashing as we go.
+        fd, tmp_path = tempfile.mkstemp(dir=self.path(directory), suffix='.upload')
+        digest = hashlib.sha256()
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                if hasattr(content, 'seek'):
+                    content.seek(0)
+                for chunk in content.chunks(CHUNK_SIZE):
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            final_name = self._blob_name(directory, digest.hexdigest(), ext)
+            if not self._place(final_name, lambda path: os.replace(tmp_path, path)):
+                os.remove(tmp_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return final_name
+
+    def _place(self, final_name, move):
+        # Reuse the existing blob or move the new one into place. The pin
+        # keeps release_blob() from unlinking a blob we have decided to
+        # reuse before our Document row takes its reference.
+        from .blobs import pinned_blob
+
+        with pinned_blob(final_name):
+            if self.exists(final_name):
+                return False
+            os.makedirs(os.path.dirname(self.path(final_name)), exist_ok=True)
+            move(self.path(final_name))
+            self._chmod(final_name)
+        return True
+
+    def _blob_name(self, directory, digest, ext):
+        return '/'.join(part for part in (directory, digest[:2], digest + ext) if part)
+
+    def _hash_path(self, path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as source:
+            for chunk in iter(lambda: source.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _chmod(self, name):
+        if self.file_permissions_mode is not None:
+            os.chmod(self.path(name), self.file_permissions_mode)
+
+    @staticmethod
+    def digest_from_name(name):
+        # Files stored before this backend keep their original names and
+        # have no digest.
+        digest = os.path.splitext(os.path.basename(name))[0]
+        return digest if DIGEST_RE.match(digest) else None
+
+
+def document_storage():
+    storage_class = getattr(
+        settings, 'DOCUMENTS_FILE_STORAGE', 'documents.storage.ContentAddressedStorage'
+    )
+    return import_string(storage_class)()
+
+
+def is_content_addressed(storage):
+    return isinstance(storage, ContentAddressedStorage)
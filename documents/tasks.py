@@ -0,0 +1,67 @@
+import os
+from contextlib import suppress
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from . import changes, imports, previews, search
+from .downloads import ensure_checksum
+from .jobs import heartbeat, task
+from .models import Checkpoint, Document
+
+
+def processing_hooks():
+    # Extra post-upload steps (e.g. a virus scanner) as dotted paths to
+    # callables taking the document; raising marks the attempt as failed.
+    return [import_string(path) for path in getattr(settings, 'DOCUMENTS_PROCESSING_HOOKS', [])]
+
+
+@task('process_document')
+def process_document(job):
+    documents = Document.objects.select_related(
+        'document_type', 'uploaded_by'
+    ).prefetch_related('shared_with')
+    try:
+        document = documents.get(pk=job.document_id)
+    except Document.DoesNotExist:
+        return
+
+    Document.objects.filter(pk=document.pk).update(processing_status='processing')
+    ensure_checksum(document)
+    heartbeat(job)
+    search.index_document(document)
+    heartbeat(job)
+    try:
+        previews.render_all(document)
+    except previews.PreviewUnavailable:
+        pass
+    for hook in processing_hooks():
+        heartbeat(job)
+        hook(document)
+    Document.objects.filter(pk=document.pk).update(processing_status='ready')
+    changes.documents_changed([document.pk], 'updated')
+
+
+def mark_processing_failed(job):
+    Document.objects.filter(pk=job.document_id).update(processing_status='failed')
+    changes.documents_changed([job.document_id], 'updated')
+
+
+process_document.on_failure = mark_processing_failed
+
+
+@task('import_documents', max_attempts=3)
+def import_documents(job):
+    # A retry resumes after the last batch the failed attempt committed, and
+    # one that runs after an attempt finished the import only cleans up.
+    path = job.payload['path']
+    checkpoint = imports.job_checkpoint(job.pk)
+    if not Checkpoint.objects.filter(name=checkpoint, state__finished=True).exists():
+        imports.import_bundle(
+            path,
+            checkpoint=checkpoint,
+            owner=job.payload.get('owner'),
+            progress=lambda *args: heartbeat(job),
+        )
+    with suppress(FileNotFoundError):
+        os.remove(path)
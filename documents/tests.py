@@ -0,0 +1,291 @@
+import datetime
+import json
+import shutil
+import tempfile
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import hashers
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from documents import events, query_plans, response_cache, stats
+from documents.blobs import purge_released
+from documents.models import (
+    Archive, BorrowRequest, Department, Document, DocumentType, StatCounter, StoredBlob
+)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ListQueryCountTests(TestCase):
+    # List endpoints eager-load what their serializers render
+    # (EagerLoadingViewSetMixin), so the number of queries they run must not
+    # grow with the number of rows returned. Inside a TestCase transaction
+    # the router keeps reads on the default connection.
+    
+    document_endpoints = [
+        '/api/documents/',
+        '/api/documents/personal/',
+        '/api/documents/office/',
+        '/api/documents/shared/',
+    ]
+    borrow_request_endpoints = [
+        '/api/borrow-requests/',
+        '/api/borrow-requests/pending_approvals/',
+    ]
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pw', is_staff=True)
+        cls.colleague = User.objects.create_user('colleague', 'colleague@example.com', 'pw')
+        cls.document_type = DocumentType.objects.create(name='Contract', category='internal')
+        cls.archive = Archive.objects.create(name='Room 1', location='Floor 1')
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.staff)
+    
+    def add_rows(self, count):
+        for _ in range(count):
+            for is_personal in (True, False):
+                document = Document.objects.create(
+                    title='Document',
+                    file='documents/sample.txt',
+                    document_type=self.document_type,
+                    archive=self.archive,
+                    uploaded_by=self.staff,
+                    is_personal=is_personal,
+                )
+                document.shared_with.add(self.colleague, self.staff)
+                BorrowRequest.objects.create(
+                    document=document,
+                    requested_by=self.staff,
+                    approved_by=self.colleague,
+                    purpose='Audit',
+                    borrow_date=datetime.date(2026, 1, 1),
+                    return_date=datetime.date(2026, 1, 8),
+                )
+    
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+    
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            self.get(url)
+        return len(queries)
+    
+    def assertConstantQueries(self, endpoints):
+        self.add_rows(1)
+        expected = {url: self.count_queries(url) for url in endpoints}
+        self.add_rows(9)
+        for url in endpoints:
+            with self.subTest(url=url), self.assertNumQueries(expected[url]):
+                self.get(url)
+    
+    def test_document_lists(self):
+        self.assertConstantQueries(self.document_endpoints)
+    
+    def test_borrow_request_lists(self):
+        self.assertConstantQueries(self.borrow_request_endpoints)
+
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class QueryPlanTests(TestCase):
+    # Every full scan or temporary sort behind the GET endpoints must be one
+    # accepted in query_plan_baseline.json (see check_query_plans).
+    
+    def test_plans_within_baseline(self):
+        findings = set(query_plans.collect_plans())
+        baseline = query_plans.load_baseline()
+        self.assertLessEqual(findings, baseline, sorted(findings - baseline))
+
+class BlobReferenceTests(TestCase):
+    # Identical uploads share one file (ContentAddressedStorage); deleting
+    # the last document referencing it must not unlink a file that a
+    # concurrent upload has just decided to reuse.
+    
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root))
+        self.storage = Document._meta.get_field('file').storage
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'pw')
+    
+    def create_document(self, content):
+        return Document.objects.create(
+            title='Document',
+            file=ContentFile(content, name='sample.txt'),
+            uploaded_by=self.user,
+        )
+    
+    def test_last_release_deletes_file(self):
+        document = self.create_document(b'contents')
+        name = document.file.name
+        with self.captureOnCommitCallbacks(execute=True):
+            document.delete()
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(StoredBlob.objects.filter(name=name).exists())
+    
+    def test_reupload_during_release_keeps_file(self):
+        document = self.create_document(b'contents')
+        name = document.file.name
+        with self.captureOnCommitCallbacks() as callbacks:
+            document.delete()
+        # The same bytes are saved before the deleting transaction's
+        # on_commit callbacks run.
+        self.assertEqual(self.storage.save('documents/again.txt', ContentFile(b'contents')), name)
+        for callback in callbacks:
+            callback()
+        self.assertTrue(self.storage.exists(name))
+        
+        again = Document.objects.create(title='Again', file=name, uploaded_by=self.user)
+        self.assertEqual(StoredBlob.objects.get(name=name).refcount, 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            again.delete()
+        self.assertTrue(self.storage.exists(name))
+        
+        with override_settings(DOCUMENTS_BLOB_PIN_SECONDS=0):
+            self.assertEqual(purge_released(self.storage), 1)
+        self.assertFalse(self.storage.exists(name))
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class ResponseCacheTests(TestCase):
+    # Each worker process may hold its own cached responses; a bump made in
+    # any of them must retire the entries of all.
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('reader', 'reader@example.com', 'pw'))
+        self.department = Department.objects.create(name='Registry')
+    
+    def names(self):
+        response = self.client.get('/api/departments/')
+        self.assertEqual(response.status_code, 200)
+        return [row['name'] for row in json.loads(response.content)]
+    
+    def test_bump_from_another_process(self):
+        self.assertEqual(self.names(), ['Registry'])
+        other_process = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'other-process',
+        }})
+        with other_process:
+            Department.objects.filter(pk=self.department.pk).update(name='Records')
+            response_cache.bump_version(Department)
+        self.assertEqual(self.names(), ['Records'])
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], DOCUMENTS_PASSWORD_HASH_ITERATIONS=600000)
+class PasswordHashPolicyTests(TestCase):
+    # Logging in upgrades weaker hashes to the configured work factor and
+    # never weakens a stronger one.
+    
+    def login_with_hash(self, iterations):
+        hasher = hashers.PBKDF2PasswordHasher()
+        user = User.objects.create_user('member')
+        user.password = hasher.encode('secret', hasher.salt(), iterations)
+        user.save()
+        response = APIClient().post('/api/auth/login/', {'username': 'member', 'password': 'secret'})
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        return hasher.decode(user.password)['iterations']
+    
+    def test_weaker_hash_is_upgraded(self):
+        self.assertEqual(self.login_with_hash(100000), 600000)
+    
+    def test_stronger_hash_is_kept(self):
+        self.assertEqual(self.login_with_hash(720000), 720000)
+    
+    def test_minimum_work_factor(self):
+        with override_settings(DOCUMENTS_PASSWORD_HASH_ITERATIONS=10000):
+            with self.assertRaises(ImproperlyConfigured):
+                hashers.make_password('secret')
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'], DOCUMENTS_EVENTS_TICKET_CACHE='default')
+class EventTicketTests(TestCase):
+    # /api/events/ is opened with a ticket instead of the API token, which
+    # would be logged with the URL.
+    
+    def test_ticket_is_single_use(self):
+        user = User.objects.create_user('listener', 'listener@example.com', 'pw')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/events/ticket/')
+        self.assertEqual(response.status_code, 201)
+        ticket = response.data['ticket']
+        self.assertEqual(events.redeem_ticket(ticket), user)
+        self.assertIsNone(events.redeem_ticket(ticket))
+    
+    def test_ticket_requires_authentication(self):
+        self.assertEqual(APIClient().post('/api/events/ticket/').status_code, 401)
+
+
+@override_settings(ALLOWED_HOSTS=['testserver'])
+class BorrowApprovalRaceTests(TransactionTestCase):
+    # Staff approve at the same moment from separate threads, each with its
+    # own database connection, so the fixtures have to be committed.
+    
+    threads = 8
+    
+    def setUp(self):
+        self.requester = User.objects.create_user('requester')
+        self.staff = [
+            User.objects.create_user(f'staff-{i}', is_staff=True) for i in range(self.threads)
+        ]
+        self.document = Document.objects.create(
+            title='Ledger', file='documents/ledger.txt', uploaded_by=self.requester
+        )
+    
+    def request_loan(self):
+        today = datetime.date.today()
+        return BorrowRequest.objects.create(
+            document=self.document, requested_by=self.requester, purpose='Audit',
+            borrow_date=today, return_date=today + datetime.timedelta(days=7),
+        )
+    
+    def approve_in_parallel(self, borrow_requests):
+        barrier = threading.Barrier(self.threads)
+        
+        def approve(i):
+            client = APIClient()
+            client.force_authenticate(self.staff[i])
+            borrow_request = borrow_requests[i % len(borrow_requests)]
+            barrier.wait(timeout=5)
+            try:
+                return client.post(f'/api/borrow-requests/{borrow_request.pk}/approve/').status_code
+            finally:
+                connections.close_all()
+        
+        with ThreadPoolExecutor(max_workers=self.threads) as pool:
+            return Counter(pool.map(approve, range(self.threads)))
+    
+    def assertBorrowedOnce(self):
+        self.document.refresh_from_db()
+        self.assertEqual(self.document.status, 'borrowed')
+        self.assertEqual(BorrowRequest.objects.filter(status='approved').count(), 1)
+        counters = dict(StatCounter.objects.filter(
+            scope=stats.BORROW_SCOPE, dimension='status', count__gt=0
+        ).values_list('key', 'count'))
+        self.assertEqual(counters.get('approved'), 1)
+    
+    def test_same_request(self):
+        codes = self.approve_in_parallel([self.request_loan()])
+        self.assertEqual(codes[200], 1, codes)
+        self.assertEqual(codes[400], self.threads - 1, codes)
+        self.assertBorrowedOnce()
+    
+    def test_overlapping_requests(self):
+        codes = self.approve_in_parallel([self.request_loan() for _ in range(self.threads)])
+        self.assertEqual(codes[200], 1, codes)
+        self.assertEqual(codes[409], self.threads - 1, codes)
+        self.assertBorrowedOnce()
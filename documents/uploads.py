@@ -0,0 +1,91 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.utils import timezone
+
+from .downloads import CHUNK_SIZE
+
+
+class ChunkError(Exception):
+    pass
+
+
+class AssembledFile(File):
+    # Exposes the on-disk path so FileSystemStorage moves the assembled file
+    # into MEDIA_ROOT instead of copying it a second time.
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def get_upload_dir():
+    path = Path(getattr(settings, 'DOCUMENTS_UPLOAD_TEMP_DIR', Path(settings.MEDIA_ROOT) / 'upload_sessions'))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def part_path(session):
+    return get_upload_dir() / f'{session.pk}.part'
+
+
+def create_part_file(session):
+    # Chunks are written straight to their offset in one sparse file, so
+    # nothing needs to be concatenated or held in memory at commit time.
+    with open(part_path(session), 'wb') as part:
+        part.truncate(session.size)
+
+
+def write_chunk(session, index, stream, expected_checksum):
+    if index >= session.total_chunks:
+        raise ChunkError('Chunk index out of range')
+    expected_size = session.expected_chunk_size(index)
+    digest = hashlib.sha256()
+    written = 0
+    # Received into a temporary file first: a retried chunk only replaces
+    # the accepted bytes in the part file once it has been verified.
+    with tempfile.TemporaryFile(dir=get_upload_dir()) as received:
+        while written <= expected_size:
+            data = stream.read(CHUNK_SIZE)
+            if not data:
+                break
+            written += len(data)
+            if written > expected_size:
+                break
+            digest.update(data)
+            received.write(data)
+        if written != expected_size:
+            raise ChunkError(f'Chunk {index} must be {expected_size} bytes, got {written}')
+        checksum = digest.hexdigest()
+        if checksum != expected_checksum.lower():
+            raise ChunkError(f'Checksum mismatch for chunk {index}')
+        received.seek(0)
+        with open(part_path(session), 'r+b') as part:
+            part.seek(index * session.chunk_size)
+            shutil.copyfileobj(received, part, CHUNK_SIZE)
+    return written, checksum
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as part:
+        for data in iter(lambda: part.read(CHUNK_SIZE), b''):
+            digest.update(data)
+    return digest.hexdigest()
+
+
+def discard_part_file(session):
+    try:
+        os.remove(part_path(session))
+    except FileNotFoundError:
+        pass
+
+
+def expired_sessions(queryset, max_age=None):
+    if max_age is None:
+        max_age = timedelta(hours=getattr(settings, 'DOCUMENTS_UPLOAD_SESSION_TTL_HOURS', 24))
+    return queryset.filter(updated_at__lt=timezone.now() - max_age)
@@ -1,9 +1,12 @@
-from django.urls import path, include
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
+from . import async_views
+from .events import event_stream
 from .views import (
     DepartmentViewSet, JobTitleViewSet, EmployeeViewSet,
     DocumentTypeViewSet, ArchiveViewSet, DocumentViewSet,
-    BorrowRequestViewSet, login_view, register_view, get_user_data
+    BorrowRequestViewSet, ChangeViewSet, ImportViewSet, StatsViewSet, UploadSessionViewSet,
+    login_view, logout_view, register_view, get_user_data, event_ticket
 )
 
 router = DefaultRouter()
@@ -14,11 +17,32 @@ router.register(r'document-types', DocumentTypeViewSet)
 router.register(r'archives', ArchiveViewSet)
 router.register(r'documents', DocumentViewSet, basename='document')
 router.register(r'borrow-requests', BorrowRequestViewSet, basename='borrow-request')
+router.register(r'uploads', UploadSessionViewSet, basename='upload')
+router.register(r'imports', ImportViewSet, basename='import')
+router.register(r'stats', StatsViewSet, basename='stats')
+router.register(r'changes', ChangeViewSet, basename='change')
 
 urlpatterns = [
     path('', include(router.urls)),
     # Authentication endpoints
     path('auth/login/', login_view, name='login'),
+    path('auth/logout/', logout_view, name='logout'),
     path('auth/register/', register_view, name='register'),
     path('users/me/', get_user_data, name='user-data'),
-] 
\ No newline at end of file
+    # Server-Sent Events push channel (ASGI only)
+    path('events/', event_stream, name='event-stream'),
+    path('events/ticket/', event_ticket, name='event-ticket'),
+] 
+
+# Async variants of the document read endpoints, resolved ahead of the router
+# by smartdoc/asgi_urls.py (see smartdoc/asgi.py). Same URLs, same responses.
+async_urlpatterns = [
+    re_path(r'^documents/$', async_views.document_list, name='async-document-list'),
+    re_path(r'^documents/personal/$', async_views.document_personal, name='async-document-personal'),
+    re_path(r'^documents/office/$', async_views.document_office, name='async-document-office'),
+    re_path(r'^documents/shared/$', async_views.document_shared, name='async-document-shared'),
+    re_path(r'^documents/archived/$', async_views.document_archived, name='async-document-archived'),
+    re_path(r'^documents/export/$', async_views.document_export, name='async-document-export'),
+    re_path(r'^documents/(?P<pk>[^/.]+)/download/$', async_views.document_download, name='async-document-download'),
+    re_path(r'^documents/(?P<pk>[^/.]+)/preview/$', async_views.document_preview, name='async-document-preview'),
+]
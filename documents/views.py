@@ -1,8 +1,16 @@
-from rest_framework import viewsets, permissions, filters, status
+import io
+import os
+import uuid
+import zipfile
+
+from rest_framework import viewsets, mixins, permissions, filters, status
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from django.db.models import Q
+from django.conf import settings
+from django.db import transaction
+from django.db.models import ProtectedError
 from django.utils import timezone
+from django.http import HttpResponseNotModified
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from rest_framework.authtoken.models import Token
@@ -10,15 +18,30 @@ from django.contrib.auth.hashers import check_password
 
 from .models import (
     Department, JobTitle, Employee, DocumentType, 
-    Archive, Document, BorrowRequest
+    Archive, Document, BorrowRequest, UploadSession, UploadChunk, Checkpoint, Job
 )
 from .serializers import (
     DepartmentSerializer, JobTitleSerializer, EmployeeSerializer,
     DocumentTypeSerializer, ArchiveSerializer, DocumentSerializer,
-    BorrowRequestSerializer, UserSerializer
+    DocumentCompactSerializer, BorrowRequestSerializer, UserSerializer,
+    UploadSessionSerializer
+)
+from . import access, archives, borrowing, bulk, changes, events, exports, imports, overdue, stats
+from . import search as search_index
+from .jobs import enqueue
+from .downloads import download_response, ensure_checksum, etag_matches, file_response
+from .previews import PREVIEW_CONTENT_TYPE, PreviewUnavailable, get_preview, preview_sizes
+from .mixins import (
+    CachedResponseMixin, EagerLoadingViewSetMixin, PaginatedListMixin, ReadRoutingMixin,
+    cache_response
+)
+from .pagination import KeysetPagination
+from .uploads import (
+    AssembledFile, ChunkError, create_part_file, discard_part_file,
+    file_checksum, part_path, write_chunk
 )
 
-class DepartmentViewSet(viewsets.ModelViewSet):
+class DepartmentViewSet(ReadRoutingMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Department.objects.all()
     serializer_class = DepartmentSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -26,7 +49,7 @@ class DepartmentViewSet(viewsets.ModelViewSet):
     search_fields = ['name', 'description']
     ordering_fields = ['name']
 
-class JobTitleViewSet(viewsets.ModelViewSet):
+class JobTitleViewSet(ReadRoutingMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = JobTitle.objects.all()
     serializer_class = JobTitleSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -34,7 +57,7 @@ class JobTitleViewSet(viewsets.ModelViewSet):
     search_fields = ['title', 'description']
     ordering_fields = ['title']
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+class EmployeeViewSet(ReadRoutingMixin, EagerLoadingViewSetMixin, viewsets.ModelViewSet):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -42,7 +65,7 @@ class EmployeeViewSet(viewsets.ModelViewSet):
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'phone_number']
     ordering_fields = ['user__first_name', 'user__last_name', 'department__name', 'job_title__title']
 
-class DocumentTypeViewSet(viewsets.ModelViewSet):
+class DocumentTypeViewSet(ReadRoutingMixin, CachedResponseMixin, viewsets.ModelViewSet):
     queryset = DocumentType.objects.all()
     serializer_class = DocumentTypeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -51,6 +74,7 @@ class DocumentTypeViewSet(viewsets.ModelViewSet):
     ordering_fields = ['name', 'category']
     
     @action(detail=False, methods=['get'])
+    @cache_response
     def records(self, request):
         record_types = DocumentType.objects.filter(
             category__in=['notarized', 'certified', 'authenticated', 'translated']
@@ -59,6 +83,7 @@ class DocumentTypeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
+    @cache_response
     def documents(self, request):
         document_types = DocumentType.objects.filter(
             category__in=['outgoing', 'incoming', 'blocking', 'internal']
@@ -66,62 +91,274 @@ class DocumentTypeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(document_types, many=True)
         return Response(serializer.data)
 
-class ArchiveViewSet(viewsets.ModelViewSet):
-    queryset = Archive.objects.all()
+class ArchiveViewSet(ReadRoutingMixin, CachedResponseMixin, viewsets.ModelViewSet):
+    # Listed in tree order; ?parent=<id> lists one archive's children and
+    # ?parent= the top-level archives.
+    queryset = Archive.objects.order_by('path')
     serializer_class = ArchiveSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'location', 'description']
-    ordering_fields = ['name', 'location']
+    ordering_fields = ['name', 'location', 'path']
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        parent = self.request.query_params.get('parent')
+        if self.action == 'list' and parent is not None:
+            if parent and not parent.isdigit():
+                return queryset.none()
+            queryset = queryset.filter(parent_id=parent or None)
+        return queryset
+    
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response(
+                {"error": "Archive still contains other archives"},
+                status=status.HTTP_409_CONFLICT
+            )
+    
+    @action(detail=True, methods=['get'])
+    @cache_response
+    def subtree(self, request, pk=None):
+        serializer = self.get_serializer(archives.subtree(self.get_object()), many=True)
+        return Response(serializer.data)
+    
+    @action(detail=True, methods=['get'])
+    def counts(self, request, pk=None):
+        # Not cached: the counts change with every document and depend on
+        # what the user can see.
+        archive = self.get_object()
+        direct, total = archives.document_counts(archive, access.visible_documents(request.user))
+        return Response({
+            'id': archive.pk,
+            'documents': total.get(archive.pk, 0),
+            'archives': [
+                {'id': archive_id, 'documents': direct.get(archive_id, 0), 'total': count}
+                for archive_id, count in sorted(total.items())
+            ],
+        })
 
-class DocumentViewSet(viewsets.ModelViewSet):
+class DocumentViewSet(ReadRoutingMixin, EagerLoadingViewSetMixin, PaginatedListMixin, viewsets.ModelViewSet):
     serializer_class = DocumentSerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['title', 'document_type__name', 'uploaded_by__username']
     ordering_fields = ['title', 'created_at', 'updated_at', 'status']
     
+    # List actions that can return DocumentCompactSerializer rows (?compact=1).
+    compact_actions = {'list', 'personal', 'office', 'shared', 'archived'}
+    
     def get_queryset(self):
-        user = self.request.user
+        return self.optimize_queryset(self.visible_documents())
+    
+    def filter_queryset(self, queryset):
+        # ?archive=<id> narrows to documents filed anywhere below that archive,
+        # ?document_type=<id> to documents of that type.
+        queryset = super().filter_queryset(queryset)
+        if self.action != 'list':
+            return queryset
+        archive_id = self.request.query_params.get('archive')
+        if archive_id is not None:
+            archive = Archive.objects.filter(pk=archive_id).first() if archive_id.isdigit() else None
+            if archive is None:
+                return queryset.none()
+            queryset = archives.documents_in(queryset, archive)
+        document_type_id = self.request.query_params.get('document_type')
+        if document_type_id is not None:
+            if not document_type_id.isdigit():
+                return queryset.none()
+            queryset = queryset.filter(document_type_id=document_type_id)
+        return queryset
+    
+    def get_serializer_class(self):
+        compact = self.request.query_params.get('compact', '').lower() in ('1', 'true')
+        if compact and self.action in self.compact_actions:
+            return DocumentCompactSerializer
+        return super().get_serializer_class()
+    
+    def visible_documents(self):
         # Show documents uploaded by the user or shared with them
-        return Document.objects.filter(
-            Q(uploaded_by=user) | Q(shared_with=user)
-        ).distinct()
+        return access.visible_documents(self.request.user)
+    
+    # Querysets behind the list actions, shared with the async variants in
+    # async_views.py.
+    
+    def personal_documents(self):
+        return Document.objects.filter(uploaded_by=self.request.user, is_personal=True)
+    
+    def office_documents(self):
+        return Document.objects.filter(uploaded_by=self.request.user, is_personal=False)
+    
+    def shared_documents(self):
+        return access.shared_documents(self.request.user)
+    
+    def archived_documents(self):
+        return Document.objects.filter(uploaded_by=self.request.user, status='archived')
     
     @action(detail=False, methods=['get'])
     def personal(self, request):
-        personal_docs = Document.objects.filter(
-            uploaded_by=request.user,
-            is_personal=True
-        )
-        serializer = self.get_serializer(personal_docs, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(self.optimize_queryset(self.personal_documents()))
     
     @action(detail=False, methods=['get'])
     def office(self, request):
-        office_docs = Document.objects.filter(
-            uploaded_by=request.user,
-            is_personal=False
-        )
-        serializer = self.get_serializer(office_docs, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(self.optimize_queryset(self.office_documents()))
     
     @action(detail=False, methods=['get'])
     def shared(self, request):
-        shared_docs = Document.objects.filter(
-            shared_with=request.user
-        )
-        serializer = self.get_serializer(shared_docs, many=True)
-        return Response(serializer.data)
+        return self.paginated_response(self.optimize_queryset(self.shared_documents()))
     
     @action(detail=False, methods=['get'])
     def archived(self, request):
-        archived_docs = Document.objects.filter(
-            uploaded_by=request.user,
-            status='archived'
+        return self.paginated_response(self.optimize_queryset(self.archived_documents()))
+    
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {"error": "No search query specified"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            limit = min(int(request.query_params.get('limit', 20)), 100)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response(
+                {"error": "limit and offset must be integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        hits = search_index.search_documents(query, self.visible_documents(), limit, offset)
+        documents = self.optimize_queryset(Document.objects.all()).in_bulk(
+            [hit[0] for hit in hits]
         )
-        serializer = self.get_serializer(archived_docs, many=True)
-        return Response(serializer.data)
+        
+        results = []
+        for document_id, rank, title_highlight, snippet in hits:
+            document = documents.get(document_id)
+            if document is None:
+                continue
+            data = self.get_serializer(document).data
+            data['search'] = {
+                'rank': rank,
+                'title': title_highlight,
+                'snippet': snippet,
+            }
+            results.append(data)
+        
+        return Response({
+            'query': query,
+            'limit': limit,
+            'offset': offset,
+            'results': results,
+        })
+    
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        return self.export_response(request)
+    
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        return self.download_response(request, self.get_object())
+    
+    @action(detail=True, methods=['get'])
+    def preview(self, request, pk=None):
+        return self.preview_response(request, self.get_object())
+    
+    def download_response(self, request, document, asynchronous=False):
+        if not document.file:
+            return Response(
+                {"error": "Document has no file"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return download_response(request, document, asynchronous)
+    
+    def export_response(self, request, asynchronous=False):
+        # ZIP of the visible documents (narrowed by ?scope=, ?archive= and
+        # ?search=) with a ?manifest=csv|json; ?files=0 for the manifest only.
+        params = request.query_params
+        scope = params.get('scope')
+        if scope is None:
+            documents = self.filter_queryset(self.visible_documents())
+        elif scope in ('personal', 'office', 'shared', 'archived'):
+            documents = getattr(self, f'{scope}_documents')()
+        else:
+            return Response(
+                {"error": "scope must be one of: personal, office, shared, archived"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        manifest = params.get('manifest', 'csv')
+        if manifest not in exports.MANIFEST_FORMATS:
+            return Response(
+                {"error": f"manifest must be one of: {', '.join(exports.MANIFEST_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        name = scope or 'documents'
+        archive = params.get('archive')
+        if archive is not None:
+            if not archive.isdigit():
+                return Response(
+                    {"error": "archive must be an integer"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            archive = Archive.objects.filter(pk=archive).first()
+            if archive is None:
+                return Response(
+                    {"error": "Archive not found"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            # Everything filed below the archive, too.
+            documents = archives.documents_in(documents, archive)
+            name = f'archive-{archive.pk}'
+        
+        include_files = params.get('files', '1').lower() not in ('0', 'false')
+        filename = f'{name}-{timezone.localdate():%Y%m%d}.zip'
+        return exports.export_response(documents, filename, manifest, include_files, asynchronous)
+    
+    def preview_response(self, request, document, asynchronous=False):
+        size_name = request.query_params.get('size', 'medium')
+        if size_name not in preview_sizes():
+            return Response(
+                {"error": f"Unknown preview size, choose one of: {', '.join(preview_sizes())}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not document.file:
+            return Response(
+                {"error": "Document has no file"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        checksum = ensure_checksum(document)
+        etag = f'"{checksum[:32]}-{size_name}"'
+        # URLs carrying the content version (?v=<checksum>) never change, so
+        # they can be cached for good; bare URLs must revalidate.
+        if request.query_params.get('v') == checksum:
+            cache_control = 'private, max-age=31536000, immutable'
+        else:
+            cache_control = 'private, max-age=0, must-revalidate'
+        
+        if etag_matches(request.META.get('HTTP_IF_NONE_MATCH', ''), etag):
+            response = HttpResponseNotModified()
+        else:
+            try:
+                path = get_preview(document, size_name)
+            except PreviewUnavailable:
+                return Response(
+                    {"error": "No preview available for this document"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+            response = file_response(
+                open(path, 'rb'), asynchronous, content_type=PREVIEW_CONTENT_TYPE
+            )
+        response['ETag'] = etag
+        response['Cache-Control'] = cache_control
+        return response
     
     @action(detail=True, methods=['post'])
     def share(self, request, pk=None):
@@ -153,18 +390,112 @@ class DocumentViewSet(viewsets.ModelViewSet):
         
         try:
             archive = Archive.objects.get(id=archive_id)
-            document.archive = archive
-            document.status = 'archived'
-            document.save()
-            return Response({"status": "Document archived successfully"})
-        except Archive.DoesNotExist:
+        except (Archive.DoesNotExist, ValueError, TypeError):
+            return Response(
+                {"error": "Archive not found"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        document.archive = archive
+        document.status = 'archived'
+        document.save()
+        # Filed here, the document is also listed under ?archive= of every
+        # archive above this one; report the full path of names.
+        path = archives.name_paths(archives.path_ids(archive.path))[archive.pk]
+        return Response({
+            "status": "Document archived successfully",
+            "archive": {"id": archive.pk, "path": path},
+        })
+    
+    # Bulk operations: each takes "document_ids" and reports a per-item result
+    
+    @action(detail=False, methods=['post'])
+    def bulk_share(self, request):
+        try:
+            ids = bulk.parse_ids(request.data.get('document_ids'), 'document_ids')
+            user_ids = bulk.parse_ids(request.data.get('user_ids'), 'user_ids')
+            documents = bulk.load_documents(self.visible_documents(), ids)
+            bulk.share(documents.values(), user_ids)
+        except bulk.BulkError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response({
+            "updated": len(documents),
+            "results": bulk.item_results(ids, documents, 'shared'),
+        })
+    
+    @action(detail=False, methods=['post'])
+    def bulk_archive(self, request):
+        try:
+            ids = bulk.parse_ids(request.data.get('document_ids'), 'document_ids')
+        except bulk.BulkError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        archive_id = request.data.get('archive_id')
+        if not archive_id:
+            return Response(
+                {"error": "No archive specified"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            archive = Archive.objects.get(id=archive_id)
+        except (Archive.DoesNotExist, ValueError):
             return Response(
                 {"error": "Archive not found"},
                 status=status.HTTP_404_NOT_FOUND
             )
+        
+        documents = bulk.load_documents(self.visible_documents(), ids)
+        bulk.set_fields(list(documents.values()), archive=archive, status='archived')
+        
+        return Response({
+            "updated": len(documents),
+            "results": bulk.item_results(ids, documents, 'archived'),
+        })
+    
+    @action(detail=False, methods=['post'])
+    def bulk_status(self, request):
+        try:
+            ids = bulk.parse_ids(request.data.get('document_ids'), 'document_ids')
+        except bulk.BulkError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        new_status = request.data.get('status')
+        if new_status not in dict(Document.STATUS_CHOICES):
+            return Response(
+                {"error": f"Invalid status, choose one of: {', '.join(dict(Document.STATUS_CHOICES))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        documents = bulk.load_documents(self.visible_documents(), ids)
+        bulk.set_fields(list(documents.values()), status=new_status)
+        
+        return Response({
+            "updated": len(documents),
+            "results": bulk.item_results(ids, documents, 'updated'),
+        })
+    
+    @action(detail=False, methods=['post'])
+    def bulk_delete(self, request):
+        try:
+            ids = bulk.parse_ids(request.data.get('document_ids'), 'document_ids')
+        except bulk.BulkError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Only the uploader may delete, matching what the UI offers.
+        documents = bulk.load_documents(
+            Document.objects.filter(uploaded_by=request.user), ids
+        )
+        bulk.delete(documents.values())
+        
+        return Response({
+            "deleted": len(documents),
+            "results": bulk.item_results(ids, documents, 'deleted'),
+        })
 
-class BorrowRequestViewSet(viewsets.ModelViewSet):
+class BorrowRequestViewSet(ReadRoutingMixin, EagerLoadingViewSetMixin, PaginatedListMixin, viewsets.ModelViewSet):
     serializer_class = BorrowRequestSerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['document__title', 'purpose', 'status']
@@ -174,8 +505,8 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
         user = self.request.user
         # Admin sees all requests, others see only their own
         if user.is_staff:
-            return BorrowRequest.objects.all()
-        return BorrowRequest.objects.filter(requested_by=user)
+            return self.optimize_queryset(BorrowRequest.objects.all())
+        return self.optimize_queryset(BorrowRequest.objects.filter(requested_by=user))
     
     @action(detail=False, methods=['get'])
     def pending_approvals(self, request):
@@ -185,9 +516,16 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        pending = BorrowRequest.objects.filter(status='pending')
-        serializer = self.get_serializer(pending, many=True)
-        return Response(serializer.data)
+        pending = self.optimize_queryset(BorrowRequest.objects.filter(status='pending'))
+        return self.paginated_response(pending)
+    
+    @action(detail=False, methods=['get'])
+    def overdue(self, request):
+        # Staff see every overdue loan, others their own (get_queryset).
+        # Longest overdue first unless ?ordering= says otherwise; that order
+        # is also the one borrow_overdue_idx returns.
+        self.paginator.ordering = 'return_date'
+        return self.paginated_response(overdue.overdue_loans(self.get_queryset()))
     
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -198,18 +536,10 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
             )
         
         borrow_request = self.get_object()
-        if borrow_request.status != 'pending':
-            return Response(
-                {"error": "Cannot approve a request that is not pending"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        borrow_request.status = 'approved'
-        borrow_request.approved_by = request.user
-        borrow_request.document.status = 'borrowed'
-        
-        borrow_request.save()
-        borrow_request.document.save()
+        try:
+            borrowing.approve(borrow_request, request.user)
+        except borrowing.TransitionError as e:
+            return Response({"error": str(e)}, status=e.status)
         
         return Response({"status": "Request approved"})
     
@@ -222,36 +552,257 @@ class BorrowRequestViewSet(viewsets.ModelViewSet):
             )
         
         borrow_request = self.get_object()
-        if borrow_request.status != 'pending':
-            return Response(
-                {"error": "Cannot reject a request that is not pending"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        borrow_request.status = 'rejected'
-        borrow_request.approved_by = request.user
-        borrow_request.save()
+        try:
+            borrowing.reject(borrow_request, request.user)
+        except borrowing.TransitionError as e:
+            return Response({"error": str(e)}, status=e.status)
         
         return Response({"status": "Request rejected"})
     
     @action(detail=True, methods=['post'])
     def return_document(self, request, pk=None):
         borrow_request = self.get_object()
+        try:
+            borrowing.return_document(borrow_request)
+        except borrowing.TransitionError as e:
+            return Response({"error": str(e)}, status=e.status)
         
-        if borrow_request.status != 'approved':
+        return Response({"status": "Document returned successfully"})
+
+class StatsViewSet(ReadRoutingMixin, viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def list(self, request):
+        return Response({
+            'documents': stats.document_stats(),
+            'borrow_requests': stats.borrow_stats(),
+        })
+    
+    @action(detail=False, methods=['get'])
+    def documents(self, request):
+        return Response(stats.document_stats())
+    
+    @action(detail=False, methods=['get'], url_path='borrow-requests')
+    def borrow_requests(self, request):
+        return Response(stats.borrow_stats())
+
+class ChangeViewSet(ReadRoutingMixin, viewsets.ViewSet):
+    # Delta sync: fetch the cursor (GET without ?since=) before loading the
+    # lists, then poll with ?since=<cursor> and apply the events.
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def list(self, request):
+        since = request.query_params.get('since')
+        if since is None:
+            return Response({'cursor': changes.latest_id(), 'has_more': False, 'results': []})
+        
+        try:
+            since = int(since)
+            limit = int(request.query_params.get(
+                'limit', getattr(settings, 'DOCUMENTS_CHANGES_PAGE_SIZE', 500)
+            ))
+        except ValueError:
             return Response(
-                {"error": "Cannot return a document that is not borrowed"},
+                {"error": "since and limit must be integers"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        limit = max(1, min(limit, getattr(settings, 'DOCUMENTS_CHANGES_MAX_PAGE_SIZE', 1000)))
         
-        borrow_request.status = 'returned'
-        borrow_request.actual_return_date = timezone.now().date()
-        borrow_request.document.status = 'active'
+        if changes.is_expired(since):
+            return Response(
+                {"error": "Cursor has expired; reload the lists and start from a new cursor"},
+                status=status.HTTP_410_GONE
+            )
         
-        borrow_request.save()
-        borrow_request.document.save()
+        events, cursor, has_more = changes.changes_since(request.user, since, limit)
+        return Response({'cursor': cursor, 'has_more': has_more, 'results': events})
+
+class ImportViewSet(viewsets.ViewSet):
+    # Staff upload a bundle (see imports.py) as multipart field "bundle"; a
+    # job worker imports it and GET /api/imports/<id>/ reports the progress.
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def create(self, request):
+        if not request.user.is_staff:
+            return Response(
+                {"error": "Permission denied"},
+                status=status.HTTP_403_FORBIDDEN
+            )
         
-        return Response({"status": "Document returned successfully"})
+        upload = request.FILES.get('bundle')
+        if upload is None:
+            return Response(
+                {"error": "Attach the ZIP bundle as 'bundle'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        if not zipfile.is_zipfile(upload):
+            return Response(
+                {"error": "The bundle must be a ZIP file"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        path = imports.get_import_dir() / f'{uuid.uuid4().hex}.zip'
+        with open(path, 'wb') as destination:
+            for chunk in upload.chunks():
+                destination.write(chunk)
+        try:
+            imports.Bundle(path).close()
+        except imports.ManifestError as e:
+            os.remove(path)
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        job = enqueue('import_documents', payload={'path': str(path), 'owner': request.user.pk})
+        return Response(self.job_status(job), status=status.HTTP_202_ACCEPTED)
+    
+    def retrieve(self, request, pk=None):
+        if not request.user.is_staff:
+            return Response(
+                {"error": "Permission denied"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        job = Job.objects.filter(task='import_documents', pk=pk).first() if pk.isdigit() else None
+        if job is None:
+            return Response({"error": "Import not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response(self.job_status(job))
+    
+    def job_status(self, job):
+        checkpoint = Checkpoint.objects.filter(name=imports.job_checkpoint(job.pk)).first()
+        progress = checkpoint.state if checkpoint else {}
+        return {
+            'id': job.pk,
+            'status': job.status,
+            'attempts': job.attempts,
+            'last_error': job.last_error,
+            'created_at': job.created_at,
+            'rows': progress.get('rows', {}),
+            'created': progress.get('created', {}),
+            'skipped': progress.get('skipped', {}),
+            'failed': progress.get('failed', {}),
+            'errors': progress.get('errors', []),
+        }
+
+class UploadSessionViewSet(
+    ReadRoutingMixin,
+    mixins.CreateModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet
+):
+    serializer_class = UploadSessionSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get_queryset(self):
+        return UploadSession.objects.filter(
+            user=self.request.user
+        ).prefetch_related('chunks')
+    
+    def perform_create(self, serializer):
+        session = serializer.save()
+        create_part_file(session)
+    
+    def perform_destroy(self, instance):
+        discard_part_file(instance)
+        instance.delete()
+    
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<index>\d+)')
+    def chunk(self, request, pk=None, index=None):
+        session = self.get_object()
+        if session.status != 'open':
+            return Response(
+                {"error": "Upload session is already committed"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        checksum = request.headers.get('X-Chunk-Checksum')
+        if not checksum:
+            return Response(
+                {"error": "Missing X-Chunk-Checksum header"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        index = int(index)
+        try:
+            size, checksum = write_chunk(session, index, request.stream or io.BytesIO(), checksum)
+        except ChunkError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        UploadChunk.objects.update_or_create(
+            session=session,
+            index=index,
+            defaults={'size': size, 'checksum': checksum}
+        )
+        session.save(update_fields=['updated_at'])
+        
+        return Response({"index": index, "size": size, "checksum": checksum})
+    
+    @action(detail=True, methods=['post'])
+    def commit(self, request, pk=None):
+        session = self.get_object()
+        
+        # Claim the session so that concurrent commits create one document
+        claimed = UploadSession.objects.filter(pk=session.pk, status='open').update(
+            status='committing', updated_at=timezone.now()
+        )
+        if not claimed:
+            session.refresh_from_db()
+            # Committing twice (e.g. after a dropped response) returns the same document
+            if session.status == 'committed':
+                serializer = DocumentSerializer(session.document, context=self.get_serializer_context())
+                return Response(serializer.data)
+            return Response(
+                {"error": "Upload session is already being committed"},
+                status=status.HTTP_409_CONFLICT
+            )
+        
+        try:
+            received = {chunk.index for chunk in session.chunks.all()}
+            missing = [i for i in range(session.total_chunks) if i not in received]
+            if missing:
+                return self.reopen(session, Response(
+                    {"error": "Upload is incomplete", "missing_chunks": missing},
+                    status=status.HTTP_400_BAD_REQUEST
+                ))
+            
+            path = part_path(session)
+            checksum = file_checksum(path)
+            if session.checksum and session.checksum.lower() != checksum:
+                return self.reopen(session, Response(
+                    {"error": "Checksum mismatch for assembled file"},
+                    status=status.HTTP_400_BAD_REQUEST
+                ))
+            
+            with transaction.atomic():
+                document = Document(
+                    title=session.title,
+                    document_type=session.document_type,
+                    uploaded_by=request.user,
+                    is_personal=session.is_personal,
+                    checksum=checksum
+                )
+                with open(path, 'rb') as part:
+                    document.file.save(session.filename, AssembledFile(part), save=False)
+                document.save()
+                
+                session.status = 'committed'
+                session.document = document
+                session.save()
+        except Exception:
+            self.reopen(session)
+            raise
+        discard_part_file(session)
+        
+        serializer = DocumentSerializer(document, context=self.get_serializer_context())
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    
+    def reopen(self, session, response=None):
+        # Hand a failed commit's claim back so the client can fix and retry it
+        UploadSession.objects.filter(pk=session.pk, status='committing').update(status='open')
+        return response
 
 # Authentication views
 @api_view(['POST'])
@@ -260,10 +811,7 @@ def login_view(request):
     username = request.data.get('username')
     password = request.data.get('password')
     
-    print(f"Login attempt - Username: {username}")
-    
     if not username or not password:
-        print("Missing username or password")
         return Response({
             'message': 'Please provide both username and password'
         }, status=status.HTTP_400_BAD_REQUEST)
@@ -271,12 +819,10 @@ def login_view(request):
     user = authenticate(username=username, password=password)
     
     if not user:
-        print(f"Authentication failed for user: {username}")
         return Response({
             'message': 'Invalid credentials'
         }, status=status.HTTP_401_UNAUTHORIZED)
     
-    print(f"Authentication successful for user: {username}")
     token, _ = Token.objects.get_or_create(user=user)
     
     serializer = UserSerializer(user)
@@ -286,6 +832,12 @@ def login_view(request):
         'user': serializer.data
     })
 
+@api_view(['POST'])
+def logout_view(request):
+    # Deleting the token also drops it from the authentication cache.
+    Token.objects.filter(user=request.user).delete()
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
 @api_view(['POST'])
 @permission_classes([permissions.AllowAny])
 def register_view(request):
@@ -327,6 +879,11 @@ def register_view(request):
         'user': serializer.data
     })
 
+@api_view(['POST'])
+def event_ticket(request):
+    # Single-use ticket for opening /api/events/ (see events.issue_ticket).
+    return Response({'ticket': events.issue_ticket(request.user)}, status=status.HTTP_201_CREATED)
+
 @api_view(['GET'])
 def get_user_data(request):
     serializer = UserSerializer(request.user)
@@ -1,5 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useNavigate } from 'react-router-dom';
+import axios from 'axios';
 import { useAuth } from '../../context/AuthContext';
 import { Search, Bell, Settings, ChevronDown, AlertTriangle, Globe } from 'react-feather';
 import userAvatar from '../../assets/images/avatar.png';
@@ -21,6 +22,51 @@ const Header = () => {
     return () => clearInterval(timer);
   }, []);
   
+  useEffect(() => {
+    if (!currentUser) return;
+    
+    // Borrow request and share notifications are pushed instead of polled.
+    // Each connection needs a fresh single-use ticket, so a stream the server
+    // closed is reopened here rather than by EventSource itself.
+    let source = null;
+    let retryTimer = null;
+    let lastEventId = 0;
+    let closed = false;
+    const bump = (event) => {
+      lastEventId = Number(event.lastEventId) || lastEventId;
+      setNotifications(count => count + 1);
+    };
+    
+    const connect = async () => {
+      try {
+        const response = await axios.post('/api/events/ticket/');
+        if (closed) return;
+        const params = new URLSearchParams({ ticket: response.data.ticket });
+        if (lastEventId) params.set('since', lastEventId);
+        source = new EventSource(`/api/events/?${params}`);
+        ['borrow_request.created', 'borrow_request.updated', 'borrow_request.overdue', 'document.shared'].forEach(type => {
+          source.addEventListener(type, bump);
+        });
+        // Too far behind to replay; carry on from the live events.
+        source.addEventListener('reset', () => { lastEventId = 0; });
+        source.onerror = () => {
+          // A reconnect with the spent ticket is refused; start over.
+          source.close();
+          retryTimer = setTimeout(connect, 5000);
+        };
+      } catch (error) {
+        if (!closed) retryTimer = setTimeout(connect, 5000);
+      }
+    };
+    connect();
+    
+    return () => {
+      closed = true;
+      clearTimeout(retryTimer);
+      if (source) source.close();
+    };
+  }, [currentUser]);
+  
   const formatDatetime = (date) => {
     // Format: "Th 2, ngày 29/05/2025 - 19:58"
     const days = ['Chủ nhật', 'Th 2', 'Th 3', 'Th 4', 'Th 5', 'Th 6', 'Th 7'];
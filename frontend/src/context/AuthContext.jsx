@@ -92,6 +92,9 @@ export const AuthProvider = ({ children }) => {
   };
   
   const logout = () => {
+    // Revoke the token on the server; the local session ends either way
+    axios.post('/api/auth/logout/').catch(() => {});
+    
     // Remove token from localStorage
     localStorage.removeItem('token');
     
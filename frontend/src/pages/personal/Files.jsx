@@ -24,8 +24,15 @@ const PersonalFiles = () => {
     setError(null);
     
     try {
-      const response = await axios.get('/api/documents/personal/');
-      setDocuments(response.data);
+      // The list is paginated; follow the cursors to the last page
+      const results = [];
+      let url = '/api/documents/personal/';
+      while (url) {
+        const response = await axios.get(url);
+        results.push(...response.data.results);
+        url = response.data.next;
+      }
+      setDocuments(results);
     } catch (err) {
       console.error('Error fetching personal documents:', err);
       if (err.response && err.response.status === 500) {
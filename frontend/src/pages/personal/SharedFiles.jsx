@@ -19,8 +19,15 @@ const SharedFiles = () => {
     setError(null);
     
     try {
-      const response = await axios.get('/api/documents/shared/');
-      setDocuments(response.data);
+      // The list is paginated; follow the cursors to the last page
+      const results = [];
+      let url = '/api/documents/shared/';
+      while (url) {
+        const response = await axios.get(url);
+        results.push(...response.data.results);
+        url = response.data.next;
+      }
+      setDocuments(results);
     } catch (err) {
       console.error('Error fetching shared documents:', err);
       if (err.response && err.response.status === 500) {
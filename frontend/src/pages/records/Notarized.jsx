@@ -30,14 +30,21 @@ const NotarizedRecords = () => {
         throw new Error('Notarized record type not found');
       }
       
-      // Fetch documents of notarized type
-      const response = await axios.get('/api/documents/', {
+      // Fetch documents of notarized type. The list is paginated; the next
+      // links keep the filter, so follow them to the last page.
+      const results = [];
+      let response = await axios.get('/api/documents/', {
         params: {
           document_type: notarizedType.id
         }
       });
+      results.push(...response.data.results);
+      while (response.data.next) {
+        response = await axios.get(response.data.next);
+        results.push(...response.data.results);
+      }
       
-      setDocuments(response.data);
+      setDocuments(results);
     } catch (err) {
       console.error('Error fetching notarized documents:', err);
       setError('Failed to load notarized documents. Please try again later.');
@@ -9,8 +9,22 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "smartdoc.settings")
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+
+class SmartdocASGIHandler(ASGIHandler):
+    # Resolves through smartdoc/asgi_urls.py, which serves the document list,
+    # download and preview endpoints with async views (documents/async_views.py).
+    urlconf = "smartdoc.asgi_urls"
+
+    async def get_response_async(self, request):
+        request.urlconf = self.urlconf
+        return await super().get_response_async(request)
+
+
+application = SmartdocASGIHandler()
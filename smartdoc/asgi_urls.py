@@ -0,0 +1,15 @@
+"""
+URL configuration for the ASGI deployment (smartdoc/asgi.py).
+
+The async document read endpoints come first, so they take over those URLs;
+everything else resolves through smartdoc.urls as under WSGI.
+"""
+
+from django.urls import include, path
+
+from documents.urls import async_urlpatterns
+
+urlpatterns = [
+    path("api/", include(async_urlpatterns)),
+    path("", include("smartdoc.urls")),
+]
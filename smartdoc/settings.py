@@ -46,6 +46,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "documents.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -83,13 +84,56 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
-    }
+        # A file rather than the in-memory default: the concurrency tests
+        # need WAL and busy_timeout across threads, which shared-cache
+        # memory databases don't honour.
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
+    },
+    # Second connection to the same file. With WAL, reads made through it see
+    # the last committed state without waiting on writers.
+    "read": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "db.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    },
 }
 
+DATABASE_ROUTERS = ["documents.db.ReadWriteRouter"]
+
+# Applied to every new SQLite connection (documents/db.py). WAL lets readers
+# run alongside one writer; synchronous=NORMAL is durable across application
+# crashes in WAL mode; busy_timeout makes writers wait for the lock instead of
+# failing with "database is locked".
+DOCUMENTS_SQLITE_PRAGMAS = {
+    "journal_mode": "wal",
+    "synchronous": "normal",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # KiB when negative
+    "busy_timeout": 5000,
+    "temp_store": "memory",
+}
+DOCUMENTS_READ_DATABASE = "read"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
+# The first hasher hashes new passwords. On login, hashes made by the others
+# are converted to it and PBKDF2 hashes with fewer iterations than configured
+# are upgraded; stronger ones are kept (see documents/hashers.py).
+PASSWORD_HASHERS = [
+    "documents.hashers.TunablePBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+# Pinned instead of following Django's default, which rises with every
+# release (720000 in 5.0), so login CPU cost only changes when we decide to.
+# 600000 is OWASP's recommendation for PBKDF2-HMAC-SHA256 and the lowest
+# value the hasher accepts.
+DOCUMENTS_PASSWORD_HASH_ITERATIONS = 600000
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -128,6 +172,123 @@ STATIC_ROOT = BASE_DIR / "static"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Document downloads are streamed by Django by default. Set the offload mode to
+# "x-accel-redirect" (nginx) or "x-sendfile" (Apache/lighttpd) to let the front
+# web server transfer the file; with nginx, map DOCUMENTS_DOWNLOAD_ACCEL_PREFIX
+# to MEDIA_ROOT in an internal location.
+DOCUMENTS_DOWNLOAD_OFFLOAD = None
+DOCUMENTS_DOWNLOAD_ACCEL_PREFIX = "/protected-media/"
+
+# Resumable chunked uploads (/api/uploads/). Partial files live outside
+# MEDIA_ROOT until committed; sessions idle longer than the TTL are removed by
+# `manage.py cleanup_upload_sessions`.
+DOCUMENTS_UPLOAD_TEMP_DIR = BASE_DIR / "upload_sessions"
+DOCUMENTS_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+DOCUMENTS_UPLOAD_MAX_CHUNK_SIZE = 64 * 1024 * 1024
+DOCUMENTS_UPLOAD_SESSION_TTL_HOURS = 24
+
+# Identical uploads share one stored file. A file an upload is about to reuse
+# is pinned for this long so a concurrent delete cannot unlink it; blobs that
+# lose their last reference while pinned are removed by the same cleanup.
+DOCUMENTS_BLOB_PIN_SECONDS = 3600
+
+# Full-text search (SQLite FTS5). Text extracted from PDF/DOCX/TXT uploads is
+# capped per document; PDF extraction needs the optional pypdf package.
+DOCUMENTS_SEARCH_MAX_CONTENT_CHARS = 1_000_000
+
+# Background jobs (post-upload processing). Run workers with
+# `manage.py run_jobs`; set DOCUMENTS_JOBS_EAGER to run jobs in-process right
+# after each request instead. Processing hooks are dotted paths to callables
+# that receive the document, e.g. a virus scanner.
+DOCUMENTS_JOBS_EAGER = False
+DOCUMENTS_JOBS_CONCURRENCY = 2
+DOCUMENTS_JOBS_POLL_INTERVAL = 2.0
+DOCUMENTS_JOBS_RETRY_BACKOFF = 30
+DOCUMENTS_JOBS_RETRY_BACKOFF_MAX = 3600
+DOCUMENTS_JOBS_LOCK_TIMEOUT = 600
+DOCUMENTS_PROCESSING_HOOKS = []
+
+# Document previews: first page/image rendered to JPEG at these bounding-box
+# sizes, cached by content hash and trimmed least-recently-used first. PDF
+# rendering needs the optional pypdfium2 package.
+DOCUMENTS_PREVIEW_SIZES = {"small": 128, "medium": 320, "large": 800}
+DOCUMENTS_PREVIEW_CACHE_DIR = BASE_DIR / "preview_cache"
+DOCUMENTS_PREVIEW_CACHE_MAX_BYTES = 512 * 1024 * 1024
+# Holds the running size of the preview cache directory (shared across
+# processes with a shared cache backend).
+DOCUMENTS_PREVIEW_SIZE_CACHE = "default"
+
+# Upper bound on document_ids accepted by the bulk document endpoints.
+DOCUMENTS_BULK_MAX_ITEMS = 5000
+
+# Change feed (/api/changes/?since=<cursor>). Events older than the retention
+# period are removed by `manage.py purge_changes`; clients holding an older
+# cursor get 410 and reload.
+DOCUMENTS_CHANGES_PAGE_SIZE = 500
+DOCUMENTS_CHANGES_MAX_PAGE_SIZE = 1000
+DOCUMENTS_CHANGES_RETENTION_DAYS = 30
+
+# Push notifications (/api/events/, Server-Sent Events; serve through
+# smartdoc.asgi). The in-process broker reaches streams in the same process
+# only; with several ASGI workers set a shared broker class here.
+DOCUMENTS_NOTIFICATION_BROKER = "documents.notifications.InProcessBroker"
+DOCUMENTS_EVENTS_HEARTBEAT = 15
+# Streams are opened with a single-use ticket from POST /api/events/ticket/
+# rather than the API token, which would be logged as part of the URL.
+DOCUMENTS_EVENTS_TICKET_CACHE = "shared"
+DOCUMENTS_EVENTS_TICKET_TTL = 30
+DOCUMENTS_EVENTS_MAX_PENDING = 1000
+
+# Overdue loans. Run `manage.py scan_overdue_loans` nightly (cron); each run
+# notifies about loans that fell due since the previous one and repeats the
+# reminder every DOCUMENTS_OVERDUE_REMINDER_DAYS, at most
+# DOCUMENTS_OVERDUE_MAX_REMINDERS times. Email digests need EMAIL_* settings.
+DOCUMENTS_OVERDUE_REMINDER_DAYS = 7
+DOCUMENTS_OVERDUE_MAX_REMINDERS = 4
+DOCUMENTS_OVERDUE_EMAILS = False
+
+# Bulk imports of legacy archives (`manage.py import_documents`, or a ZIP
+# POSTed to /api/imports/ by staff and run by the job workers). Rows are
+# committed DOCUMENTS_IMPORT_BATCH_SIZE at a time while files are copied on
+# DOCUMENTS_IMPORT_WORKERS threads. Uploaded bundles wait in
+# DOCUMENTS_IMPORT_DIR and are removed once imported.
+DOCUMENTS_IMPORT_DIR = BASE_DIR / "imports"
+DOCUMENTS_IMPORT_BATCH_SIZE = 500
+DOCUMENTS_IMPORT_WORKERS = 4
+
+# Caches. The reference-data viewsets (departments, job titles, document
+# types, archives) keep rendered responses in DOCUMENTS_RESPONSE_CACHE, keyed
+# by per-model version counters that saves and deletes bump in the database.
+# Local memory is per process, which stays correct but renders each response
+# once per worker; a shared backend renders it once, e.g.
+#   {"BACKEND": "django.core.cache.backends.redis.RedisCache",
+#    "LOCATION": "redis://127.0.0.1:6379/1"}
+#
+# "shared" holds entries that a write in one worker must remove for all of
+# them (cached token lookups). Files are shared by the workers of one host;
+# with several hosts, use Redis or Memcached for it.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "smartdoc",
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": BASE_DIR / "cache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+DOCUMENTS_RESPONSE_CACHE = "default"
+DOCUMENTS_RESPONSE_CACHE_TIMEOUT = 24 * 3600
+
+# Token lookups for API authentication are cached for up to this many seconds;
+# logout, token deletion and user changes drop the entry immediately. The
+# alias must be shared by all workers, or a revoked token keeps working in the
+# others until the entry expires.
+DOCUMENTS_AUTH_CACHE = "shared"
+DOCUMENTS_AUTH_CACHE_TIMEOUT = 300
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -139,10 +300,27 @@ CORS_ALLOW_ALL_ORIGINS = True
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'documents.authentication.CachedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
-    ]
+    ],
+    # orjson-backed when orjson is installed, DRF's encoder otherwise
+    'DEFAULT_RENDERER_CLASSES': [
+        'documents.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
+
+# Response compression (documents.middleware.CompressionMiddleware): brotli
+# when the optional brotli package is installed and the client accepts it,
+# gzip otherwise. Smaller bodies aren't worth the CPU.
+DOCUMENTS_COMPRESSION_MIN_SIZE = 1024
+DOCUMENTS_GZIP_LEVEL = 6
+DOCUMENTS_BROTLI_QUALITY = 5
+
+# Keyset pagination for the document and borrow request endpoints; clients may
+# override the page size with ?page_size= up to the maximum.
+DOCUMENTS_PAGE_SIZE = 50
+DOCUMENTS_MAX_PAGE_SIZE = 500